@@ -19,6 +19,7 @@ def get_api_docs_data(base_url: str) -> Dict[str, Any]:
     # API 端点配置
     endpoints = {
         'convert': '/api/convert',
+        'batch': '/api/batch',
         'download': '/api/download',
         'palette': '/api/palette?docs=true',
         'status': '/api/status?docs=true'
@@ -508,6 +509,7 @@ def generate_root_api_markdown(api_info: Dict[str, Any]) -> str:
         lines.append("| 端点 | 方法 | 说明 |")
         lines.append("|------|------|------|")
         lines.append("| `/api/convert` | POST | 图片转换为拼豆图纸 |")
+        lines.append("| `/api/batch` | POST | 批量转换多张图片或ZIP压缩包 |")
         lines.append("| `/api/download` | POST | 生成并下载图纸图片 |")
         lines.append("| `/api/palette` | GET/POST | 调色板信息和验证 |")
         lines.append("| `/api/status` | GET | 获取API状态信息 |")
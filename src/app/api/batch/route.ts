@@ -0,0 +1,255 @@
+import { NextRequest, NextResponse } from 'next/server';
+import { convertImageBatch, ConvertOutcome } from '../../../utils/convertService';
+import {
+  ConvertRequestError,
+  ConvertRequestParams,
+  buildPatternData,
+  buildPatternHandle,
+  buildProcessingParams,
+  createConvertJob,
+  parseConvertRequest,
+  resolveBackgroundKeys
+} from '../../../utils/convertRequest';
+import { readZipEntries } from '../../../utils/zipArchive';
+import { createNdjsonResponse, toNdjsonLine, wantsNdjson } from '../../../utils/ndjsonStream';
+import { getEndpointDoc } from '../../../config/apiDocs';
+import { SERVER_CONFIG } from '../../../config/serverConfig';
+
+// 压缩包中按扩展名识别的图片文件
+const IMAGE_FILE_PATTERN = /\.(png|jpe?g|gif|bmp|webp)$/i;
+
+interface BatchImage {
+  name: string;
+  // 读取图片数据，返回的 ArrayBuffer 会被转移给工作线程，每次调用都返回新的副本
+  load(): Promise<ArrayBuffer>;
+}
+
+// Buffer 可能只是更大的 ArrayBuffer 的一部分，复制出独立的 ArrayBuffer
+function toArrayBuffer(buffer: Buffer): ArrayBuffer {
+  return buffer.buffer.slice(buffer.byteOffset, buffer.byteOffset + buffer.byteLength) as ArrayBuffer;
+}
+
+// 压缩包中的图片解压后的大小之和超出上限，路由返回 413
+class BatchArchiveTooLargeError extends ConvertRequestError {
+  constructor(totalSize: number) {
+    super(
+      `压缩包解压后超过 ${SERVER_CONFIG.batch.maxTotalMB}MB`,
+      `压缩包中的图片解压后共 ${Math.ceil(totalSize / 1024 / 1024)}MB`
+    );
+    this.name = 'BatchArchiveTooLargeError';
+  }
+}
+
+// 收集上传的图片：images 字段中的文件，以及 archive 压缩包中的图片（跳过目录、隐藏文件和 macOS 元数据）
+// 按中央目录声明的大小检查解压上限：单个图片超出时记为该图片转换失败，总量超出时拒绝整个请求
+async function collectBatchImages(formData: FormData): Promise<BatchImage[]> {
+  const images: BatchImage[] = formData.getAll('images')
+    .filter((value): value is File => typeof value !== 'string')
+    .map(file => ({ name: file.name, load: () => file.arrayBuffer() }));
+
+  const archive = formData.get('archive');
+  if (archive && typeof archive !== 'string') {
+    const maxEntrySize = SERVER_CONFIG.batch.maxEntryMB * 1024 * 1024;
+    let entries;
+    try {
+      entries = readZipEntries(Buffer.from(await archive.arrayBuffer()), maxEntrySize);
+    } catch (error) {
+      throw new ConvertRequestError('压缩包格式错误', error instanceof Error ? error.message : '未知错误');
+    }
+    let totalSize = 0;
+    for (const entry of entries) {
+      const baseName = entry.name.split('/').pop() || '';
+      if (!IMAGE_FILE_PATTERN.test(baseName) || baseName.startsWith('.') || entry.name.startsWith('__MACOSX/')) {
+        continue;
+      }
+      // 超出单个文件上限的图片不会被解压，不计入总量
+      if (entry.size <= maxEntrySize) {
+        totalSize += entry.size;
+      }
+      images.push({ name: entry.name, load: async () => toArrayBuffer(entry.read()) });
+    }
+    if (totalSize > SERVER_CONFIG.batch.maxTotalMB * 1024 * 1024) {
+      throw new BatchArchiveTooLargeError(totalSize);
+    }
+  }
+  return images;
+}
+
+// 单张图片的结果，成功时的字段与 /api/convert 相同
+function buildBatchResult(
+  index: number,
+  name: string,
+  outcome: ConvertOutcome | null,
+  error: unknown,
+  params: ConvertRequestParams
+) {
+  if (!outcome) {
+    console.error(`批量转换 ${name} 失败:`, error);
+    return { index, name, success: false, error: error instanceof Error ? error.message : '未知错误' };
+  }
+  const { result, cacheStatus } = outcome;
+  return {
+    index,
+    name,
+    success: true,
+    ...buildPatternData(result, params.colorSystem, params.pixelFormat),
+    ...buildPatternHandle(result, params),
+    imageInfo: {
+      originalWidth: result.imageWidth,
+      originalHeight: result.imageHeight,
+      aspectRatio: result.imageHeight / result.imageWidth,
+      sampledWidth: result.sampledWidth,
+      sampledHeight: result.sampledHeight
+    },
+    cacheStatus
+  };
+}
+
+function convertBatch(
+  images: BatchImage[],
+  params: ConvertRequestParams,
+  onResult: (result: ReturnType<typeof buildBatchResult>) => void,
+  signal?: AbortSignal
+): Promise<void> {
+  return convertImageBatch(
+    images.length,
+    async index => createConvertJob(params, await images[index].load()),
+    SERVER_CONFIG.batch.concurrency,
+    (index, outcome, error) => onResult(buildBatchResult(index, images[index].name, outcome, error, params)),
+    signal
+  );
+}
+
+/**
+ * 流式输出批量转换结果
+ * 先输出一行 start（共用参数），每张图片完成时输出一行 result（按完成顺序，index 为上传顺序），最后输出一行 end（统计）。
+ * 客户端断开后不再开始新的图片。
+ */
+async function* batchResultLines(
+  images: BatchImage[],
+  params: ConvertRequestParams,
+  shared: Record<string, unknown>
+): AsyncGenerator<string> {
+  const abortController = new AbortController();
+  const pendingLines: string[] = [];
+  let wake: (() => void) | null = null;
+  let finished = false;
+  let succeeded = 0;
+
+  const batch = convertBatch(images, params, result => {
+    if (result.success) {
+      succeeded++;
+    }
+    pendingLines.push(toNdjsonLine({ type: 'result', ...result }));
+    wake?.();
+  }, abortController.signal).finally(() => {
+    finished = true;
+    wake?.();
+  });
+
+  try {
+    yield toNdjsonLine({ type: 'start', total: images.length, ...shared });
+    while (pendingLines.length > 0 || !finished) {
+      if (pendingLines.length > 0) {
+        yield pendingLines.shift()!;
+      } else {
+        await new Promise<void>(resolve => { wake = resolve; });
+        wake = null;
+      }
+    }
+    await batch;
+    yield toNdjsonLine({
+      type: 'end',
+      summary: { total: images.length, succeeded, failed: images.length - succeeded }
+    });
+  } finally {
+    abortController.abort();
+  }
+}
+
+export async function POST(request: NextRequest) {
+  try {
+    const formData = await request.formData();
+
+    // 所有图片共用同一组参数，调色板只解析一次
+    const params = parseConvertRequest(formData);
+    if (params.granularities) {
+      throw new ConvertRequestError('批量转换只支持单个粒度 (granularity)');
+    }
+
+    const images = await collectBatchImages(formData);
+    if (images.length === 0) {
+      return NextResponse.json({
+        success: false,
+        error: '缺少图片文件',
+        details: '通过 images 字段上传图片，或通过 archive 字段上传包含图片的 ZIP 压缩包'
+      }, { status: 400 });
+    }
+    if (images.length > SERVER_CONFIG.batch.maxImages) {
+      return NextResponse.json({
+        success: false,
+        error: `一次最多转换 ${SERVER_CONFIG.batch.maxImages} 张图片`,
+        details: `收到 ${images.length} 张图片`
+      }, { status: 400 });
+    }
+
+    const shared = {
+      paletteName: params.paletteName,
+      processingParams: {
+        granularity: params.granularity,
+        ...buildProcessingParams(params, resolveBackgroundKeys(params)),
+        concurrency: SERVER_CONFIG.batch.concurrency
+      }
+    };
+
+    // 流式响应：每张图片完成后立即输出，不必等待整批完成
+    if (wantsNdjson(request, formData)) {
+      return createNdjsonResponse(batchResultLines(images, params, shared));
+    }
+
+    // 结果按上传顺序返回
+    const results: Array<ReturnType<typeof buildBatchResult>> = new Array(images.length);
+    await convertBatch(images, params, result => {
+      results[result.index] = result;
+    });
+    const succeeded = results.filter(result => result.success).length;
+
+    return NextResponse.json({
+      success: true,
+      data: {
+        results,
+        ...shared,
+        summary: {
+          total: results.length,
+          succeeded,
+          failed: results.length - succeeded
+        }
+      }
+    });
+
+  } catch (error) {
+    if (error instanceof ConvertRequestError) {
+      return NextResponse.json({
+        success: false,
+        error: error.message,
+        details: error.details
+      }, { status: error instanceof BatchArchiveTooLargeError ? 413 : 400 });
+    }
+
+    console.error('批量转换错误:', error);
+    return NextResponse.json(
+      {
+        success: false,
+        error: '批量转换失败',
+        details: error instanceof Error ? error.message : '未知错误'
+      },
+      { status: 500 }
+    );
+  }
+}
+
+// 支持GET请求返回API文档
+export async function GET() {
+  const docConfig = getEndpointDoc('batch');
+  return NextResponse.json(docConfig);
+}
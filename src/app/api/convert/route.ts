@@ -1,31 +1,56 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { calculatePixelGrid, PixelationMode, PaletteColor } from '../../../utils/pixelation';
+import { convertImage, convertImageSizes, ConvertOutcome } from '../../../utils/convertService';
 import {
-  getDefaultPalette,
-  parseCustomPalette,
-  parsePresetPalette,
-  calculateColorCounts,
-  createImageFromBuffer,
-  validateConvertParams
-} from '../../../utils/apiUtils';
-import { ColorSystem, findTransparentFallbackColor } from '../../../utils/colorSystemUtils';
-import { CustomPalette } from '@/types/paletteTypes';
+  ConvertRequestError,
+  ConvertRequestParams,
+  buildColorSummary,
+  buildPatternData,
+  buildPatternHandle,
+  buildProcessingParams,
+  createConvertJob,
+  parseConvertRequest
+} from '../../../utils/convertRequest';
+import { createNdjsonResponse, gridRowLines, toNdjsonLine, wantsNdjson } from '../../../utils/ndjsonStream';
+import { WorkerPoolOverloadedError } from '../../../utils/workerPool';
 import { getEndpointDoc } from '../../../config/apiDocs';
+import { SERVER_CONFIG } from '../../../config/serverConfig';
+
+/**
+ * 流式输出图纸
+ * 先输出一行 start（共用参数），每个粒度输出一行 pattern（尺寸和颜色统计），随后逐行输出网格（row），最后一行 end。
+ */
+function* patternLines(
+  start: Record<string, unknown>,
+  patterns: Array<{ granularity: number; outcome: ConvertOutcome }>,
+  params: ConvertRequestParams
+): Generator<string> {
+  yield toNdjsonLine({ type: 'start', ...start });
+  for (const { granularity, outcome: { result, cacheStatus } } of patterns) {
+    const { grid } = result;
+    yield toNdjsonLine({
+      type: 'pattern',
+      granularity,
+      width: grid.width,
+      height: grid.height,
+      colorSystem: params.colorSystem,
+      ...buildColorSummary(grid),
+      ...buildPatternHandle(result, params),
+      sampledWidth: result.sampledWidth,
+      sampledHeight: result.sampledHeight,
+      cacheStatus
+    });
+    yield* gridRowLines(grid, { granularity });
+  }
+  yield toNdjsonLine({ type: 'end' });
+}
 
 export async function POST(request: NextRequest) {
   try {
     const formData = await request.formData();
     const imageFile = formData.get('image') as File;
 
-    // 获取参数，设置默认值
-    const granularity = parseInt(formData.get('granularity') as string) || 50;
-    const similarityThreshold = parseInt(formData.get('similarityThreshold') as string) || 30;
-    const pixelationMode = (formData.get('pixelationMode') as PixelationMode) || PixelationMode.Dominant;
-    const selectedColorSystem = formData.get('selectedColorSystem') as ColorSystem || 'MARD';
-    const selectedPalette = formData.get('selectedPalette') as string || '290色';
-
-    // 获取自定义调色板数据（仅当选择 custom 时使用）
-    const customPaletteData = formData.get('customPalette') as string;
+    // 解析参数和调色板（参数错误时抛出 ConvertRequestError）
+    const params = parseConvertRequest(formData);
 
     // 验证必要参数
     if (!imageFile) {
@@ -35,133 +60,119 @@ export async function POST(request: NextRequest) {
       }, { status: 400 });
     }
 
-    // 验证参数范围
-    const validation = validateConvertParams({ granularity, similarityThreshold, pixelationMode });
-    if (!validation.isValid) {
-      return NextResponse.json({
-        success: false,
-        error: validation.error
-      }, { status: 400 });
-    }
-
-    // 将文件转换为buffer
-    const arrayBuffer = await imageFile.arrayBuffer();
-    const buffer = Buffer.from(arrayBuffer);
-
-    // 创建图像和canvas
-    const { image, ctx } = await createImageFromBuffer(buffer);
-
-    // 获取调色板数据
-    let palette: PaletteColor[];
-    let paletteSource = 'default';
-    let paletteName = '290色';
+    // 解码、像素化、合并相似颜色、背景移除在工作线程中执行
+    // 图片数据以 ArrayBuffer 形式转移给工作线程，不做复制
+    // 相同图片和参数的结果会被缓存，命中时不再解码和像素化
+    const job = createConvertJob(params, await imageFile.arrayBuffer());
+    const { granularities } = params;
+    // 流式响应：转换完成后逐行输出网格，不构建完整的 mappedData
+    const stream = wantsNdjson(request, formData);
+
+    if (granularities) {
+      // 多个粒度：图片只解码一次，每个粒度生成一份图纸
+      const outcomes = await convertImageSizes(job, granularities);
+      const { imageWidth, imageHeight, backgroundKeys } = outcomes[0].result;
+      const shared = {
+        paletteName: params.paletteName,
+        processingParams: {
+          granularities,
+          ...buildProcessingParams(params, backgroundKeys)
+        },
+        imageInfo: {
+          originalWidth: imageWidth,
+          originalHeight: imageHeight,
+          aspectRatio: imageHeight / imageWidth
+        }
+      };
+      // 每个粒度的结果缓存状态，按 granularities 的顺序以逗号分隔
+      const headers = { 'X-Convert-Cache': outcomes.map(outcome => outcome.cacheStatus).join(',') };
 
-    if (selectedPalette === 'custom') {
-      // 使用自定义调色板
-      if (!customPaletteData) {
-        return NextResponse.json({
-          success: false,
-          error: '选择了自定义调色板但未提供调色板数据'
-        }, { status: 400 });
+      if (stream) {
+        const patterns = outcomes.map((outcome, index) => ({ granularity: granularities[index], outcome }));
+        return createNdjsonResponse(patternLines(shared, patterns, params), headers);
       }
 
-      try {
-        const customColors = JSON.parse(customPaletteData) as CustomPalette;
-        palette = parseCustomPalette(customColors, selectedColorSystem);
-        paletteSource = 'custom';
-        paletteName = customColors.name || `${palette.length}色`;
-        console.log(`使用自定义调色板，包含 ${palette.length} 种颜色`);
-      } catch (error) {
-        return NextResponse.json({
-          success: false,
-          error: '自定义调色板格式错误',
-          details: error instanceof Error ? error.message : '未知错误'
-        }, { status: 400 });
-      }
-    } else if (selectedPalette !== '290色') {
-      // 使用预制调色板（非默认调色板的其他选项）
-      try {
-        palette = parsePresetPalette(selectedPalette, selectedColorSystem);
-        paletteSource = 'preset';
-        paletteName = `${selectedPalette}`;
-        console.log(`使用预制调色板 ${selectedPalette}，包含 ${palette.length} 种颜色`);
-      } catch (error) {
-        return NextResponse.json({
-          success: false,
-          error: `预制调色板加载错误: ${selectedPalette}`,
-          details: error instanceof Error ? error.message : '未知错误'
-        }, { status: 400 });
-      }
-    } else {
-      // 使用默认调色板 (290色)
-      palette = getDefaultPalette(selectedColorSystem);
-      if (palette.length === 0) {
-        return NextResponse.json({
-          success: false,
-          error: '无效的调色板'
-        }, { status: 400 });
-      }
-      paletteName = '290色';
+      return NextResponse.json({
+        success: true,
+        data: {
+          patterns: outcomes.map(({ result, cacheStatus }, index) => ({
+            granularity: granularities[index],
+            ...buildPatternData(result, params.colorSystem, params.pixelFormat),
+            ...buildPatternHandle(result, params),
+            sampledWidth: result.sampledWidth,
+            sampledHeight: result.sampledHeight,
+            cacheStatus
+          })),
+          ...shared
+        }
+      }, { headers });
     }
-    // 计算网格尺寸
-    const aspectRatio = image.height / image.width;
-    const N = granularity;
-    const M = Math.max(1, Math.round(N * aspectRatio));
-
-    // 使用优化的透明色查找函数
-    const defaultColor = findTransparentFallbackColor(palette, selectedColorSystem as ColorSystem || 'MARD');
-
-    // 执行像素化处理
-    const processedData = calculatePixelGrid(
-      ctx,
-      image.width,
-      image.height,
-      N,
-      M,
-      palette,
-      pixelationMode,
-      defaultColor
-    );
 
-    // 计算颜色统计
-    const colorCounts = calculateColorCounts(processedData);
+    const outcome = await convertImage(job);
+    const { result, cacheStatus } = outcome;
+    const { imageWidth, imageHeight, sampledWidth, sampledHeight, backgroundKeys } = result;
+    const aspectRatio = imageHeight / imageWidth;
 
-    // 计算总珠子数量
-    const totalBeadCount = Object.values(colorCounts).reduce((sum, { count }) => sum + count, 0);
-
-    // 创建符合新 PixelData 接口的数据结构
-    const pixelData = {
-      mappedData: processedData,
-      width: N,
-      height: M,
-      colorSystem: selectedColorSystem as ColorSystem
-    };
+    if (stream) {
+      const start = {
+        paletteName: params.paletteName,
+        processingParams: {
+          granularity: params.granularity,
+          ...buildProcessingParams(params, backgroundKeys)
+        },
+        imageInfo: { originalWidth: imageWidth, originalHeight: imageHeight, aspectRatio }
+      };
+      return createNdjsonResponse(
+        patternLines(start, [{ granularity: params.granularity, outcome }], params),
+        { 'X-Convert-Cache': cacheStatus }
+      );
+    }
 
     // 返回完整的调色板
     return NextResponse.json({
       success: true,
       data: {
-        pixelData: pixelData,
-        colorCounts: colorCounts,
-        totalBeadCount: totalBeadCount,
-        paletteName,
+        ...buildPatternData(result, params.colorSystem, params.pixelFormat),
+        ...buildPatternHandle(result, params),
+        paletteName: params.paletteName,
         processingParams: {
-          granularity,
-          similarityThreshold,
-          pixelationMode,
-          selectedColorSystem,
-          paletteSource,
-          customPaletteColors: paletteSource === 'custom' ? palette.length : undefined
+          granularity: params.granularity,
+          ...buildProcessingParams(params, backgroundKeys)
         },
         imageInfo: {
-          originalWidth: image.width,
-          originalHeight: image.height,
-          aspectRatio: aspectRatio
+          originalWidth: imageWidth,
+          originalHeight: imageHeight,
+          aspectRatio: aspectRatio,
+          sampledWidth,
+          sampledHeight
         }
       }
+    }, {
+      // 结果缓存状态：memory / disk（命中）、miss（未命中）、disabled（未启用缓存）
+      headers: { 'X-Convert-Cache': cacheStatus }
     });
 
   } catch (error) {
+    if (error instanceof ConvertRequestError) {
+      return NextResponse.json({
+        success: false,
+        error: error.message,
+        details: error.details
+      }, { status: 400 });
+    }
+
+    // 转换任务队列已满，提示客户端稍后重试
+    if (error instanceof WorkerPoolOverloadedError) {
+      return NextResponse.json({
+        success: false,
+        error: '服务繁忙，请稍后重试',
+        details: error.message
+      }, {
+        status: 503,
+        headers: { 'Retry-After': String(SERVER_CONFIG.convertPool.retryAfterSeconds) }
+      });
+    }
+
     console.error('图片处理错误:', error);
     return NextResponse.json(
       {
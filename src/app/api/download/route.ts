@@ -1,22 +1,126 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { generateImageBuffer } from '../../../utils/serverImageDownloader';
-import { GridDownloadOptions } from '../../../types/downloadTypes';
+import { decodeCompactPixelData, isCompactPixelData } from '../../../utils/compactPixelData';
+import { IndexedPixelGrid, applyGridEdits, indexedGridFromMappedData } from '../../../utils/pixelGrid';
+import { getStoredPattern } from '../../../utils/patternStore';
+import { DEFAULT_PAGE_CELLS } from '../../../utils/patternPages';
+import { RenderPatch, RenderTooLargeError, renderDownload } from '../../../utils/renderService';
+import { WorkerPoolOverloadedError } from '../../../utils/workerPool';
+import {
+  cacheRenderOutput,
+  getCachedRender,
+  getRenderCacheKey,
+  isRenderCacheEnabled,
+  matchesIfNoneMatch,
+  recordNotModified
+} from '../../../utils/renderCache';
+import { DownloadOutput, GridDownloadOptions } from '../../../types/downloadTypes';
 import { getEndpointDoc } from '../../../config/apiDocs';
+import { SERVER_CONFIG } from '../../../config/serverConfig';
+
+// 各输出格式的内容类型和文件名
+const OUTPUT_FORMATS: Record<DownloadOutput, { contentType: string; fileName: string }> = {
+  png: { contentType: 'image/png', fileName: 'pattern.png' },
+  svg: { contentType: 'image/svg+xml', fileName: 'pattern.svg' },
+  pages: { contentType: 'application/zip', fileName: 'pattern-pages.zip' },
+  pdf: { contentType: 'application/pdf', fileName: 'pattern.pdf' }
+};
+const DOWNLOAD_OUTPUTS = Object.keys(OUTPUT_FORMATS) as DownloadOutput[];
+
+function badRequest(error: string, details?: string) {
+  return NextResponse.json({ success: false, error, details }, { status: 400 });
+}
+
+// 按客户端读取的速度逐块输出（背压），客户端断开时结束生成
+function streamResponse(chunks: AsyncIterable<Buffer>, headers: Record<string, string>): Response {
+  const iterator = chunks[Symbol.asyncIterator]();
+  const stream = new ReadableStream<Uint8Array>({
+    async pull(controller) {
+      try {
+        const { value, done } = await iterator.next();
+        if (done) {
+          controller.close();
+        } else {
+          controller.enqueue(new Uint8Array(value.buffer, value.byteOffset, value.byteLength));
+        }
+      } catch (error) {
+        console.error('图片生成错误:', error);
+        controller.error(error);
+      }
+    },
+    async cancel() {
+      await iterator.return?.();
+    }
+  });
+  return new Response(stream, { headers });
+}
 
 export async function POST(request: NextRequest) {
   try {
     const body = await request.json();
     const {
       pixelData,
+      patternId,
+      edits,
       downloadOptions = {}
     } = body;
 
-    // 验证必要参数
-    if (!pixelData || !pixelData.mappedData || !pixelData.width || !pixelData.height) {
-      return NextResponse.json({
-        success: false,
-        error: '缺少必要的像素数据参数'
-      }, { status: 400 });
+    // 图纸来源：patternId（/api/convert 使用 storePattern=true 保存的图纸），或 pixelData
+    let grid: IndexedPixelGrid;
+    if (patternId) {
+      const stored = typeof patternId === 'string' ? getStoredPattern(patternId) : null;
+      if (!stored) {
+        return NextResponse.json({
+          success: false,
+          error: '图纸不存在或已过期',
+          details: '请重新调用 /api/convert（storePattern=true）生成图纸，或直接提交 pixelData'
+        }, { status: 404 });
+      }
+      grid = stored.grid;
+    } else {
+      // 验证必要参数（pixelData 可以是 mappedData 格式，也可以是 /api/convert 返回的紧凑编码）
+      if (!pixelData || !(pixelData.mappedData || isCompactPixelData(pixelData)) || !pixelData.width || !pixelData.height) {
+        return badRequest('缺少必要的像素数据参数');
+      }
+      if (isCompactPixelData(pixelData)) {
+        try {
+          grid = decodeCompactPixelData(pixelData);
+        } catch (error) {
+          return badRequest('紧凑像素数据格式错误', error instanceof Error ? error.message : '未知错误');
+        }
+      } else {
+        // 客户端提交的 MappedPixel[][] 只在入口处转换一次，后续统计和绘制都基于紧凑网格
+        try {
+          grid = indexedGridFromMappedData(pixelData.mappedData, pixelData.width, pixelData.height);
+        } catch (error) {
+          return badRequest('像素数据格式错误', error instanceof Error ? error.message : '未知错误');
+        }
+      }
+    }
+
+    // 输出格式：整张 PNG / SVG，或按 pageCells 分页的 PNG 压缩包 / 多页 PDF
+    const output: DownloadOutput = downloadOptions.output ?? 'png';
+    if (!DOWNLOAD_OUTPUTS.includes(output)) {
+      return badRequest('输出格式无效', `output 必须是 ${DOWNLOAD_OUTPUTS.join('、')} 之一`);
+    }
+    const pageCells = downloadOptions.pageCells ?? DEFAULT_PAGE_CELLS;
+    if (!Number.isInteger(pageCells) || pageCells < 1) {
+      return badRequest('分页大小无效', 'pageCells 必须是正整数');
+    }
+
+    // 单元格修改应用在图纸副本上，保存的图纸保持不变；
+    // 整张 PNG 在修改前图纸的底图上只重绘修改过的单元格（见 renderService.ts）
+    let patch: RenderPatch | null = null;
+    if (edits !== undefined) {
+      if (!Array.isArray(edits)) {
+        return badRequest('图纸修改格式错误', 'edits 必须是数组');
+      }
+      try {
+        const baseGrid = grid;
+        grid = applyGridEdits(baseGrid, edits);
+        patch = { baseGrid, cells: Uint32Array.from(edits, ({ x, y }) => y * baseGrid.width + x) };
+      } catch (error) {
+        return badRequest('图纸修改格式错误', error instanceof Error ? error.message : '未知错误');
+      }
     }
 
     // 设置默认下载选项
@@ -33,24 +137,60 @@ export async function POST(request: NextRequest) {
       ...downloadOptions
     };
 
-    // 使用server的图片生成功能
-    const imageBuffer = await generateImageBuffer({
+    const renderParams = {
       title: downloadOptions.title,
-      pixelData,
       renderMode: downloadOptions.renderMode || 'dpi',
       options
-    });
+    };
 
-    // 不再生成文件名，客户端会自己处理
-    return new NextResponse(imageBuffer, {
-      headers: {
-        'Content-Type': 'image/png',
-        'Content-Disposition': `attachment; filename="pattern.png"`,
-        'Content-Length': imageBuffer.length.toString()
-      }
+    // 相同图纸和参数的输出完全相同：ETag 匹配时返回 304，缓存命中时直接返回缓存的输出
+    const cacheKey = getRenderCacheKey(grid, renderParams, output, pageCells);
+    const etag = `"${cacheKey}"`;
+    if (matchesIfNoneMatch(request.headers.get('if-none-match'), etag)) {
+      recordNotModified();
+      return new Response(null, { status: 304, headers: { ETag: etag } });
+    }
+
+    const { contentType, fileName } = OUTPUT_FORMATS[output];
+    const headers = {
+      'Content-Type': contentType,
+      // 不再生成文件名，客户端会自己处理
+      'Content-Disposition': `attachment; filename="${fileName}"`,
+      ETag: etag
+    };
+    const cached = getCachedRender(cacheKey);
+    if (cached) {
+      return new NextResponse(cached, {
+        headers: { ...headers, 'Content-Length': cached.length.toString(), 'X-Render-Cache': 'hit' }
+      });
+    }
+
+    // 渲染交给工作线程池（见 renderService.ts）；分页输出逐页渲染并流式返回，内存占用只与单页大小有关
+    const chunks = await renderDownload(grid, renderParams, output, pageCells, patch);
+    return streamResponse(cacheRenderOutput(cacheKey, chunks), {
+      ...headers,
+      'X-Render-Cache': isRenderCacheEnabled() ? 'miss' : 'disabled'
     });
 
   } catch (error) {
+    if (error instanceof RenderTooLargeError) {
+      return NextResponse.json({
+        success: false,
+        error: '图纸尺寸超出渲染上限',
+        details: `${error.message}，请降低 dpi / fixedWidth，使用 output=pages / pdf 分页输出，或使用矢量的 output=svg`
+      }, { status: 413 });
+    }
+    if (error instanceof WorkerPoolOverloadedError) {
+      return NextResponse.json({
+        success: false,
+        error: '服务繁忙，请稍后重试',
+        details: error.message
+      }, {
+        status: 503,
+        headers: { 'Retry-After': String(SERVER_CONFIG.downloadPool.retryAfterSeconds) }
+      });
+    }
+
     console.error('图片生成错误:', error);
     return NextResponse.json(
       {
@@ -1,7 +1,8 @@
 import { NextRequest, NextResponse } from 'next/server';
 import { getMardToHexMapping, getColorSystemOptions, ColorSystem } from '../../../utils/colorSystemUtils';
 import { hexToRgb } from '../../../utils/pixelation';
-import { validateCustomPalette, getAvailablePresetPalettes } from '../../../utils/apiUtils';
+import { validateCustomPalette } from '../../../utils/apiUtils';
+import { getCachedPresetPalettes } from '../../../utils/paletteRegistry';
 import { getEndpointDoc } from '../../../config/apiDocs';
 
 export async function GET(request: NextRequest) {
@@ -45,7 +46,7 @@ export async function GET(request: NextRequest) {
       const totalColors = Object.keys(mardToHexMapping).length;
 
       // 获取预制调色板
-      const presetPalettes = getAvailablePresetPalettes();
+      const presetPalettes = getCachedPresetPalettes();
 
       const paletteOptions = [
         { name: 'custom', description: '用户上传的调色板', colorCount: 0 },
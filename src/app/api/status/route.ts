@@ -1,5 +1,12 @@
 import { NextResponse, NextRequest } from 'next/server';
 import { getEndpointDoc } from '../../../config/apiDocs';
+import { getConvertPoolStats } from '../../../utils/convertService';
+import { getConvertCacheStats } from '../../../utils/convertCache';
+import { getDecodedImageCacheStats } from '../../../utils/decodedImageCache';
+import { getPatternStoreStats } from '../../../utils/patternStore';
+import { getRenderCacheStats } from '../../../utils/renderCache';
+import { getRenderPoolStats } from '../../../utils/renderService';
+import { getBaseRenderCacheStats } from '../../../utils/baseRenderCache';
 
 export async function GET(request: NextRequest) {
   // 如果请求文档，返回API文档
@@ -32,6 +39,20 @@ export async function GET(request: NextRequest) {
         },
         responseTime: 0 // 将在最后计算
       },
+      // 图片转换线程池负载，未启用线程池时为 null
+      convertPool: getConvertPoolStats(),
+      // 转换结果缓存的命中统计
+      convertCache: getConvertCacheStats(),
+      // 解码结果（RGBA）缓存的命中统计
+      decodedImageCache: getDecodedImageCacheStats(),
+      // 服务端保存的图纸（storePattern=true）
+      patternStore: getPatternStoreStats(),
+      // /api/download 渲染结果缓存的命中统计
+      renderCache: getRenderCacheStats(),
+      // 图纸渲染线程池负载和正在渲染的像素数，未启用线程池时为 null
+      renderPool: getRenderPoolStats(),
+      // 增量渲染底图缓存的命中统计
+      renderBaseCache: getBaseRenderCacheStats(),
       features: {
         imageConversion: true,
         downloadGeneration: true,
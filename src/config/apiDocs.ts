@@ -47,7 +47,7 @@ export interface ApiEndpointDoc {
 // 结构前置定义
 const sharePixelData: Parameter = {
   type: 'PixelData',
-  description: 'PixelData (包含 mappedData, width, height, colorSystem)',
+  description: 'PixelData (包含 mappedData, width, height, colorSystem)；pixelFormat=indexed 时为紧凑编码 (包含 format, palette, indexBytes, indices, width, height, colorSystem)，/api/download 两种格式都接受',
   required: true,
   Parameters: {
     mappedData: {
@@ -80,6 +80,23 @@ const sharePixelData: Parameter = {
     colorSystem: {
       type: 'string',
       description: '色号系统 (MARD、COCO等)'
+    },
+    format: {
+      type: 'string',
+      description: '紧凑编码时为 "indexed"，此时没有 mappedData'
+    },
+    palette: {
+      type: 'MappedPixel[]',
+      description: '紧凑编码的调色板表，表项格式与 mappedData 的单元格相同，外部背景使用带 isExternal 的表项',
+      examples: [[{ "key": "H07", "color": "#000000" }, { "key": "T01", "color": "#FFFFFF", "isExternal": true }]]
+    },
+    indexBytes: {
+      type: 'number',
+      description: '紧凑编码中每个下标的字节数：调色板表不超过256项时为1，否则为2（小端序）'
+    },
+    indices: {
+      type: 'string',
+      description: '紧凑编码中按行优先排列的调色板表下标，base64 编码，解码后长度为 width * height * indexBytes 字节'
     }
   }
 }
@@ -141,7 +158,7 @@ export const API_DOCS: Record<string, ApiEndpointDoc> = {
         type: 'number',
         default: 30,
         range: '0-100',
-        description: '颜色相似度阈值'
+        description: '颜色相似度阈值 - RGB距离小于该值的低频颜色会合并到出现次数更多的颜色中，与网页端效果一致'
       },
       pixelationMode: {
         type: 'string',
@@ -172,7 +189,43 @@ export const API_DOCS: Record<string, ApiEndpointDoc> = {
         default: 'MARD',
         description: '色号系统'
       },
-      customPalette: shareCustomPalette
+      customPalette: shareCustomPalette,
+      removeBackground: {
+        type: 'boolean',
+        default: false,
+        description: '是否移除背景 - 从边界开始洪水填充，与边界连通的背景色单元格标记为isExternal，不计入颜色统计'
+      },
+      backgroundKeys: {
+        type: 'string | string[]',
+        description: '背景色号列表，逗号分隔或JSON数组；默认使用透明区域的备用色（如T01）',
+        examples: ['T01,H02', '["T01","H02"]']
+      },
+      downscale: {
+        type: 'boolean',
+        default: false,
+        description: '是否在像素化前先把图片缩小到每个单元格约4x4像素（由CONVERT_DOWNSCALE_SAMPLES配置），大图处理更快、内存占用更少，结果与原图处理可能略有差异'
+      },
+      granularities: {
+        type: 'string | number[]',
+        description: '粒度列表，逗号分隔或JSON数组，每个值在1-200之间，最多8个（由CONVERT_MAX_GRANULARITIES配置）。提供时忽略granularity，一次上传生成多个尺寸的图纸，图片只解码一次；响应格式见notes',
+        examples: ['30,50,80,120', '[30,50,80,120]']
+      },
+      stream: {
+        type: 'boolean',
+        default: false,
+        description: '是否以NDJSON流式返回（也可通过请求头Accept: application/x-ndjson启用），网格逐行输出，客户端可以边接收边渲染；行格式见notes'
+      },
+      pixelFormat: {
+        type: 'string',
+        default: 'mapped',
+        options: ['mapped', 'indexed'],
+        description: 'pixelData 的格式：mapped 为 MappedPixel[][]；indexed 为紧凑编码（调色板表 + base64 打包的下标数组），200x200 的图纸体积约为 mapped 的 1/20，可直接提交给 /api/download'
+      },
+      storePattern: {
+        type: 'boolean',
+        default: false,
+        description: '是否在服务端保存生成的图纸，响应中返回patternId（多尺寸转换时每个粒度各有一个），/api/download 可以只提交patternId而不必回传pixelData；未启用图纸存储时patternId为null'
+      }
     },
     response: {
       type: 'object',
@@ -259,6 +312,18 @@ export const API_DOCS: Record<string, ApiEndpointDoc> = {
                   description: '调色板来源：default=默认调色板, custom=自定义调色板, preset=预设调色板',
                   examples: ['default', 'custom', 'preset']
                 },
+                removeBackground: {
+                  type: 'boolean',
+                  description: '是否执行了背景移除'
+                },
+                backgroundKeys: {
+                  type: 'string[]',
+                  description: '背景移除使用的背景色号列表（仅在removeBackground为true时返回）'
+                },
+                downscale: {
+                  type: 'boolean',
+                  description: '是否启用了降采样'
+                },
               }
             },
             imageInfo: {
@@ -276,6 +341,14 @@ export const API_DOCS: Record<string, ApiEndpointDoc> = {
                 aspectRatio: {
                   type: 'number',
                   description: '图片宽高比 (width / height)'
+                },
+                sampledWidth: {
+                  type: 'number',
+                  description: '实际参与像素化的图片宽度（未降采样时等于原图宽度）'
+                },
+                sampledHeight: {
+                  type: 'number',
+                  description: '实际参与像素化的图片高度（未降采样时等于原图高度）'
                 }
               }
             }
@@ -358,6 +431,22 @@ export const API_DOCS: Record<string, ApiEndpointDoc> = {
           selectedPalette: '144色',
           pixelationMode: 'dominant'
         }
+      },
+      multipleGranularities: {
+        description: '一次生成多个尺寸的图纸',
+        parameters: {
+          image: '[图片文件]',
+          granularities: '30,50,80,120',
+          pixelationMode: 'average'
+        }
+      },
+      stream: {
+        description: '流式返回网格行',
+        parameters: {
+          image: '[图片文件]',
+          granularity: '120',
+          stream: 'true'
+        }
       }
     },
     notes: [
@@ -369,7 +458,189 @@ export const API_DOCS: Record<string, ApiEndpointDoc> = {
       '版本3.0不包含name字段，版本4.0包含name字段',
       '调色板中的key字段表示色号，用于生成图纸时显示',
       'colorCounts返回结果中的key为对应色号系统的色号标识',
-      'processingParams.paletteSource指示调色板来源：default、custom或preset'
+      'processingParams.paletteSource指示调色板来源：default、custom或preset',
+      '像素化后会按similarityThreshold合并相似颜色，结果与网页端一致',
+      'removeBackground=true时，外部背景单元格在mappedData中带有isExternal: true，且不计入colorCounts和totalBeadCount',
+      'downscale=true时像素化基于缩小后的图片，主导色模式下颜色会受缩放插值影响，与原图处理结果的差异可用 tests/test_all_features.py 的降采样对比测试查看',
+      '相同图片（按内容SHA-256）和相同参数的转换结果会被缓存，响应头X-Convert-Cache表示缓存状态：memory/disk为命中，shared为与正在处理的相同请求共用同一次转换，miss为未命中，disabled为未启用',
+      '同一张图片只改变粒度、模式等参数重复转换时，会复用缓存的解码结果（downscale=true 的请求除外）',
+      '提供granularities时，data.patterns按请求顺序返回每个粒度的图纸：{granularity, pixelData, colorCounts, totalBeadCount, sampledWidth, sampledHeight, cacheStatus}；paletteName、processingParams（含granularities）和imageInfo为所有图纸共用，响应头X-Convert-Cache为各粒度的缓存状态，以逗号分隔',
+      'stream=true时响应为application/x-ndjson，每行一个JSON对象：首行{"type":"start", paletteName, processingParams, imageInfo}；每个粒度一行{"type":"pattern", granularity, width, height, colorSystem, colorCounts, totalBeadCount, sampledWidth, sampledHeight, cacheStatus}，随后height行{"type":"row", granularity, y, cells}（cells格式与mappedData的一行相同）；最后一行{"type":"end"}。开始输出后发生的错误以{"type":"error", error, details}行返回',
+      'storePattern=true时保存的图纸在最后一次使用之后保留PATTERN_STORE_TTL秒（默认3600），总大小超过PATTERN_STORE_MB（默认64）时淘汰最久未使用的图纸，过期后/api/download返回404',
+      'pixelFormat=indexed时pixelData为{format:"indexed", width, height, colorSystem, palette, indexBytes, indices}：第i行第j列单元格为palette[下标]，下标位于indices解码后的第(i*width+j)*indexBytes字节；stream=true的row行不受影响',
+      '图片解码和像素化在工作线程池中执行；所有线程都忙且排队任务已满时返回503，响应头Retry-After给出建议的重试秒数'
+    ]
+  },
+
+  batch: {
+    endpoint: '/api/batch',
+    method: 'POST',
+    contentType: 'multipart/form-data',
+    description: '批量将多张图片转换为拼豆图纸，所有图片共用同一组参数',
+    parameters: {
+      images: {
+        type: 'File[]',
+        description: '图片文件，同一字段可以重复多次；与archive至少提供一个'
+      },
+      archive: {
+        type: 'File',
+        description: 'ZIP压缩包，按扩展名(png/jpg/jpeg/gif/bmp/webp)读取其中的图片，跳过目录、隐藏文件和__MACOSX'
+      },
+      granularity: {
+        type: 'number',
+        default: 50,
+        range: '1-200',
+        description: '图纸精细度，与/api/convert相同；批量转换不支持granularities'
+      },
+      similarityThreshold: {
+        type: 'number',
+        default: 30,
+        range: '0-100',
+        description: '颜色相似度阈值'
+      },
+      pixelationMode: {
+        type: 'string',
+        default: 'dominant',
+        options: ['dominant', 'average'],
+        description: '像素化模式：dominant=卡通模式, average=真实模式'
+      },
+      selectedPalette: {
+        type: 'string',
+        default: '290色',
+        description: '使用的调色板，与/api/convert相同'
+      },
+      selectedColorSystem: {
+        type: 'string',
+        default: 'MARD',
+        description: '色号系统'
+      },
+      customPalette: shareCustomPalette,
+      removeBackground: {
+        type: 'boolean',
+        default: false,
+        description: '是否移除背景'
+      },
+      backgroundKeys: {
+        type: 'string | string[]',
+        description: '背景色号列表，逗号分隔或JSON数组'
+      },
+      downscale: {
+        type: 'boolean',
+        default: false,
+        description: '是否在像素化前先缩小图片'
+      },
+      pixelFormat: {
+        type: 'string',
+        default: 'mapped',
+        options: ['mapped', 'indexed'],
+        description: 'pixelData 的格式，与/api/convert相同'
+      },
+      storePattern: {
+        type: 'boolean',
+        default: false,
+        description: '是否在服务端保存每张图片的图纸，成功的结果中返回patternId，与/api/convert相同'
+      },
+      stream: {
+        type: 'boolean',
+        default: false,
+        description: '是否以NDJSON流式返回（也可通过请求头Accept: application/x-ndjson启用），每张图片完成后立即输出一行；行格式见notes'
+      }
+    },
+    response: {
+      type: 'object',
+      description: '批量转换结果',
+      Parameters: {
+        success: {
+          type: 'boolean',
+          description: '请求是否处理成功（单张图片的失败见results）'
+        },
+        data: {
+          type: 'object',
+          description: '批量转换数据',
+          Parameters: {
+            results: {
+              type: 'object[]',
+              description: '按上传顺序（先images，后archive中的图片）排列的每张图片的结果。成功时包含index、name、success、pixelData、colorCounts、totalBeadCount、imageInfo、cacheStatus，与/api/convert的同名字段相同；失败时包含index、name、success=false和error'
+            },
+            paletteName: {
+              type: 'string',
+              description: '使用的调色板名称'
+            },
+            processingParams: {
+              type: 'object',
+              description: '所有图片共用的处理参数，字段与/api/convert相同，另有concurrency表示同时处理的图片数量'
+            },
+            summary: {
+              type: 'object',
+              description: '处理统计',
+              Parameters: {
+                total: { type: 'number', description: '图片总数' },
+                succeeded: { type: 'number', description: '成功数量' },
+                failed: { type: 'number', description: '失败数量' }
+              }
+            }
+          }
+        }
+      },
+      examples: [
+        {
+          success: true,
+          data: {
+            results: [
+              {
+                index: 0,
+                name: 'sprite-01.png',
+                success: true,
+                pixelData: { mappedData: [[{ key: 'H07', color: '#000000' }]], width: 32, height: 32, colorSystem: 'MARD' },
+                colorCounts: { H07: { count: 1024, color: '#000000' } },
+                totalBeadCount: 1024,
+                imageInfo: { originalWidth: 64, originalHeight: 64, aspectRatio: 1, sampledWidth: 64, sampledHeight: 64 },
+                cacheStatus: 'miss'
+              },
+              { index: 1, name: 'broken.png', success: false, error: 'Unsupported image type' }
+            ],
+            paletteName: '290色',
+            processingParams: {
+              granularity: 32,
+              similarityThreshold: 30,
+              pixelationMode: 'dominant',
+              selectedColorSystem: 'MARD',
+              paletteSource: 'default',
+              removeBackground: false,
+              downscale: false,
+              concurrency: 4
+            },
+            summary: { total: 2, succeeded: 1, failed: 1 }
+          }
+        }
+      ]
+    },
+    examples: {
+      files: {
+        description: '上传多张图片',
+        parameters: {
+          images: ['[图片文件1]', '[图片文件2]'],
+          granularity: '32',
+          selectedPalette: '290色'
+        }
+      },
+      archive: {
+        description: '上传ZIP压缩包',
+        parameters: {
+          archive: '[ZIP文件]',
+          granularity: '32',
+          pixelationMode: 'dominant'
+        }
+      }
+    },
+    notes: [
+      '调色板只解析一次，所有图片共用；工作线程中的最近色索引按调色板内容缓存，整批只构建一次',
+      '同时处理的图片数量由BATCH_CONCURRENCY配置（默认4），一次最多BATCH_MAX_IMAGES张（默认200）',
+      '单张图片失败（如文件损坏）不影响其他图片；转换线程池被其他请求占满时会等待后重试，多次重试仍失败时该图片返回错误',
+      '每张图片分别使用转换结果缓存，与/api/convert共享',
+      '压缩包只支持未压缩和deflate方式，不支持加密和ZIP64',
+      '压缩包中单个图片解压后超过BATCH_MAX_ENTRY_MB（默认10）时不解压，该图片返回错误；所有图片解压后共超过BATCH_MAX_TOTAL_MB（默认500）时整个请求返回413',
+      'stream=true时响应为application/x-ndjson：首行{"type":"start", total, paletteName, processingParams}；每张图片完成时输出一行{"type":"result", ...}，字段与results中的元素相同，按完成顺序输出，index为上传顺序；最后一行{"type":"end", summary}。客户端断开后不再开始新的图片'
     ]
   },
 
@@ -385,6 +656,15 @@ export const API_DOCS: Record<string, ApiEndpointDoc> = {
         description: '图纸标题 - 显示在图片顶部的标题栏中，高度已增加'
       },
       pixelData: sharePixelData,
+      patternId: {
+        type: 'string',
+        description: '/api/convert 使用 storePattern=true 返回的图纸ID，提供时不需要pixelData；图纸不存在或已过期时返回404'
+      },
+      edits: {
+        type: 'GridCellEdit[]',
+        description: '下载前对图纸的单元格修改（应用在副本上，不改变保存的图纸），可与patternId或pixelData一起使用。x为列、y为行（从0开始）；key省略时保持原颜色，color省略时使用图纸中同一色号的颜色；isExternal=true标记为外部背景。output=png时在修改前图纸的缓存底图上只重绘修改过的单元格和用量统计（增量渲染），同一张图纸多次小修改时远快于整张重绘',
+        examples: [[{ x: 0, y: 0, key: 'H07' }, { x: 5, y: 3, key: 'A01', color: '#FAF4C8' }, { x: 9, y: 9, isExternal: true }]]
+      },
       renderMode: {
         type: 'string',
         default: 'dpi',
@@ -453,16 +733,27 @@ export const API_DOCS: Record<string, ApiEndpointDoc> = {
             default: false,
             description: '是否在透明色（T01）上显示色号标识'
           },
+          output: {
+            type: 'string',
+            default: 'png',
+            options: ['png', 'svg', 'pages', 'pdf'],
+            description: '输出格式：png=整张图片；svg=整张图片的矢量版本（布局与相同参数的png一致，单元格按颜色合并为矩形，文件大小与dpi无关，适合高DPI打印）；pages=分页PNG的ZIP压缩包（page-001.png…，includeStats时另有stats.png）；pdf=多页PDF（统计单独一页）。分页时逐页绘制并流式返回，内存占用只与单页大小有关，适合超大图纸'
+          },
+          pageCells: {
+            type: 'number',
+            default: 30,
+            description: '分页时每页的边长（单元格数），向下取整为gridInterval的整数倍；每页标题注明页码和覆盖的列、行范围，坐标与整张图纸一致。PDF中每个单元格按5mm换算页面尺寸'
+          },
         }
       }
     },
     response: {
       type: 'binary',
-      description: '图片数据',
+      description: '图片数据（output=svg时为SVG，output=pages时为ZIP压缩包，output=pdf时为PDF）',
       Parameters: {
         contentType: {
           type: 'string',
-          description: '内容类型',
+          description: '内容类型：image/png、image/svg+xml、application/zip 或 application/pdf',
           default: 'image/png'
         },
         headers: {
@@ -473,6 +764,14 @@ export const API_DOCS: Record<string, ApiEndpointDoc> = {
               type: 'string',
               description: '内容处理方式，指示浏览器下载文件',
               default: 'attachment; filename="..."'
+            },
+            ETag: {
+              type: 'string',
+              description: '由图纸内容和规范化后的下载参数计算，相同输入的输出完全相同；再次下载时在请求头 If-None-Match 中带上该值，未变化时返回304且没有响应体'
+            },
+            'X-Render-Cache': {
+              type: 'string',
+              description: '渲染结果缓存状态：hit（直接返回缓存的输出）、miss（重新渲染，完成后写入缓存）、disabled（DOWNLOAD_CACHE_MB=0）'
             }
           }
         }
@@ -515,8 +814,54 @@ export const API_DOCS: Record<string, ApiEndpointDoc> = {
           includeStats: true,
           showTransparentLabels: false
         }
+      },
+      patternId: {
+        description: '引用服务端保存的图纸并修改两个单元格，不需要回传pixelData',
+        patternId: '3f1c2a8e-5b7d-4e9a-9c1f-2d6b8a4e7c10',
+        edits: [{ x: 0, y: 0, key: 'H07' }, { x: 1, y: 0, key: 'H07' }],
+        downloadOptions: {
+          renderMode: 'dpi',
+          dpi: 150
+        }
+      },
+      vectorSvg: {
+        description: '600 DPI打印用的矢量图纸，坐标与600 DPI的PNG一致',
+        patternId: '3f1c2a8e-5b7d-4e9a-9c1f-2d6b8a4e7c10',
+        downloadOptions: {
+          title: '印刷用拼豆图纸',
+          output: 'svg',
+          dpi: 600
+        }
+      },
+      pagedPdf: {
+        description: '超大图纸分页输出为PDF，每页20x20格',
+        patternId: '3f1c2a8e-5b7d-4e9a-9c1f-2d6b8a4e7c10',
+        downloadOptions: {
+          title: '大幅拼豆图纸',
+          output: 'pdf',
+          pageCells: 20,
+          gridInterval: 10
+        }
+      },
+      compactPixelData: {
+        description: '提交紧凑编码的像素数据（/api/convert 使用 pixelFormat=indexed 返回的 pixelData），请求体积和解析时间远小于 mappedData',
+        pixelData: {
+          format: 'indexed',
+          width: 2,
+          height: 2,
+          colorSystem: 'MARD',
+          palette: [{ key: 'H07', color: '#000000' }, { key: 'F11', color: '#5A2121' }],
+          indexBytes: 1,
+          indices: 'AAEBAA=='
+        }
       }
-    }
+    },
+    notes: [
+      '渲染在有界的工作线程池中执行（DOWNLOAD_POOL_SIZE），所有线程都忙且排队任务已满时返回503，按响应头Retry-After指定的秒数后重试',
+      '每个渲染任务按画布像素数估算开销：单张画布（output=png为整张图片，pages为单页，svg/pdf为矢量输出，按150 DPI的整张图片/单页）超过DOWNLOAD_PIXEL_BUDGET_MP时返回413，可降低dpi/fixedWidth或改用分页输出；同时渲染的像素数之和超出预算时任务排队等待',
+      '排队任务按提交时间加上与像素数成正比的延后排序，小图优先但大图不会一直等待',
+      '提交edits下载整张PNG时，修改前图纸按相同参数绘制的像素缓存为底图（DOWNLOAD_BASE_CACHE_MB），之后对同一图纸的修改只重绘修改过的单元格和统计区域；首次修改需要绘制底图，耗时与整张渲染相同'
+    ]
   },
 
   palette: {
@@ -806,6 +1151,236 @@ export const API_DOCS: Record<string, ApiEndpointDoc> = {
             }
           }
         },
+        convertPool: {
+          type: 'object | null',
+          description: '图片转换线程池状态，CONVERT_POOL_SIZE=0 时为 null',
+          Parameters: {
+            size: {
+              type: 'number',
+              description: '最大工作线程数量'
+            },
+            started: {
+              type: 'number',
+              description: '已启动的工作线程数量（按需启动）'
+            },
+            busy: {
+              type: 'number',
+              description: '正在处理任务的工作线程数量'
+            },
+            queued: {
+              type: 'number',
+              description: '排队中的转换任务数量'
+            },
+            maxQueueLength: {
+              type: 'number',
+              description: '最大排队任务数，队列已满时 /api/convert 返回 503'
+            }
+          }
+        },
+        convertCache: {
+          type: 'object',
+          description: '图片转换结果缓存状态（键为图片SHA-256和规范化后的转换参数）',
+          Parameters: {
+            enabled: {
+              type: 'boolean',
+              description: '是否启用结果缓存（CONVERT_CACHE_MAX_MB=0 时关闭）'
+            },
+            entries: {
+              type: 'number',
+              description: '内存中缓存的结果数量'
+            },
+            bytes: {
+              type: 'number',
+              description: '内存缓存占用的字节数（估算）'
+            },
+            maxBytes: {
+              type: 'number',
+              description: '内存缓存上限（字节），超出时按LRU淘汰'
+            },
+            hits: {
+              type: 'number',
+              description: '内存缓存命中次数'
+            },
+            diskHits: {
+              type: 'number',
+              description: '磁盘缓存命中次数'
+            },
+            misses: {
+              type: 'number',
+              description: '未命中次数'
+            },
+            diskEnabled: {
+              type: 'boolean',
+              description: '是否启用磁盘缓存（配置了 CONVERT_CACHE_DIR）'
+            }
+          }
+        },
+        decodedImageCache: {
+          type: 'object',
+          description: '解码结果缓存状态：同一张图片（按内容SHA-256）再次转换时直接使用缓存的RGBA数据，跳过解码',
+          Parameters: {
+            enabled: {
+              type: 'boolean',
+              description: '是否启用解码结果缓存（CONVERT_DECODED_CACHE_MB=0 时关闭）'
+            },
+            entries: {
+              type: 'number',
+              description: '缓存的图片数量'
+            },
+            bytes: {
+              type: 'number',
+              description: '缓存占用的字节数'
+            },
+            maxBytes: {
+              type: 'number',
+              description: '缓存上限（字节），超出时按LRU淘汰'
+            },
+            ttlSeconds: {
+              type: 'number',
+              description: '条目在最后一次使用之后保留的秒数'
+            },
+            hits: {
+              type: 'number',
+              description: '命中次数'
+            },
+            misses: {
+              type: 'number',
+              description: '未命中次数'
+            }
+          }
+        },
+        patternStore: {
+          type: 'object',
+          description: '图纸存储状态：/api/convert 使用 storePattern=true 保存的图纸，/api/download 通过 patternId 引用',
+          Parameters: {
+            enabled: {
+              type: 'boolean',
+              description: '是否启用图纸存储（PATTERN_STORE_MB=0 时关闭）'
+            },
+            entries: {
+              type: 'number',
+              description: '保存的图纸数量'
+            },
+            bytes: {
+              type: 'number',
+              description: '图纸占用的字节数（估算）'
+            },
+            maxBytes: {
+              type: 'number',
+              description: '存储上限（字节），超出时按LRU淘汰'
+            },
+            ttlSeconds: {
+              type: 'number',
+              description: '图纸在最后一次使用之后保留的秒数'
+            },
+            hits: {
+              type: 'number',
+              description: '按patternId查询成功的次数'
+            },
+            misses: {
+              type: 'number',
+              description: 'patternId不存在或已过期的次数'
+            }
+          }
+        },
+        renderCache: {
+          type: 'object',
+          description: '/api/download 渲染结果缓存的命中统计',
+          Parameters: {
+            enabled: {
+              type: 'boolean',
+              description: '是否启用渲染结果缓存（DOWNLOAD_CACHE_MB=0 时关闭）'
+            },
+            entries: {
+              type: 'number',
+              description: '缓存的输出数量'
+            },
+            bytes: {
+              type: 'number',
+              description: '缓存的输出占用的字节数'
+            },
+            maxBytes: {
+              type: 'number',
+              description: '缓存上限（字节），超出时按LRU淘汰'
+            },
+            hits: {
+              type: 'number',
+              description: '命中次数'
+            },
+            misses: {
+              type: 'number',
+              description: '未命中次数'
+            },
+            notModified: {
+              type: 'number',
+              description: 'If-None-Match 与 ETag 匹配、返回304的次数'
+            }
+          }
+        },
+        renderBaseCache: {
+          type: 'object',
+          description: '增量渲染底图（修改前图纸的像素）缓存的命中统计',
+          Parameters: {
+            enabled: {
+              type: 'boolean',
+              description: '是否启用增量渲染（DOWNLOAD_BASE_CACHE_MB=0 时关闭）'
+            },
+            entries: {
+              type: 'number',
+              description: '缓存的底图数量'
+            },
+            bytes: {
+              type: 'number',
+              description: '底图占用的字节数（每像素4字节）'
+            },
+            maxBytes: {
+              type: 'number',
+              description: '缓存上限（字节），超出时按LRU淘汰'
+            },
+            hits: {
+              type: 'number',
+              description: '在缓存的底图上增量渲染的次数'
+            },
+            misses: {
+              type: 'number',
+              description: '需要先绘制底图的次数'
+            }
+          }
+        },
+        renderPool: {
+          type: 'object | null',
+          description: '/api/download 渲染线程池状态，DOWNLOAD_POOL_SIZE=0 时为 null',
+          Parameters: {
+            size: {
+              type: 'number',
+              description: '最大工作线程数量'
+            },
+            started: {
+              type: 'number',
+              description: '已启动的工作线程数量（按需启动）'
+            },
+            busy: {
+              type: 'number',
+              description: '正在渲染的工作线程数量'
+            },
+            queued: {
+              type: 'number',
+              description: '排队中的渲染任务数量（包括等待像素预算的任务）'
+            },
+            maxQueueLength: {
+              type: 'number',
+              description: '最大排队任务数，队列已满时 /api/download 返回 503'
+            },
+            runningPixels: {
+              type: 'number',
+              description: '正在渲染的画布像素数之和'
+            },
+            pixelBudget: {
+              type: 'number',
+              description: '同时渲染的像素数上限（DOWNLOAD_PIXEL_BUDGET_MP），单张画布超出时返回 413'
+            }
+          }
+        },
         features: {
           type: 'object',
           description: 'API功能列表',
@@ -866,6 +1441,67 @@ export const API_DOCS: Record<string, ApiEndpointDoc> = {
             },
             responseTime: 1
           },
+          convertPool: {
+            size: 3,
+            started: 1,
+            busy: 0,
+            queued: 0,
+            maxQueueLength: 16
+          },
+          convertCache: {
+            enabled: true,
+            entries: 12,
+            bytes: 524288,
+            maxBytes: 67108864,
+            hits: 30,
+            diskHits: 0,
+            misses: 12,
+            diskEnabled: false
+          },
+          decodedImageCache: {
+            enabled: true,
+            entries: 2,
+            bytes: 3840000,
+            maxBytes: 268435456,
+            ttlSeconds: 60,
+            hits: 5,
+            misses: 2
+          },
+          patternStore: {
+            enabled: true,
+            entries: 3,
+            bytes: 245760,
+            maxBytes: 67108864,
+            ttlSeconds: 3600,
+            hits: 4,
+            misses: 0
+          },
+          renderCache: {
+            enabled: true,
+            entries: 2,
+            bytes: 5242880,
+            maxBytes: 134217728,
+            hits: 3,
+            misses: 2,
+            notModified: 1
+          },
+          renderBaseCache: {
+            enabled: true,
+            entries: 1,
+            bytes: 20971520,
+            maxBytes: 268435456,
+            hits: 6,
+            misses: 1
+          },
+          renderPool: {
+            size: 2,
+            started: 2,
+            busy: 1,
+            queued: 0,
+            maxQueueLength: 16,
+            runningPixels: 12960000,
+            pixelBudget: 200000000
+          },
           features: {
             imageConversion: true,
             downloadGeneration: true,
@@ -915,7 +1551,8 @@ export const API_INFO = {
     'DPI分辨率控制',
     '外边框颜色控制',
     '透明色标识控制',
-    '多种输出格式'
+    '多种输出格式',
+    '批量转换（多张图片或ZIP压缩包）'
   ],
   supportedFormats: {
     input: ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp'],
@@ -0,0 +1,119 @@
+// 服务端运行参数配置
+// 所有参数都提供默认值，部署时可以通过环境变量覆盖
+import * as os from 'os';
+
+// 读取整数类型的环境变量，非法值时使用默认值
+function readIntEnv(name: string, defaultValue: number, minValue: number = 0, maxValue: number = Infinity): number {
+  const rawValue = process.env[name];
+  if (rawValue === undefined || rawValue === '') {
+    return defaultValue;
+  }
+  const parsedValue = parseInt(rawValue, 10);
+  if (isNaN(parsedValue) || parsedValue < minValue || parsedValue > maxValue) {
+    console.warn(`环境变量 ${name}=${rawValue} 无效，使用默认值 ${defaultValue}`);
+    return defaultValue;
+  }
+  return parsedValue;
+}
+
+// PNG 行过滤器（libpng 的 PNG_FILTER_* 标志，与 node-canvas 的 Canvas.PNG_FILTER_* 相同）
+const PNG_FILTER_FLAGS: Record<string, number> = {
+  none: 0x08,
+  sub: 0x10,
+  up: 0x20,
+  avg: 0x40,
+  paeth: 0x80,
+  all: 0xf8
+};
+
+// 读取逗号分隔的 PNG 过滤器名称，返回过滤器标志；非法值时使用全部过滤器
+function readPngFiltersEnv(name: string): number {
+  const rawValue = process.env[name];
+  if (rawValue === undefined || rawValue === '') {
+    return PNG_FILTER_FLAGS.all;
+  }
+  let flags = 0;
+  for (const filterName of rawValue.split(',').map(item => item.trim().toLowerCase())) {
+    if (!(filterName in PNG_FILTER_FLAGS)) {
+      console.warn(`环境变量 ${name}=${rawValue} 无效，使用默认值 all`);
+      return PNG_FILTER_FLAGS.all;
+    }
+    flags |= PNG_FILTER_FLAGS[filterName];
+  }
+  return flags;
+}
+
+export const SERVER_CONFIG = {
+  palette: {
+    // 自定义调色板解析结果的缓存条数（按内容哈希，LRU淘汰）
+    customPaletteCacheSize: readIntEnv('PALETTE_CUSTOM_CACHE_SIZE', 64, 1)
+  },
+  convert: {
+    // 启用降采样（downscale=true）时每个单元格每个方向上保留的像素数
+    downscaleSamples: readIntEnv('CONVERT_DOWNSCALE_SAMPLES', 4, 1),
+    // 一次请求最多生成的粒度数量（granularities 参数）
+    maxGranularities: readIntEnv('CONVERT_MAX_GRANULARITIES', 8, 1),
+    // 平均色模式重复使用解码结果时，像素数不超过该值的图片构建积分图（约 16 字节/像素），0 表示不使用
+    integralMaxPixels: readIntEnv('CONVERT_INTEGRAL_MAX_PIXELS', 8000000, 0)
+  },
+  convertCache: {
+    // 转换结果内存缓存上限（MB），0 表示不缓存
+    maxMemoryMB: readIntEnv('CONVERT_CACHE_MAX_MB', 64, 0),
+    // 磁盘缓存目录，为空时不使用磁盘缓存
+    diskDir: process.env.CONVERT_CACHE_DIR || '',
+    // 磁盘缓存上限（MB），超出时删除最久未使用的文件
+    maxDiskMB: readIntEnv('CONVERT_CACHE_DISK_MAX_MB', 512, 1),
+    // 解码后 RGBA 数据的缓存上限（MB），0 表示不缓存
+    decodedMaxMB: readIntEnv('CONVERT_DECODED_CACHE_MB', 256, 0),
+    // 解码结果在最后一次使用之后保留的秒数
+    decodedTtlSeconds: readIntEnv('CONVERT_DECODED_CACHE_TTL', 60, 1)
+  },
+  convertPool: {
+    // 图片转换工作线程数量，0 表示不使用工作线程（在请求线程中直接处理）
+    size: readIntEnv('CONVERT_POOL_SIZE', Math.max(1, Math.min(4, os.cpus().length - 1)), 0),
+    // 所有工作线程都忙时最多排队的任务数，超出时返回 503
+    maxQueueLength: readIntEnv('CONVERT_QUEUE_DEPTH', 16, 0),
+    // 过载时 Retry-After 响应头的秒数
+    retryAfterSeconds: readIntEnv('CONVERT_RETRY_AFTER', 2, 1),
+    // 原图像素数达到该值时按行分段交给多个工作线程并行像素化，0 表示不分段
+    parallelMinPixels: readIntEnv('CONVERT_PARALLEL_MIN_PIXELS', 4000000, 0)
+  },
+  batch: {
+    // 一次批量转换最多包含的图片数量
+    maxImages: readIntEnv('BATCH_MAX_IMAGES', 200, 1),
+    // 一次批量转换同时处理的图片数量，应不大于排队上限，避免批量请求自己占满队列
+    concurrency: readIntEnv('BATCH_CONCURRENCY', 4, 1),
+    // 压缩包中单个图片解压后的大小上限（MB），超出的图片不解压，记为转换失败
+    maxEntryMB: readIntEnv('BATCH_MAX_ENTRY_MB', 10, 1),
+    // 压缩包中所有图片解压后的大小之和的上限（MB），超出时整个请求返回 413
+    maxTotalMB: readIntEnv('BATCH_MAX_TOTAL_MB', 500, 1)
+  },
+  patternStore: {
+    // 服务端保存的图纸（storePattern=true）占用的内存上限（MB），0 表示不保存
+    maxMB: readIntEnv('PATTERN_STORE_MB', 64, 0),
+    // 图纸在最后一次使用之后保留的秒数
+    ttlSeconds: readIntEnv('PATTERN_STORE_TTL', 3600, 1)
+  },
+  download: {
+    // PNG 压缩级别（0-9），越大文件越小、编码越慢
+    pngCompressionLevel: readIntEnv('DOWNLOAD_PNG_COMPRESSION', 6, 0, 9),
+    // PNG 行过滤器，逗号分隔的 none / sub / up / avg / paeth / all；只用 none 编码最快，all 文件最小
+    pngFilters: readPngFiltersEnv('DOWNLOAD_PNG_FILTERS'),
+    // 色号标签贴图缓存上限（MB），0 表示不缓存（每个单元格直接绘制文字）
+    glyphCacheMB: readIntEnv('DOWNLOAD_GLYPH_CACHE_MB', 32, 0),
+    // 渲染结果（编码后的 PNG / SVG / ZIP / PDF）缓存上限（MB），0 表示不缓存
+    cacheMB: readIntEnv('DOWNLOAD_CACHE_MB', 128, 0),
+    // 增量渲染底图（未修改图纸的 RGBA 像素）缓存上限（MB），0 表示不使用增量渲染
+    baseCacheMB: readIntEnv('DOWNLOAD_BASE_CACHE_MB', 256, 0)
+  },
+  downloadPool: {
+    // 图纸渲染工作线程数量，0 表示不使用工作线程（在请求线程中直接渲染）
+    size: readIntEnv('DOWNLOAD_POOL_SIZE', Math.max(1, Math.min(2, os.cpus().length - 1)), 0),
+    // 所有工作线程都忙时最多排队的渲染任务数，超出时返回 503
+    maxQueueLength: readIntEnv('DOWNLOAD_QUEUE_DEPTH', 16, 0),
+    // 同时渲染的画布像素数之和的上限（百万像素），单张画布超出时返回 413
+    pixelBudgetMP: readIntEnv('DOWNLOAD_PIXEL_BUDGET_MP', 200, 1),
+    // 过载时 Retry-After 响应头的秒数
+    retryAfterSeconds: readIntEnv('DOWNLOAD_RETRY_AFTER', 2, 1)
+  }
+};
@@ -19,4 +19,6 @@ export interface DownloadImage{
   pixelData: PixelData | null;
   renderMode?: 'dpi' | 'fixed';  // 渲染模式：dpi=基于DPI的模式，fixed=固定宽度模式
   options: GridDownloadOptions;
-}
\ No newline at end of file
+}
+// 下载输出格式：png=整张图片，svg=整张图片（矢量），pages=分页 PNG 压缩包，pdf=多页 PDF
+export type DownloadOutput = 'png' | 'svg' | 'pages' | 'pdf';
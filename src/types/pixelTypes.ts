@@ -8,4 +8,24 @@ export interface PixelData{
     height: number | null;
     // 色号系统
     colorSystem: ColorSystem;
-}
\ No newline at end of file
+}
+
+// pixelData 的输出格式：mapped 为 MappedPixel[][]，indexed 为紧凑编码
+export type PixelFormat = 'mapped' | 'indexed';
+
+// 紧凑编码的像素数据：调色板表 + base64 打包的下标数组
+export interface CompactPixelData{
+    format: 'indexed';
+    // 像素数据的宽度
+    width: number;
+    // 像素数据的高度
+    height: number;
+    // 色号系统
+    colorSystem: ColorSystem;
+    // 调色板表，表项格式与 mappedData 的单元格相同，外部背景单元格使用带 isExternal 的表项
+    palette: MappedPixel[];
+    // 每个下标占用的字节数：调色板表不超过 256 项时为 1，否则为 2（小端序）
+    indexBytes: 1 | 2;
+    // 按行优先排列的调色板表下标，base64 编码
+    indices: string;
+}
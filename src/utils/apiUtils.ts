@@ -199,6 +199,40 @@ export function validateConvertParams(params: {
   return { isValid: true };
 }
 
+// 解析背景色号列表参数，支持逗号分隔的字符串或 JSON 数组；未提供时返回 null
+export function parseBackgroundKeys(rawValue: string | null): string[] | null {
+  if (!rawValue || rawValue.trim() === '') {
+    return null;
+  }
+
+  const trimmedValue = rawValue.trim();
+  if (trimmedValue.startsWith('[')) {
+    const parsedValue = JSON.parse(trimmedValue);
+    if (!Array.isArray(parsedValue) || !parsedValue.every(key => typeof key === 'string')) {
+      throw new Error('backgroundKeys 必须是字符串数组');
+    }
+    return parsedValue.map(key => key.trim()).filter(key => key !== '');
+  }
+
+  return trimmedValue.split(',').map(key => key.trim()).filter(key => key !== '');
+}
+
+// 解析粒度列表参数，支持逗号分隔的字符串或 JSON 数组；未提供时返回 null，重复的粒度只保留第一个
+export function parseGranularities(rawValue: string | null): number[] | null {
+  if (!rawValue || rawValue.trim() === '') {
+    return null;
+  }
+
+  const trimmedValue = rawValue.trim();
+  const values: unknown[] = trimmedValue.startsWith('[')
+    ? JSON.parse(trimmedValue)
+    : trimmedValue.split(',').map(value => value.trim()).filter(value => value !== '').map(Number);
+  if (!Array.isArray(values) || values.length === 0 || !values.every(value => Number.isInteger(value))) {
+    throw new Error('granularities 必须是整数数组');
+  }
+  return Array.from(new Set(values as number[]));
+}
+
 // 生成文件名
 export function generateFilename(params: {
   granularity?: number;
@@ -0,0 +1,61 @@
+// 增量渲染的底图缓存
+// 提交 edits 下载整张 PNG 时，未修改的图纸按相同参数绘制的像素（SharedArrayBuffer，可直接交给工作线程读取）缓存在这里，
+// 同一张图纸之后的修改只在底图上重绘修改过的单元格和统计区域（见 renderPatchedGridImageBuffer）。
+// 键与渲染结果缓存相同（图纸内容哈希和规范化后的下载参数），按字节数做 LRU 淘汰，
+// 条目在最后一次使用之后超过 PATTERN_STORE_TTL 即被删除。
+import { LruCache } from './lruCache';
+import { SharedPatternPixels } from './serverImageDownloader';
+import { SERVER_CONFIG } from '../config/serverConfig';
+
+export interface BaseRenderCacheStats {
+  enabled: boolean;
+  entries: number;
+  bytes: number;
+  maxBytes: number;
+  hits: number;
+  misses: number;
+}
+
+const maxBytes = SERVER_CONFIG.download.baseCacheMB * 1024 * 1024;
+const ttlMs = SERVER_CONFIG.patternStore.ttlSeconds * 1000;
+const counters = { hits: 0, misses: 0 };
+
+const basePixels = new LruCache<string, SharedPatternPixels>(Infinity, {
+  maxSize: maxBytes,
+  sizeOf: pixels => pixels.rgba.byteLength,
+  ttlMs
+});
+
+// 空闲时也按时释放过期的底图，不阻止进程退出
+if (maxBytes > 0) {
+  setInterval(() => basePixels.prune(), ttlMs).unref();
+}
+
+export function isBaseRenderCacheEnabled(): boolean {
+  return maxBytes > 0;
+}
+
+// 查询底图，返回的像素在请求之间共享，不能修改
+export function getCachedBaseRender(key: string): SharedPatternPixels | null {
+  const pixels = basePixels.get(key);
+  if (pixels) {
+    counters.hits++;
+    return pixels;
+  }
+  counters.misses++;
+  return null;
+}
+
+export function setCachedBaseRender(key: string, pixels: SharedPatternPixels): void {
+  basePixels.set(key, pixels);
+}
+
+export function getBaseRenderCacheStats(): BaseRenderCacheStats {
+  return {
+    enabled: isBaseRenderCacheEnabled(),
+    entries: basePixels.size,
+    bytes: basePixels.totalSize,
+    maxBytes,
+    ...counters
+  };
+}
@@ -0,0 +1,86 @@
+// 单元格主导色统计用的颜色直方图
+// 以 0xRRGGBB 打包的整数为键的开放寻址哈希表，统计过程中不分配任何对象。
+// 表在多个单元格之间复用：每轮统计只递增代号（generation），代号不同的槽位视为空，无需清空数组。
+const INITIAL_CAPACITY = 1024;
+// 黄金分割乘法哈希
+const HASH_MULTIPLIER = 0x9e3779b1;
+
+export class PackedColorHistogram {
+  private keys: Int32Array;
+  private counts: Uint32Array;
+  private stamps: Uint32Array;
+  private capacityBits: number;
+  private mask: number;
+  // 槽位代号初始为 0，因此有效代号从 1 开始
+  private generation = 1;
+  private size = 0;
+
+  constructor(initialCapacity: number = INITIAL_CAPACITY) {
+    this.capacityBits = Math.max(4, Math.ceil(Math.log2(initialCapacity)));
+    const capacity = 1 << this.capacityBits;
+    this.mask = capacity - 1;
+    this.keys = new Int32Array(capacity);
+    this.counts = new Uint32Array(capacity);
+    this.stamps = new Uint32Array(capacity);
+  }
+
+  // 开始新一轮统计
+  reset(): void {
+    this.size = 0;
+    this.generation++;
+    // 代号用尽时才真正清空一次
+    if (this.generation === 0xffffffff) {
+      this.stamps.fill(0);
+      this.generation = 1;
+    }
+  }
+
+  /**
+   * 颜色计数加一
+   * @param color 打包后的颜色 (r << 16) | (g << 8) | b
+   * @returns 该颜色在本轮统计中的最新计数
+   */
+  increment(color: number): number {
+    const { keys, stamps, mask, generation } = this;
+    let slot = Math.imul(color, HASH_MULTIPLIER) >>> (32 - this.capacityBits);
+    while (stamps[slot] === generation) {
+      if (keys[slot] === color) {
+        return ++this.counts[slot];
+      }
+      slot = (slot + 1) & mask;
+    }
+
+    // 新颜色：装载率超过 1/2 时先扩容再插入
+    if ((this.size + 1) * 2 > mask + 1) {
+      this.grow();
+      return this.increment(color);
+    }
+    stamps[slot] = generation;
+    keys[slot] = color;
+    this.counts[slot] = 1;
+    this.size++;
+    return 1;
+  }
+
+  // 容量翻倍，只迁移本轮统计中的颜色
+  private grow(): void {
+    const { keys: oldKeys, counts: oldCounts, stamps: oldStamps, generation } = this;
+    this.capacityBits++;
+    const capacity = 1 << this.capacityBits;
+    this.mask = capacity - 1;
+    this.keys = new Int32Array(capacity);
+    this.counts = new Uint32Array(capacity);
+    this.stamps = new Uint32Array(capacity);
+
+    for (let oldSlot = 0; oldSlot < oldStamps.length; oldSlot++) {
+      if (oldStamps[oldSlot] !== generation) continue;
+      let slot = Math.imul(oldKeys[oldSlot], HASH_MULTIPLIER) >>> (32 - this.capacityBits);
+      while (this.stamps[slot] === generation) {
+        slot = (slot + 1) & this.mask;
+      }
+      this.stamps[slot] = generation;
+      this.keys[slot] = oldKeys[oldSlot];
+      this.counts[slot] = oldCounts[oldSlot];
+    }
+  }
+}
@@ -0,0 +1,106 @@
+// pixelData 的紧凑编码（pixelFormat=indexed）
+// mappedData 中每个单元格都重复完整的 {"key":"H7","color":"#FFFFFF"}，紧凑编码只保存一份调色板表，
+// 单元格以 1～2 字节的下标打包后 base64 编码，响应体积和 JSON 解析时间都缩小一个数量级以上。
+import { ColorSystem, MappedPixel, PaletteColor, hexToRgb } from './pixelation';
+import { IndexedPixelGrid } from './pixelGrid';
+import { CompactPixelData } from '../types/pixelTypes';
+
+export function isCompactPixelData(pixelData: unknown): pixelData is CompactPixelData {
+  return !!pixelData && (pixelData as CompactPixelData).format === 'indexed';
+}
+
+/**
+ * 将网格编码为紧凑格式
+ * 调色板表只包含实际出现的 (颜色, 是否外部背景) 组合，按首次出现的顺序排列
+ */
+export function encodeCompactPixelData(grid: IndexedPixelGrid, colorSystem: ColorSystem): CompactPixelData {
+  const { width, height, indices, palette, external } = grid;
+  const cellCount = width * height;
+  // 网格调色板下标 -> 表下标，外部背景单元格使用后半部分
+  const tableIndexBySlot = new Int32Array(palette.length * 2).fill(-1);
+  const table: MappedPixel[] = [];
+  const packed = new Uint16Array(cellCount);
+
+  for (let cellIndex = 0; cellIndex < cellCount; cellIndex++) {
+    const isExternal = !!external && external[cellIndex] === 1;
+    const paletteIndex = indices[cellIndex];
+    const slot = isExternal ? palette.length + paletteIndex : paletteIndex;
+    let tableIndex = tableIndexBySlot[slot];
+    if (tableIndex < 0) {
+      tableIndex = table.length;
+      tableIndexBySlot[slot] = tableIndex;
+      const { key, hex } = palette[paletteIndex];
+      table.push(isExternal ? { key, color: hex, isExternal: true } : { key, color: hex });
+    }
+    packed[cellIndex] = tableIndex;
+  }
+
+  const indexBytes = table.length <= 256 ? 1 : 2;
+  const bytes = Buffer.alloc(cellCount * indexBytes);
+  if (indexBytes === 1) {
+    bytes.set(packed);
+  } else {
+    for (let cellIndex = 0; cellIndex < cellCount; cellIndex++) {
+      bytes.writeUInt16LE(packed[cellIndex], cellIndex * 2);
+    }
+  }
+
+  return {
+    format: 'indexed',
+    width,
+    height,
+    colorSystem,
+    palette: table,
+    indexBytes,
+    indices: bytes.toString('base64')
+  };
+}
+
+/**
+ * 将紧凑格式解码为网格，结果与解析等价的 mappedData 相同
+ * 格式错误时抛出异常
+ */
+export function decodeCompactPixelData(data: CompactPixelData): IndexedPixelGrid {
+  const { width, height, palette: table, indexBytes } = data;
+  if (!Number.isInteger(width) || !Number.isInteger(height) || width <= 0 || height <= 0) {
+    throw new Error('width 和 height 必须是正整数');
+  }
+  if (!Array.isArray(table) || table.length === 0
+    || !table.every(entry => entry && typeof entry.key === 'string' && typeof entry.color === 'string')) {
+    throw new Error('palette 必须是 {key, color} 数组');
+  }
+  if (indexBytes !== 1 && indexBytes !== 2) {
+    throw new Error('indexBytes 必须是 1 或 2');
+  }
+  if (typeof data.indices !== 'string') {
+    throw new Error('indices 必须是 base64 字符串');
+  }
+
+  const cellCount = width * height;
+  const bytes = Buffer.from(data.indices, 'base64');
+  if (bytes.length !== cellCount * indexBytes) {
+    throw new Error(`indices 长度不正确：应为 ${cellCount * indexBytes} 字节，实际为 ${bytes.length} 字节`);
+  }
+
+  const palette: PaletteColor[] = table.map(({ key, color }) => ({
+    key,
+    hex: color,
+    rgb: hexToRgb(color) || { r: 0, g: 0, b: 0 }
+  }));
+  const indices = new Uint16Array(cellCount);
+  let external: Uint8Array | null = null;
+
+  for (let cellIndex = 0; cellIndex < cellCount; cellIndex++) {
+    const tableIndex = indexBytes === 1 ? bytes[cellIndex] : bytes.readUInt16LE(cellIndex * 2);
+    if (tableIndex >= table.length) {
+      throw new Error(`下标 ${tableIndex} 超出调色板表范围`);
+    }
+    indices[cellIndex] = tableIndex;
+    if (table[tableIndex].isExternal) {
+      if (!external) external = new Uint8Array(cellCount);
+      external[cellIndex] = 1;
+    }
+  }
+
+  return { width, height, indices, palette, external };
+}
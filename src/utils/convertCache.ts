@@ -0,0 +1,202 @@
+// /api/convert 结果缓存
+// 以图片内容的 SHA-256 和规范化后的转换参数为键，缓存网格级别的转换结果（调色板下标网格，而不是 JSON）。
+// 内存中按字节数做 LRU 淘汰；配置了 CONVERT_CACHE_DIR 时，结果同时写入磁盘，内存未命中时再从磁盘读取。
+import { createHash } from 'crypto';
+import * as fs from 'fs';
+import * as path from 'path';
+import { ConvertJob, ConvertJobResult } from './convertPipeline';
+import { LruCache } from './lruCache';
+import { SERVER_CONFIG } from '../config/serverConfig';
+
+// 磁盘文件格式版本，格式变化时递增，旧文件会被忽略
+const DISK_FORMAT_VERSION = 1;
+// 每写入多少个文件检查一次磁盘缓存大小
+const DISK_PRUNE_INTERVAL = 32;
+
+// shared 表示与正在处理的相同请求共用了同一次转换（未命中缓存，但没有重复转换）
+export type ConvertCacheStatus = 'memory' | 'disk' | 'shared' | 'miss' | 'disabled';
+
+export interface ConvertCacheStats {
+  enabled: boolean;
+  entries: number;
+  bytes: number;
+  maxBytes: number;
+  hits: number;
+  diskHits: number;
+  misses: number;
+  diskEnabled: boolean;
+}
+
+const { maxMemoryMB, diskDir, maxDiskMB } = SERVER_CONFIG.convertCache;
+const maxBytes = maxMemoryMB * 1024 * 1024;
+const counters = { hits: 0, diskHits: 0, misses: 0 };
+let diskWrites = 0;
+
+// 结果占用的内存估算：下标和外部背景标记数组，加上调色板表
+function estimateResultSize(result: ConvertJobResult): number {
+  const { grid } = result;
+  return grid.indices.byteLength + (grid.external ? grid.external.byteLength : 0) + grid.palette.length * 64 + 256;
+}
+
+const memoryCache = new LruCache<string, ConvertJobResult>(Infinity, {
+  maxSize: maxBytes,
+  sizeOf: estimateResultSize
+});
+
+export function isConvertCacheEnabled(): boolean {
+  return maxBytes > 0;
+}
+
+// 图片内容哈希，必须在 imageData 被转移给工作线程之前计算
+export function hashImageData(imageData: ArrayBuffer): string {
+  return createHash('sha256').update(new Uint8Array(imageData)).digest('hex');
+}
+
+/**
+ * 计算缓存键
+ * 只包含影响结果的参数；不移除背景时背景色号列表不影响结果，统一视为 null
+ * @param imageHash 图片内容哈希
+ * @param job 转换任务
+ * @param paletteHash 调色板内容哈希
+ */
+export function getConvertCacheKey(imageHash: string, job: ConvertJob, paletteHash: string): string {
+  const params = [
+    job.granularity,
+    job.pixelationMode,
+    paletteHash,
+    job.colorSystem,
+    job.similarityThreshold,
+    job.removeBackground,
+    job.removeBackground ? job.backgroundKeys : null,
+    job.downscaleSamples
+  ];
+  return `${imageHash}|${JSON.stringify(params)}`;
+}
+
+function getDiskPath(key: string): string {
+  return path.join(diskDir, `${createHash('sha256').update(key).digest('hex')}.bin`);
+}
+
+// 磁盘格式：[4字节头部长度][JSON头部][下标数组][外部背景标记数组]
+function serializeResult(result: ConvertJobResult): Buffer {
+  const { grid, ...info } = result;
+  const header = Buffer.from(JSON.stringify({
+    version: DISK_FORMAT_VERSION,
+    width: grid.width,
+    height: grid.height,
+    palette: grid.palette,
+    hasExternal: grid.external !== null,
+    ...info
+  }));
+  const headerLength = Buffer.alloc(4);
+  headerLength.writeUInt32LE(header.length, 0);
+  const parts = [headerLength, header, Buffer.from(grid.indices.buffer, grid.indices.byteOffset, grid.indices.byteLength)];
+  if (grid.external) {
+    parts.push(Buffer.from(grid.external.buffer, grid.external.byteOffset, grid.external.byteLength));
+  }
+  return Buffer.concat(parts);
+}
+
+function deserializeResult(data: Buffer): ConvertJobResult | null {
+  const headerLength = data.readUInt32LE(0);
+  const { version, width, height, palette, hasExternal, ...info } = JSON.parse(data.toString('utf8', 4, 4 + headerLength));
+  if (version !== DISK_FORMAT_VERSION) {
+    return null;
+  }
+  const cellCount = width * height;
+  let offset = 4 + headerLength;
+  // 复制到新的数组中，保证 Uint16Array 按2字节对齐
+  const indices = new Uint16Array(cellCount);
+  new Uint8Array(indices.buffer).set(data.subarray(offset, offset + cellCount * 2));
+  offset += cellCount * 2;
+  const external = hasExternal ? new Uint8Array(data.subarray(offset, offset + cellCount)) : null;
+  return { ...info, grid: { width, height, indices, palette, external } } as ConvertJobResult;
+}
+
+async function readFromDisk(key: string): Promise<ConvertJobResult | null> {
+  const filePath = getDiskPath(key);
+  try {
+    const result = deserializeResult(await fs.promises.readFile(filePath));
+    if (result) {
+      // 更新修改时间，淘汰时按最近使用排序
+      const now = new Date();
+      fs.promises.utimes(filePath, now, now).catch(() => {});
+    }
+    return result;
+  } catch {
+    return null;
+  }
+}
+
+async function writeToDisk(key: string, result: ConvertJobResult): Promise<void> {
+  const filePath = getDiskPath(key);
+  // 先写临时文件再重命名，避免并发读取到不完整的文件
+  const tempPath = `${filePath}.${process.pid}.${Date.now()}.tmp`;
+  await fs.promises.mkdir(diskDir, { recursive: true });
+  await fs.promises.writeFile(tempPath, serializeResult(result));
+  await fs.promises.rename(tempPath, filePath);
+  if (++diskWrites % DISK_PRUNE_INTERVAL === 0) {
+    await pruneDisk();
+  }
+}
+
+// 磁盘缓存超出上限时，按修改时间从旧到新删除
+async function pruneDisk(): Promise<void> {
+  const files = await Promise.all(
+    (await fs.promises.readdir(diskDir))
+      .filter(name => name.endsWith('.bin'))
+      .map(async name => {
+        const filePath = path.join(diskDir, name);
+        const stat = await fs.promises.stat(filePath);
+        return { filePath, size: stat.size, mtime: stat.mtimeMs };
+      })
+  );
+  let totalSize = files.reduce((sum, file) => sum + file.size, 0);
+  const maxDiskBytes = maxDiskMB * 1024 * 1024;
+  files.sort((a, b) => a.mtime - b.mtime);
+  for (const file of files) {
+    if (totalSize <= maxDiskBytes) break;
+    await fs.promises.unlink(file.filePath).catch(() => {});
+    totalSize -= file.size;
+  }
+}
+
+/**
+ * 查询缓存，先查内存再查磁盘；磁盘命中的结果会放回内存
+ * 返回的结果在请求之间共享，调用方不能修改
+ */
+export async function getCachedConvertResult(key: string): Promise<{ result: ConvertJobResult | null; status: ConvertCacheStatus }> {
+  const cached = memoryCache.get(key);
+  if (cached) {
+    counters.hits++;
+    return { result: cached, status: 'memory' };
+  }
+  if (diskDir) {
+    const diskResult = await readFromDisk(key);
+    if (diskResult) {
+      counters.diskHits++;
+      memoryCache.set(key, diskResult);
+      return { result: diskResult, status: 'disk' };
+    }
+  }
+  counters.misses++;
+  return { result: null, status: 'miss' };
+}
+
+export function setCachedConvertResult(key: string, result: ConvertJobResult): void {
+  memoryCache.set(key, result);
+  if (diskDir) {
+    writeToDisk(key, result).catch(error => console.warn('转换结果写入磁盘缓存失败:', error));
+  }
+}
+
+export function getConvertCacheStats(): ConvertCacheStats {
+  return {
+    enabled: isConvertCacheEnabled(),
+    entries: memoryCache.size,
+    bytes: memoryCache.totalSize,
+    maxBytes,
+    ...counters,
+    diskEnabled: isConvertCacheEnabled() && diskDir !== ''
+  };
+}
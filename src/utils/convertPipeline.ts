@@ -0,0 +1,283 @@
+// 图片转换流水线：解码 -> 像素化 -> 相似颜色合并 -> 背景移除
+// 只依赖可序列化的输入，既可以在请求线程中直接调用，也可以在工作线程中运行（见 convertWorker.ts）。
+import { loadImage, createCanvas } from 'canvas';
+import {
+  pixelateImageData,
+  pixelateRowBand,
+  PixelationMode,
+  PaletteColor
+} from './pixelation';
+import { IndexedPixelGrid } from './pixelGrid';
+import { mergeSimilarColors, removeBackground } from './gridPipeline';
+import { buildIntegralImage, getIntegralImageByteLength } from './integralImage';
+import { ColorSystem, findTransparentFallbackColor } from './colorSystemUtils';
+
+export interface ConvertJob {
+  // 上传的原始图片数据，提交给工作线程时会被转移
+  imageData: ArrayBuffer;
+  granularity: number;
+  similarityThreshold: number;
+  pixelationMode: PixelationMode;
+  palette: PaletteColor[];
+  colorSystem: ColorSystem;
+  removeBackground: boolean;
+  // 为 null 时使用透明区域的备用色作为背景色
+  backgroundKeys: string[] | null;
+  // 大于 0 时先把图片缩小到每个单元格约 downscaleSamples x downscaleSamples 个像素再像素化，0 表示使用原图
+  downscaleSamples: number;
+}
+
+export interface ConvertJobResult {
+  grid: IndexedPixelGrid;
+  // 原图尺寸
+  imageWidth: number;
+  imageHeight: number;
+  // 实际参与像素化的图片尺寸（降采样时小于原图）
+  sampledWidth: number;
+  sampledHeight: number;
+  // 实际使用的背景色号列表
+  backgroundKeys: string[];
+}
+
+// 解码后的图片尺寸
+export interface DecodedImageSize {
+  // 像素数据的尺寸（降采样时小于原图）
+  width: number;
+  height: number;
+  // 原图尺寸，网格尺寸按原图宽高比计算
+  originalWidth: number;
+  originalHeight: number;
+}
+
+// 解码到 SharedArrayBuffer 中的 RGBA 数据，可以同时交给多个工作线程读取，也可以缓存后重复使用
+export interface SharedDecodedImage extends DecodedImageSize {
+  rgba: SharedArrayBuffer;
+  // 平均色模式使用的积分图（见 integralImage.ts），解码结果被重复使用时才构建
+  integral: SharedArrayBuffer | null;
+}
+
+// 解码后的像素数据
+interface DecodedImage extends DecodedImageSize {
+  data: Uint8ClampedArray;
+  integral: Uint32Array | null;
+}
+
+// --- 工作线程任务协议 ---
+
+// 完整转换
+export interface ConvertTask {
+  type: 'convert';
+  job: ConvertJob;
+  // 原图像素数不少于该值（大于 0）时只解码，交由调用方分段像素化
+  parallelMinPixels: number;
+  // 为 true 时把解码结果放入共享内存并随结果返回，供调用方缓存
+  shareDecoded: boolean;
+}
+
+// 只解码，解码结果放入共享内存返回（同一张图片生成多个粒度的图纸时只解码一次）
+export interface DecodeTask {
+  type: 'decode';
+  job: ConvertJob;
+}
+
+// 对已解码的图片执行像素化及后续处理阶段（job.imageData 不会被使用）
+export interface PixelateTask {
+  type: 'pixelate';
+  job: ConvertJob;
+  image: SharedDecodedImage;
+}
+
+// 为已解码的图片构建积分图
+export interface IntegralTask {
+  type: 'integral';
+  image: SharedDecodedImage;
+}
+
+// 计算网格中 [rowStart, rowEnd) 行单元格的调色板下标
+export interface PixelateBandTask {
+  type: 'pixelateBand';
+  image: SharedDecodedImage;
+  N: number;
+  M: number;
+  rowStart: number;
+  rowEnd: number;
+  palette: PaletteColor[];
+  mode: PixelationMode;
+  fallbackIndex: number;
+}
+
+export type ConvertWorkerTask = ConvertTask | DecodeTask | PixelateTask | IntegralTask | PixelateBandTask;
+
+export type ConvertWorkerResult =
+  | { type: 'result'; result: ConvertJobResult; decoded: SharedDecodedImage | null }
+  | { type: 'decoded'; image: SharedDecodedImage }
+  | { type: 'integral'; integral: SharedArrayBuffer }
+  | { type: 'band'; indices: Uint16Array };
+
+/**
+ * 解码图片
+ * 启用降采样时直接把图片绘制到 (N x samples) x (M x samples) 的画布上，每个单元格正好对应
+ * samples x samples 个像素，不再创建原图大小的画布和 ImageData。
+ * 目标尺寸不小于原图时仍按原图处理。
+ */
+async function decodeImage(job: ConvertJob): Promise<DecodedImage> {
+  const image = await loadImage(Buffer.from(job.imageData));
+  let width = image.width;
+  let height = image.height;
+
+  if (job.downscaleSamples > 0) {
+    const { N, M } = getGridSize(image.width, image.height, job.granularity);
+    const targetWidth = N * job.downscaleSamples;
+    const targetHeight = M * job.downscaleSamples;
+    if (targetWidth < image.width && targetHeight < image.height) {
+      width = targetWidth;
+      height = targetHeight;
+    }
+  }
+
+  const canvas = createCanvas(width, height);
+  const ctx = canvas.getContext('2d');
+  ctx.drawImage(image, 0, 0, width, height);
+  const { data } = ctx.getImageData(0, 0, width, height);
+  return { data, integral: null, width, height, originalWidth: image.width, originalHeight: image.height };
+}
+
+// 共享内存中的解码结果转换为像素数据
+function fromSharedDecodedImage(image: SharedDecodedImage): DecodedImage {
+  const { rgba, integral, ...size } = image;
+  return { ...size, data: new Uint8ClampedArray(rgba), integral: integral ? new Uint32Array(integral) : null };
+}
+
+// 像素数据复制到共享内存中，得到可以在线程之间共享的解码结果（不包含积分图）
+function toSharedDecodedImage(image: DecodedImage): SharedDecodedImage {
+  const { data, width, height, originalWidth, originalHeight } = image;
+  const rgba = new SharedArrayBuffer(data.length);
+  new Uint8ClampedArray(rgba).set(data);
+  return { width, height, originalWidth, originalHeight, rgba, integral: null };
+}
+
+// 在共享内存中构建解码结果的积分图
+export function buildSharedIntegralImage(image: SharedDecodedImage): SharedArrayBuffer {
+  const integral = new SharedArrayBuffer(getIntegralImageByteLength(image.width, image.height));
+  buildIntegralImage(new Uint8ClampedArray(image.rgba), image.width, image.height, new Uint32Array(integral));
+  return integral;
+}
+
+// 解码图片并放入共享内存
+export async function decodeSharedImage(job: ConvertJob): Promise<SharedDecodedImage> {
+  return toSharedDecodedImage(await decodeImage(job));
+}
+
+// 根据粒度和原图宽高比计算网格尺寸
+export function getGridSize(imageWidth: number, imageHeight: number, granularity: number): { N: number; M: number } {
+  const aspectRatio = imageHeight / imageWidth;
+  const N = granularity;
+  const M = Math.max(1, Math.round(N * aspectRatio));
+  return { N, M };
+}
+
+// 像素化之后的处理阶段：合并相似颜色、背景移除
+export function finishConvertPipeline(
+  job: ConvertJob,
+  initialGrid: IndexedPixelGrid,
+  image: DecodedImageSize,
+  defaultColor: PaletteColor
+): ConvertJobResult {
+  // 合并相似颜色（与网页端使用相同的处理阶段）
+  let grid = mergeSimilarColors(initialGrid, job.similarityThreshold);
+
+  // 背景移除：默认把透明区域使用的备用色视为背景色
+  const backgroundKeys = job.backgroundKeys || [defaultColor.key];
+  if (job.removeBackground) {
+    grid = removeBackground(grid, backgroundKeys);
+  }
+
+  return {
+    grid,
+    imageWidth: image.originalWidth,
+    imageHeight: image.originalHeight,
+    sampledWidth: image.width,
+    sampledHeight: image.height,
+    backgroundKeys
+  };
+}
+
+// 对已解码的图片执行像素化及后续处理阶段
+function pixelateDecodedImage(job: ConvertJob, image: DecodedImage): ConvertJobResult {
+  const { N, M } = getGridSize(image.originalWidth, image.originalHeight, job.granularity);
+
+  // 使用优化的透明色查找函数
+  const defaultColor = findTransparentFallbackColor(job.palette, job.colorSystem);
+
+  // 执行像素化处理
+  console.log(`Calculating pixel grid with mode: ${job.pixelationMode}`);
+  const initialGrid = pixelateImageData(image, N, M, job.palette, job.pixelationMode, defaultColor, image.integral);
+
+  return finishConvertPipeline(job, initialGrid, image, defaultColor);
+}
+
+/**
+ * 在当前线程中执行完整的转换流水线
+ * @param job 转换任务
+ * @param cachedImage 已缓存的解码结果，提供时跳过解码
+ * @param shareDecoded 为 true 时把解码结果放入共享内存并返回，供调用方缓存
+ */
+export async function runConvertPipeline(
+  job: ConvertJob,
+  cachedImage: SharedDecodedImage | null = null,
+  shareDecoded: boolean = false
+): Promise<{ result: ConvertJobResult; decoded: SharedDecodedImage | null }> {
+  if (cachedImage) {
+    return { result: pixelateDecodedImage(job, fromSharedDecodedImage(cachedImage)), decoded: null };
+  }
+  const image = await decodeImage(job);
+  return { result: pixelateDecodedImage(job, image), decoded: shareDecoded ? toSharedDecodedImage(image) : null };
+}
+
+// 执行工作线程任务，返回结果和需要转移的缓冲区
+export async function runConvertWorkerTask(
+  task: ConvertWorkerTask
+): Promise<{ response: ConvertWorkerResult; transferList: ArrayBuffer[] }> {
+  if (task.type === 'pixelateBand') {
+    const { N, M, rowStart, rowEnd } = task;
+    const image = fromSharedDecodedImage(task.image);
+    const indices = new Uint16Array((rowEnd - rowStart) * N);
+    pixelateRowBand(image, N, M, rowStart, rowEnd, task.palette, task.mode, task.fallbackIndex, indices, image.integral);
+    return { response: { type: 'band', indices }, transferList: [indices.buffer] };
+  }
+
+  if (task.type === 'decode') {
+    return { response: { type: 'decoded', image: await decodeSharedImage(task.job) }, transferList: [] };
+  }
+
+  if (task.type === 'integral') {
+    return { response: { type: 'integral', integral: buildSharedIntegralImage(task.image) }, transferList: [] };
+  }
+
+  if (task.type === 'pixelate') {
+    const result = pixelateDecodedImage(task.job, fromSharedDecodedImage(task.image));
+    return { response: { type: 'result', result, decoded: null }, transferList: getConvertResultTransferList(result) };
+  }
+
+  const { job, parallelMinPixels, shareDecoded } = task;
+  const image = await decodeImage(job);
+  if (parallelMinPixels > 0 && image.width * image.height >= parallelMinPixels) {
+    // 大图：复制到共享内存，由调用方按行分段交给多个工作线程
+    return { response: { type: 'decoded', image: toSharedDecodedImage(image) }, transferList: [] };
+  }
+
+  const result = pixelateDecodedImage(job, image);
+  return {
+    response: { type: 'result', result, decoded: shareDecoded ? toSharedDecodedImage(image) : null },
+    transferList: getConvertResultTransferList(result)
+  };
+}
+
+// 结果中可以转移给其他线程的缓冲区
+export function getConvertResultTransferList(result: ConvertJobResult): ArrayBuffer[] {
+  const transferList: ArrayBuffer[] = [result.grid.indices.buffer as ArrayBuffer];
+  if (result.grid.external) {
+    transferList.push(result.grid.external.buffer as ArrayBuffer);
+  }
+  return transferList;
+}
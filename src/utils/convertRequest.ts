@@ -0,0 +1,229 @@
+// 转换请求的参数解析和结果数据构建，/api/convert 和 /api/batch 共用
+import { PixelationMode, PaletteColor } from './pixelation';
+import { IndexedPixelGrid, calculateGridColorCounts, indexedGridToMappedData } from './pixelGrid';
+import { parseBackgroundKeys, parseGranularities, validateConvertParams } from './apiUtils';
+import { ConvertJob, ConvertJobResult } from './convertPipeline';
+import {
+  getCachedDefaultPalette,
+  getCachedCustomPalette,
+  getCachedPresetPalette
+} from './paletteRegistry';
+import { ColorSystem, findTransparentFallbackColor } from './colorSystemUtils';
+import { encodeCompactPixelData } from './compactPixelData';
+import { storePattern } from './patternStore';
+import { CustomPalette } from '@/types/paletteTypes';
+import { PixelFormat } from '@/types/pixelTypes';
+import { SERVER_CONFIG } from '../config/serverConfig';
+
+// 请求参数错误，路由返回 400
+export class ConvertRequestError extends Error {
+  constructor(message: string, public readonly details?: string) {
+    super(message);
+    this.name = 'ConvertRequestError';
+  }
+}
+
+export interface ConvertRequestParams {
+  granularity: number;
+  // 提供时一次生成多个粒度的图纸，忽略 granularity
+  granularities: number[] | null;
+  similarityThreshold: number;
+  pixelationMode: PixelationMode;
+  colorSystem: ColorSystem;
+  palette: PaletteColor[];
+  paletteSource: 'default' | 'custom' | 'preset';
+  paletteName: string;
+  removeBackground: boolean;
+  backgroundKeys: string[] | null;
+  downscale: boolean;
+  // pixelData 的输出格式
+  pixelFormat: PixelFormat;
+  // 是否在服务端保存图纸并返回 patternId
+  storePattern: boolean;
+}
+
+function getErrorDetails(error: unknown): string {
+  return error instanceof Error ? error.message : '未知错误';
+}
+
+/**
+ * 解析并校验转换参数（不包括图片文件），同时解析调色板
+ * 参数错误时抛出 ConvertRequestError
+ */
+export function parseConvertRequest(formData: FormData): ConvertRequestParams {
+  // 获取参数，设置默认值
+  const granularity = parseInt(formData.get('granularity') as string) || 50;
+  // 阈值为 0 表示不合并颜色，只有缺省或无法解析时才使用默认值
+  const parsedThreshold = parseInt(formData.get('similarityThreshold') as string);
+  const similarityThreshold = isNaN(parsedThreshold) ? 30 : parsedThreshold;
+  const pixelationMode = (formData.get('pixelationMode') as PixelationMode) || PixelationMode.Dominant;
+  const colorSystem = formData.get('selectedColorSystem') as ColorSystem || 'MARD';
+  const selectedPalette = formData.get('selectedPalette') as string || '290色';
+
+  // 获取自定义调色板数据（仅当选择 custom 时使用）
+  const customPaletteData = formData.get('customPalette') as string;
+
+  // 粒度列表：一次上传生成多个尺寸的图纸，提供时忽略 granularity
+  let granularities: number[] | null;
+  try {
+    granularities = parseGranularities(formData.get('granularities') as string | null);
+  } catch (error) {
+    throw new ConvertRequestError('粒度列表格式错误', getErrorDetails(error));
+  }
+  if (granularities && granularities.length > SERVER_CONFIG.convert.maxGranularities) {
+    throw new ConvertRequestError(`粒度列表最多包含 ${SERVER_CONFIG.convert.maxGranularities} 个粒度`);
+  }
+
+  // 解码后先缩小到每个单元格少量像素再像素化（默认关闭）
+  const downscale = formData.get('downscale') === 'true';
+
+  // 紧凑编码的 pixelData（默认 mapped，与之前的响应格式相同）
+  const pixelFormat = (formData.get('pixelFormat') as PixelFormat | null) || 'mapped';
+  if (pixelFormat !== 'mapped' && pixelFormat !== 'indexed') {
+    throw new ConvertRequestError('pixelFormat 参数必须是 mapped 或 indexed');
+  }
+
+  // 在服务端保存图纸，下载时只需提交 patternId（默认关闭）
+  const storePattern = formData.get('storePattern') === 'true';
+
+  // 背景移除参数（默认关闭）
+  const removeBackground = formData.get('removeBackground') === 'true';
+  let backgroundKeys: string[] | null;
+  try {
+    backgroundKeys = parseBackgroundKeys(formData.get('backgroundKeys') as string | null);
+  } catch (error) {
+    throw new ConvertRequestError('背景色号列表格式错误', getErrorDetails(error));
+  }
+
+  // 验证参数范围
+  const validation = validateConvertParams({ granularity, similarityThreshold, pixelationMode });
+  if (!validation.isValid) {
+    throw new ConvertRequestError(validation.error!);
+  }
+  for (const size of granularities || []) {
+    const sizeValidation = validateConvertParams({ granularity: size });
+    if (!sizeValidation.isValid || size === 0) {
+      throw new ConvertRequestError(sizeValidation.error || '粒度参数必须在1-200之间');
+    }
+  }
+
+  // 获取调色板数据
+  let palette: PaletteColor[];
+  let paletteSource: ConvertRequestParams['paletteSource'] = 'default';
+  let paletteName = '290色';
+
+  if (selectedPalette === 'custom') {
+    // 使用自定义调色板
+    if (!customPaletteData) {
+      throw new ConvertRequestError('选择了自定义调色板但未提供调色板数据');
+    }
+
+    try {
+      const customColors = JSON.parse(customPaletteData) as CustomPalette;
+      palette = getCachedCustomPalette(customColors, colorSystem);
+      paletteSource = 'custom';
+      paletteName = customColors.name || `${palette.length}色`;
+      console.log(`使用自定义调色板，包含 ${palette.length} 种颜色`);
+    } catch (error) {
+      throw new ConvertRequestError('自定义调色板格式错误', getErrorDetails(error));
+    }
+  } else if (selectedPalette !== '290色') {
+    // 使用预制调色板（非默认调色板的其他选项）
+    try {
+      palette = getCachedPresetPalette(selectedPalette, colorSystem);
+      paletteSource = 'preset';
+      paletteName = `${selectedPalette}`;
+      console.log(`使用预制调色板 ${selectedPalette}，包含 ${palette.length} 种颜色`);
+    } catch (error) {
+      throw new ConvertRequestError(`预制调色板加载错误: ${selectedPalette}`, getErrorDetails(error));
+    }
+  } else {
+    // 使用默认调色板 (290色)
+    palette = getCachedDefaultPalette(colorSystem);
+    if (palette.length === 0) {
+      throw new ConvertRequestError('无效的调色板');
+    }
+  }
+
+  return {
+    granularity,
+    granularities,
+    similarityThreshold,
+    pixelationMode,
+    colorSystem,
+    palette,
+    paletteSource,
+    paletteName,
+    removeBackground,
+    backgroundKeys,
+    downscale,
+    pixelFormat,
+    storePattern
+  };
+}
+
+// 根据请求参数创建转换任务
+export function createConvertJob(params: ConvertRequestParams, imageData: ArrayBuffer): ConvertJob {
+  return {
+    imageData,
+    granularity: params.granularity,
+    similarityThreshold: params.similarityThreshold,
+    pixelationMode: params.pixelationMode,
+    palette: params.palette,
+    colorSystem: params.colorSystem,
+    removeBackground: params.removeBackground,
+    backgroundKeys: params.backgroundKeys,
+    downscaleSamples: params.downscale ? SERVER_CONFIG.convert.downscaleSamples : 0
+  };
+}
+
+// 响应中的 processingParams（不含粒度），backgroundKeys 为实际使用的背景色号列表
+export function buildProcessingParams(params: ConvertRequestParams, backgroundKeys: string[]) {
+  return {
+    similarityThreshold: params.similarityThreshold,
+    pixelationMode: params.pixelationMode,
+    selectedColorSystem: params.colorSystem,
+    paletteSource: params.paletteSource,
+    customPaletteColors: params.paletteSource === 'custom' ? params.palette.length : undefined,
+    removeBackground: params.removeBackground,
+    backgroundKeys: params.removeBackground ? backgroundKeys : undefined,
+    downscale: params.downscale,
+    pixelFormat: params.pixelFormat
+  };
+}
+
+// 实际使用的背景色号列表：未指定时为透明区域的备用色（与转换流水线一致），只取决于参数和调色板
+export function resolveBackgroundKeys(params: ConvertRequestParams): string[] {
+  return params.backgroundKeys || [findTransparentFallbackColor(params.palette, params.colorSystem).key];
+}
+
+// 颜色统计
+export function buildColorSummary(grid: IndexedPixelGrid) {
+  // 计算颜色统计（外部背景单元格不计入）
+  const colorCounts = calculateGridColorCounts(grid);
+
+  // 计算总珠子数量
+  const totalBeadCount = Object.values(colorCounts).reduce((sum, { count }) => sum + count, 0);
+
+  return { colorCounts, totalBeadCount };
+}
+
+// storePattern=true 时保存网格，返回 { patternId }（未启用图纸存储时为 null）；否则返回空对象
+export function buildPatternHandle(result: ConvertJobResult, params: ConvertRequestParams): { patternId?: string | null } {
+  return params.storePattern ? { patternId: storePattern(result.grid, params.colorSystem) } : {};
+}
+
+// 单个粒度的图纸数据：像素网格和颜色统计
+export function buildPatternData(result: ConvertJobResult, colorSystem: ColorSystem, pixelFormat: PixelFormat = 'mapped') {
+  const { grid } = result;
+
+  // 创建符合新 PixelData 接口的数据结构（仅在输出 JSON 时展开为 MappedPixel[][]）
+  const pixelData = pixelFormat === 'indexed' ? encodeCompactPixelData(grid, colorSystem) : {
+    mappedData: indexedGridToMappedData(grid),
+    width: grid.width,
+    height: grid.height,
+    colorSystem
+  };
+
+  return { pixelData, ...buildColorSummary(grid) };
+}
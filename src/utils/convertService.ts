@@ -0,0 +1,354 @@
+// 图片转换调度
+// 默认把转换流水线交给有界的工作线程池执行，避免大图阻塞请求线程（包括 /api/status 健康检查）。
+// 超大图片解码后按网格行分段，由多个工作线程共享同一份 RGBA 数据并行像素化。
+// 转换结果和解码结果分别缓存（见 convertCache.ts、decodedImageCache.ts）。
+// 同一张图片的多个粒度只解码一次（见 convertImageSizes）。
+// CONVERT_POOL_SIZE=0 时不使用工作线程，在请求线程中直接执行。
+import { Worker } from 'worker_threads';
+import {
+  ConvertJob,
+  ConvertJobResult,
+  ConvertWorkerTask,
+  ConvertWorkerResult,
+  SharedDecodedImage,
+  buildSharedIntegralImage,
+  decodeSharedImage,
+  finishConvertPipeline,
+  getGridSize,
+  runConvertPipeline
+} from './convertPipeline';
+import { PixelationMode, createFallbackGrid, splitRowBands } from './pixelation';
+import { findTransparentFallbackColor } from './colorSystemUtils';
+import { WorkerPool, WorkerPoolOverloadedError, WorkerPoolStats } from './workerPool';
+import {
+  ConvertCacheStatus,
+  getCachedConvertResult,
+  getConvertCacheKey,
+  hashImageData,
+  isConvertCacheEnabled,
+  setCachedConvertResult
+} from './convertCache';
+import { getCachedDecodedImage, isDecodedImageCacheEnabled, setCachedDecodedImage } from './decodedImageCache';
+import { getPaletteHash } from './paletteRegistry';
+import { SERVER_CONFIG } from '../config/serverConfig';
+
+// 工作线程按需启动，创建线程池本身没有开销
+const convertPool = SERVER_CONFIG.convertPool.size > 0
+  ? new WorkerPool<ConvertWorkerTask, ConvertWorkerResult>(
+    // new URL(..., import.meta.url) 的写法让打包工具把工作线程入口单独打包
+    () => new Worker(new URL('./convertWorker.ts', import.meta.url)),
+    SERVER_CONFIG.convertPool.size,
+    SERVER_CONFIG.convertPool.maxQueueLength
+  )
+  : null;
+
+// 只有一个工作线程时分段没有意义
+const parallelMinPixels = SERVER_CONFIG.convertPool.size > 1 ? SERVER_CONFIG.convertPool.parallelMinPixels : 0;
+
+// 像素数不超过该值的图片才构建积分图（积分图占用约 16 字节/像素）
+const integralMaxPixels = SERVER_CONFIG.convert.integralMaxPixels;
+
+// 已解码的任务不再需要上传的图片数据，用空缓冲区代替，避免随任务复制
+const EMPTY_IMAGE_DATA = new ArrayBuffer(0);
+
+/**
+ * 按行分段并行像素化已解码的大图，结果拼接后继续执行后续处理阶段
+ * @param admitted 请求是否已经通过线程池的排队检查（解码任务已被接受）
+ */
+async function pixelateInBands(
+  pool: WorkerPool<ConvertWorkerTask, ConvertWorkerResult>,
+  job: ConvertJob,
+  image: SharedDecodedImage,
+  admitted: boolean
+): Promise<ConvertJobResult> {
+  // 使用缓存的解码结果时请求还没有经过排队检查，先确认线程池没有过载
+  if (!admitted && pool.isOverloaded()) {
+    throw new WorkerPoolOverloadedError();
+  }
+
+  const { N, M } = getGridSize(image.originalWidth, image.originalHeight, job.granularity);
+  const defaultColor = findTransparentFallbackColor(job.palette, job.colorSystem);
+  const grid = createFallbackGrid(N, M, job.palette, defaultColor);
+  const fallbackIndex = grid.indices[0];
+
+  // 分段任务属于已被接受的请求，不受排队上限限制
+  await Promise.all(splitRowBands(M, pool.getStats().size).map(async ([rowStart, rowEnd]) => {
+    const response = await pool.run({
+      type: 'pixelateBand',
+      image,
+      N,
+      M,
+      rowStart,
+      rowEnd,
+      palette: job.palette,
+      mode: job.pixelationMode,
+      fallbackIndex
+    }, [], true);
+    if (response.type !== 'band') {
+      throw new Error('工作线程返回了意外的结果');
+    }
+    grid.indices.set(response.indices, rowStart * N);
+  }));
+
+  return finishConvertPipeline(job, grid, image, defaultColor);
+}
+
+/**
+ * 对已解码的图片执行像素化及后续处理阶段，超大图片按行分段并行
+ * @param admitted 请求是否已经通过线程池的排队检查，为 true 时不再受排队上限限制
+ */
+async function pixelateDecoded(job: ConvertJob, image: SharedDecodedImage, admitted: boolean): Promise<ConvertJobResult> {
+  if (!convertPool) {
+    return (await runConvertPipeline(job, image)).result;
+  }
+  if (parallelMinPixels > 0 && image.width * image.height >= parallelMinPixels) {
+    return pixelateInBands(convertPool, job, image, admitted);
+  }
+  const response = await convertPool.run({ type: 'pixelate', job: { ...job, imageData: EMPTY_IMAGE_DATA }, image }, [], admitted);
+  if (response.type !== 'result') {
+    throw new Error('工作线程返回了意外的结果');
+  }
+  return response.result;
+}
+
+/**
+ * 平均色模式下为被重复使用的解码结果构建积分图，之后每个粒度只需按单元格查表
+ * 构建积分图的开销约为直接像素化一次的两到三倍，因此只在解码结果缓存命中或一次生成多个粒度时构建，
+ * 并与解码结果一起缓存。不需要构建时原样返回 image。
+ * @param admitted 请求是否已经通过线程池的排队检查
+ */
+async function withIntegralImage(
+  job: ConvertJob,
+  image: SharedDecodedImage,
+  imageHash: string | null,
+  admitted: boolean
+): Promise<SharedDecodedImage> {
+  if (job.pixelationMode !== PixelationMode.Average || image.integral || image.width * image.height > integralMaxPixels) {
+    return image;
+  }
+
+  let integral: SharedArrayBuffer;
+  if (convertPool) {
+    const response = await convertPool.run({ type: 'integral', image }, [], admitted);
+    if (response.type !== 'integral') {
+      throw new Error('工作线程返回了意外的结果');
+    }
+    integral = response.integral;
+  } else {
+    integral = buildSharedIntegralImage(image);
+  }
+
+  const imageWithIntegral = { ...image, integral };
+  if (imageHash !== null && isDecodedImageCacheEnabled()) {
+    setCachedDecodedImage(imageHash, imageWithIntegral);
+  }
+  return imageWithIntegral;
+}
+
+/**
+ * 在工作线程池（或请求线程）中执行转换，不经过结果缓存
+ * 原图分辨率的解码结果按图片哈希缓存，同一张图片再次转换时跳过解码
+ * @param imageHash 图片内容哈希，为 null 时不使用解码结果缓存
+ */
+async function runConversion(job: ConvertJob, imageHash: string | null): Promise<ConvertJobResult> {
+  // 降采样的解码结果与粒度有关，只缓存原图分辨率的解码结果
+  const useDecodedCache = imageHash !== null && job.downscaleSamples === 0 && isDecodedImageCacheEnabled();
+  const cachedImage = useDecodedCache ? getCachedDecodedImage(imageHash) : null;
+
+  if (cachedImage) {
+    // 构建积分图的任务已经通过排队检查时，像素化任务不再受排队上限限制
+    const image = await withIntegralImage(job, cachedImage, imageHash, false);
+    return pixelateDecoded(job, image, image !== cachedImage);
+  }
+
+  if (!convertPool) {
+    const { result, decoded } = await runConvertPipeline(job, null, useDecodedCache);
+    if (decoded) {
+      setCachedDecodedImage(imageHash!, decoded);
+    }
+    return result;
+  }
+
+  const response = await convertPool.run(
+    { type: 'convert', job, parallelMinPixels, shareDecoded: useDecodedCache },
+    [job.imageData]
+  );
+  switch (response.type) {
+    case 'result':
+      if (response.decoded) {
+        setCachedDecodedImage(imageHash!, response.decoded);
+      }
+      return response.result;
+    case 'decoded':
+      if (useDecodedCache) {
+        setCachedDecodedImage(imageHash!, response.image);
+      }
+      return pixelateInBands(convertPool, job, response.image, true);
+    default:
+      throw new Error('工作线程返回了意外的结果');
+  }
+}
+
+export interface ConvertOutcome {
+  // 在请求之间共享（来自缓存时），调用方不能修改
+  result: ConvertJobResult;
+  cacheStatus: ConvertCacheStatus;
+}
+
+// 正在处理中的转换，相同的并发请求共用同一个结果
+const inflightConversions = new Map<string, Promise<ConvertJobResult>>();
+
+/**
+ * 优先使用结果缓存，未命中时执行 convert 并缓存结果
+ * 相同的并发请求共用同一个转换任务
+ */
+async function withResultCache(cacheKey: string, convert: () => Promise<ConvertJobResult>): Promise<ConvertOutcome> {
+  const inflight = inflightConversions.get(cacheKey);
+  if (inflight) {
+    return { result: await inflight, cacheStatus: 'shared' };
+  }
+
+  const cached = await getCachedConvertResult(cacheKey);
+  if (cached.result) {
+    return { result: cached.result, cacheStatus: cached.status };
+  }
+
+  const conversion = convert();
+  inflightConversions.set(cacheKey, conversion);
+  try {
+    const result = await conversion;
+    setCachedConvertResult(cacheKey, result);
+    return { result, cacheStatus: 'miss' };
+  } finally {
+    inflightConversions.delete(cacheKey);
+  }
+}
+
+/**
+ * 执行图片转换，优先使用结果缓存
+ * 使用线程池时 job.imageData 会被转移给工作线程，调用后不能再访问。
+ * 线程池队列已满时抛出 WorkerPoolOverloadedError。
+ */
+export async function convertImage(job: ConvertJob): Promise<ConvertOutcome> {
+  // 必须在 imageData 被转移给工作线程之前计算图片哈希
+  const imageHash = isConvertCacheEnabled() || isDecodedImageCacheEnabled() ? hashImageData(job.imageData) : null;
+  if (!isConvertCacheEnabled()) {
+    return { result: await runConversion(job, imageHash), cacheStatus: 'disabled' };
+  }
+  const cacheKey = getConvertCacheKey(imageHash!, job, getPaletteHash(job.palette));
+  return withResultCache(cacheKey, () => runConversion(job, imageHash));
+}
+
+/**
+ * 解码图片并放入共享内存，优先使用解码结果缓存
+ * 使用缓存的解码结果时先确认线程池没有过载，保证之后的像素化任务可以不受排队上限限制
+ */
+async function getSharedDecodedImage(job: ConvertJob, imageHash: string | null): Promise<SharedDecodedImage> {
+  const useDecodedCache = imageHash !== null && isDecodedImageCacheEnabled();
+  const cachedImage = useDecodedCache ? getCachedDecodedImage(imageHash) : null;
+  if (cachedImage) {
+    if (convertPool && convertPool.isOverloaded()) {
+      throw new WorkerPoolOverloadedError();
+    }
+    return cachedImage;
+  }
+
+  let image: SharedDecodedImage;
+  if (convertPool) {
+    const response = await convertPool.run({ type: 'decode', job }, [job.imageData]);
+    if (response.type !== 'decoded') {
+      throw new Error('工作线程返回了意外的结果');
+    }
+    image = response.image;
+  } else {
+    image = await decodeSharedImage(job);
+  }
+  if (useDecodedCache) {
+    setCachedDecodedImage(imageHash!, image);
+  }
+  return image;
+}
+
+/**
+ * 用同一张图片生成多个粒度的图纸，结果顺序与 granularities 一致
+ * 图片只解码一次（平均色模式下同时构建积分图），各粒度的像素化任务在线程池中并行执行；每个粒度分别使用结果缓存，
+ * 全部命中时不解码。启用降采样时解码结果与粒度有关，各粒度分别转换。
+ * 使用线程池时 job.imageData 会被转移给工作线程，调用后不能再访问。
+ */
+export async function convertImageSizes(job: ConvertJob, granularities: number[]): Promise<ConvertOutcome[]> {
+  if (job.downscaleSamples > 0) {
+    // 图片数据会被转移给工作线程，每个粒度使用各自的副本
+    return Promise.all(granularities.map(granularity => convertImage({ ...job, granularity, imageData: job.imageData.slice(0) })));
+  }
+
+  const imageHash = isConvertCacheEnabled() || isDecodedImageCacheEnabled() ? hashImageData(job.imageData) : null;
+  const paletteHash = isConvertCacheEnabled() ? getPaletteHash(job.palette) : '';
+
+  // 第一个未命中结果缓存的粒度触发解码，其余粒度共用同一份解码结果
+  let decoding: Promise<SharedDecodedImage> | null = null;
+  const pixelateSize = async (sizeJob: ConvertJob) => {
+    if (!decoding) {
+      decoding = getSharedDecodedImage(job, imageHash).then(image => withIntegralImage(job, image, imageHash, true));
+    }
+    return pixelateDecoded(sizeJob, await decoding, true);
+  };
+
+  return Promise.all(granularities.map(async granularity => {
+    const sizeJob = { ...job, granularity };
+    if (!isConvertCacheEnabled()) {
+      return { result: await pixelateSize(sizeJob), cacheStatus: 'disabled' as ConvertCacheStatus };
+    }
+    return withResultCache(getConvertCacheKey(imageHash!, sizeJob, paletteHash), () => pixelateSize(sizeJob));
+  }));
+}
+
+// 批量转换中单张图片遇到线程池过载时的最多重试次数
+const BATCH_OVERLOAD_RETRIES = 3;
+
+// 转换单张图片，线程池被其他请求占满时等待 Retry-After 秒后重新读取图片并重试
+async function convertWithRetry(loadJob: () => Promise<ConvertJob>): Promise<ConvertOutcome> {
+  for (let attempt = 0; ; attempt++) {
+    try {
+      return await convertImage(await loadJob());
+    } catch (error) {
+      if (!(error instanceof WorkerPoolOverloadedError) || attempt >= BATCH_OVERLOAD_RETRIES) {
+        throw error;
+      }
+      await new Promise(resolve => setTimeout(resolve, SERVER_CONFIG.convertPool.retryAfterSeconds * 1000));
+    }
+  }
+}
+
+/**
+ * 批量转换，同时最多执行 concurrency 张图片；每张图片完成或失败时调用 onSettled
+ * 单张图片失败不影响其他图片。调色板由调用方解析一次后放入所有任务，工作线程中的最近色索引按调色板内容缓存，
+ * 整批只构建一次。
+ * @param count 图片数量
+ * @param loadJob 读取第 index 张图片并创建转换任务；按需调用，不会同时持有所有图片的数据
+ * @param signal 中止后不再开始新的图片（如流式响应的客户端已断开），已开始的转换照常完成
+ */
+export async function convertImageBatch(
+  count: number,
+  loadJob: (index: number) => Promise<ConvertJob>,
+  concurrency: number,
+  onSettled: (index: number, outcome: ConvertOutcome | null, error: unknown) => void,
+  signal?: AbortSignal
+): Promise<void> {
+  let nextIndex = 0;
+  const runNext = async () => {
+    while (nextIndex < count && !signal?.aborted) {
+      const index = nextIndex++;
+      try {
+        onSettled(index, await convertWithRetry(() => loadJob(index)), null);
+      } catch (error) {
+        onSettled(index, null, error);
+      }
+    }
+  };
+  await Promise.all(Array.from({ length: Math.min(concurrency, count) }, runNext));
+}
+
+// 线程池状态，未启用线程池时返回 null
+export function getConvertPoolStats(): WorkerPoolStats | null {
+  return convertPool ? convertPool.getStats() : null;
+}
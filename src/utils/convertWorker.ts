@@ -0,0 +1,23 @@
+// 图片转换工作线程入口，由 convertService.ts 中的线程池加载
+import { parentPort } from 'worker_threads';
+import { ConvertWorkerTask, ConvertWorkerResult, runConvertWorkerTask } from './convertPipeline';
+import { WorkerResponse } from './workerPool';
+
+if (!parentPort) {
+  throw new Error('convertWorker 只能在工作线程中运行');
+}
+const port = parentPort;
+
+port.on('message', async (task: ConvertWorkerTask) => {
+  try {
+    const { response, transferList } = await runConvertWorkerTask(task);
+    const message: WorkerResponse<ConvertWorkerResult> = { ok: true, result: response };
+    port.postMessage(message, transferList);
+  } catch (error) {
+    const message: WorkerResponse<ConvertWorkerResult> = {
+      ok: false,
+      error: error instanceof Error ? error.message : '未知错误'
+    };
+    port.postMessage(message);
+  }
+});
@@ -0,0 +1,64 @@
+// 解码结果缓存
+// 按图片内容哈希缓存解码后的 RGBA 数据（SharedArrayBuffer，可直接交给工作线程读取，无需复制），
+// 同一张图片只改变粒度、模式等参数重复转换时跳过解码。
+// 平均色模式的积分图构建后与解码结果一起缓存。
+// 按字节数做 LRU 淘汰，条目在最后一次使用之后超过 TTL 即被删除。
+import { SharedDecodedImage } from './convertPipeline';
+import { LruCache } from './lruCache';
+import { SERVER_CONFIG } from '../config/serverConfig';
+
+export interface DecodedImageCacheStats {
+  enabled: boolean;
+  entries: number;
+  bytes: number;
+  maxBytes: number;
+  ttlSeconds: number;
+  hits: number;
+  misses: number;
+}
+
+const { decodedMaxMB, decodedTtlSeconds } = SERVER_CONFIG.convertCache;
+const maxBytes = decodedMaxMB * 1024 * 1024;
+const ttlMs = decodedTtlSeconds * 1000;
+const counters = { hits: 0, misses: 0 };
+
+const decodedImages = new LruCache<string, SharedDecodedImage>(Infinity, {
+  maxSize: maxBytes,
+  sizeOf: image => image.rgba.byteLength + (image.integral ? image.integral.byteLength : 0),
+  ttlMs
+});
+
+// 空闲时也按时释放过期的解码结果，不阻止进程退出
+if (maxBytes > 0) {
+  setInterval(() => decodedImages.prune(), ttlMs).unref();
+}
+
+export function isDecodedImageCacheEnabled(): boolean {
+  return maxBytes > 0;
+}
+
+// 查询解码结果，返回的数据在请求之间共享，不能修改
+export function getCachedDecodedImage(imageHash: string): SharedDecodedImage | null {
+  const image = decodedImages.get(imageHash);
+  if (image) {
+    counters.hits++;
+    return image;
+  }
+  counters.misses++;
+  return null;
+}
+
+export function setCachedDecodedImage(imageHash: string, image: SharedDecodedImage): void {
+  decodedImages.set(imageHash, image);
+}
+
+export function getDecodedImageCacheStats(): DecodedImageCacheStats {
+  return {
+    enabled: isDecodedImageCacheEnabled(),
+    entries: decodedImages.size,
+    bytes: decodedImages.totalSize,
+    maxBytes,
+    ttlSeconds: decodedTtlSeconds,
+    ...counters
+  };
+}
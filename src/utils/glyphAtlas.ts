@@ -0,0 +1,73 @@
+// 色号标签的预渲染缓存
+// node-canvas 的 fillText 每次调用都要经过 Pango 排版，是绘制图纸时单个单元格开销最大的操作，
+// 而一张图纸只有几十种色号。每个 (字体, 色号, 颜色, 单元格大小) 只排版一次，绘制到透明的小画布上，
+// 之后用 drawImage 直接贴到单元格上。缓存在请求之间共享，按字节数做 LRU 淘汰。
+import { createCanvas, Canvas } from 'canvas';
+import { LruCache } from './lruCache';
+import { SERVER_CONFIG } from '../config/serverConfig';
+
+export interface GlyphSprite {
+  image: Canvas;
+  // 贴图位置相对于单元格左上角（取整后）的偏移，标签比单元格宽时贴图会向两侧延伸
+  offsetX: number;
+  offsetY: number;
+}
+
+export class GlyphAtlas {
+  private readonly sprites: LruCache<string, GlyphSprite>;
+
+  constructor(maxBytes: number) {
+    this.sprites = new LruCache<string, GlyphSprite>(Infinity, {
+      maxSize: maxBytes,
+      sizeOf: ({ image }) => image.width * image.height * 4
+    });
+  }
+
+  get size(): number {
+    return this.sprites.size;
+  }
+
+  get bytes(): number {
+    return this.sprites.totalSize;
+  }
+
+  /**
+   * 获取居中绘制在单元格中的标签贴图
+   * 单元格左上角坐标的小数部分（phaseX / phaseY）在绘制贴图时计入，贴到取整后的坐标上与直接 fillText 的位置一致
+   * @param cellSize 单元格边长，必须是整数
+   */
+  get(text: string, font: string, color: string, cellSize: number, phaseX: number, phaseY: number): GlyphSprite {
+    const cacheKey = `${font}\u0000${text}\u0000${color}\u0000${cellSize}\u0000${phaseX}\u0000${phaseY}`;
+    let sprite = this.sprites.get(cacheKey);
+    if (!sprite) {
+      sprite = renderGlyphSprite(text, font, color, cellSize, phaseX, phaseY);
+      this.sprites.set(cacheKey, sprite);
+    }
+    return sprite;
+  }
+
+  clear(): void {
+    this.sprites.clear();
+  }
+}
+
+function renderGlyphSprite(text: string, font: string, color: string, cellSize: number, phaseX: number, phaseY: number): GlyphSprite {
+  const measureCtx = createCanvas(1, 1).getContext('2d');
+  measureCtx.font = font;
+  const textWidth = Math.ceil(measureCtx.measureText(text).width) + 2;
+  // 两侧各留出相同的宽度，保证贴图的偏移是整数
+  const padding = Math.max(0, Math.ceil((textWidth - cellSize) / 2)) + 1;
+
+  const image = createCanvas(cellSize + padding * 2, cellSize + 2);
+  const ctx = image.getContext('2d');
+  ctx.font = font;
+  ctx.fillStyle = color;
+  ctx.textAlign = 'center';
+  ctx.textBaseline = 'middle';
+  ctx.fillText(text, padding + cellSize / 2 + phaseX, 1 + cellSize / 2 + phaseY);
+  return { image, offsetX: -padding, offsetY: -1 };
+}
+
+// 所有请求共享的贴图缓存，DOWNLOAD_GLYPH_CACHE_MB=0 时为 null（直接使用 fillText）
+const maxBytes = SERVER_CONFIG.download.glyphCacheMB * 1024 * 1024;
+export const sharedGlyphAtlas: GlyphAtlas | null = maxBytes > 0 ? new GlyphAtlas(maxBytes) : null;
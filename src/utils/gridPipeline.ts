@@ -0,0 +1,135 @@
+// 像素网格处理流水线的各个阶段
+// 每个阶段接收一个 IndexedPixelGrid 并返回新的网格（不修改输入），服务端和网页端共用。
+import { colorDistance } from './pixelation';
+import { IndexedPixelGrid } from './pixelGrid';
+
+/**
+ * 相似颜色合并
+ * 按色号出现次数从高到低处理，把与高频颜色距离小于阈值的低频颜色合并到高频颜色中。
+ * 先在 O(K²) 内算出色号替换表，再对网格做一次 O(N·M) 的重映射。
+ * @param grid 像素网格
+ * @param similarityThreshold 颜色相似度阈值（RGB 欧氏距离）
+ * @returns 合并后的网格；没有可合并的颜色时直接返回输入网格
+ */
+export function mergeSimilarColors(grid: IndexedPixelGrid, similarityThreshold: number): IndexedPixelGrid {
+  const { indices, palette, external } = grid;
+
+  // 1. 统计各色号数量，键的顺序与按单元格顺序首次出现的顺序一致
+  const countsByIndex = new Uint32Array(palette.length);
+  const firstSeenOrder: number[] = [];
+  for (let cellIndex = 0; cellIndex < indices.length; cellIndex++) {
+    if (external && external[cellIndex]) continue;
+    const paletteIndex = indices[cellIndex];
+    if (countsByIndex[paletteIndex]++ === 0) {
+      firstSeenOrder.push(paletteIndex);
+    }
+  }
+  const colorCounts: { [key: string]: number } = {};
+  for (const paletteIndex of firstSeenOrder) {
+    const key = palette[paletteIndex].key;
+    colorCounts[key] = (colorCounts[key] || 0) + countsByIndex[paletteIndex];
+  }
+
+  // 同一色号对应多个调色板项时，使用最后一项（与网页端按色号建立映射的行为一致）
+  const keyToPaletteIndex = new Map<string, number>();
+  palette.forEach((color, paletteIndex) => keyToPaletteIndex.set(color.key, paletteIndex));
+
+  // 2. 按出现频率从高到低排序
+  const colorsByFrequency = Object.entries(colorCounts)
+    .sort((a, b) => b[1] - a[1])
+    .map(entry => entry[0]);
+
+  // 3. 计算色号替换表：被合并的低频色号 -> 高频色号
+  const replacements = new Map<string, string>();
+  for (let i = 0; i < colorsByFrequency.length; i++) {
+    const currentKey = colorsByFrequency[i];
+    // 已经被合并到更高频颜色中的色号不再作为合并目标
+    if (replacements.has(currentKey)) continue;
+    const currentRgb = palette[keyToPaletteIndex.get(currentKey)!].rgb;
+
+    for (let j = i + 1; j < colorsByFrequency.length; j++) {
+      const lowerFreqKey = colorsByFrequency[j];
+      if (replacements.has(lowerFreqKey)) continue;
+      const lowerFreqRgb = palette[keyToPaletteIndex.get(lowerFreqKey)!].rgb;
+
+      if (colorDistance(currentRgb, lowerFreqRgb) < similarityThreshold) {
+        replacements.set(lowerFreqKey, currentKey);
+      }
+    }
+  }
+
+  if (replacements.size === 0) {
+    return grid;
+  }
+  console.log(`Merged ${replacements.size} less frequent similar colors into more frequent ones.`);
+
+  // 4. 把色号替换表展开为调色板下标的重映射表，对网格做一次重映射
+  const remap = new Uint16Array(palette.length);
+  palette.forEach((color, paletteIndex) => {
+    const targetKey = replacements.get(color.key);
+    remap[paletteIndex] = targetKey !== undefined ? keyToPaletteIndex.get(targetKey)! : paletteIndex;
+  });
+
+  const mergedIndices = new Uint16Array(indices.length);
+  for (let cellIndex = 0; cellIndex < indices.length; cellIndex++) {
+    mergedIndices[cellIndex] = remap[indices[cellIndex]];
+  }
+  return { ...grid, indices: mergedIndices };
+}
+
+/**
+ * 背景移除
+ * 从所有边界单元格开始做队列式洪水填充（四连通），把与边界连通且色号属于背景色号列表的单元格
+ * 标记为外部背景。每个单元格最多入队一次，整体为 O(N·M)。
+ * @param grid 像素网格
+ * @param backgroundKeys 背景色号列表
+ * @returns 带有外部背景标记的新网格
+ */
+export function removeBackground(grid: IndexedPixelGrid, backgroundKeys: string[]): IndexedPixelGrid {
+  const { width, height, indices, palette } = grid;
+  const cellCount = width * height;
+  const backgroundKeySet = new Set(backgroundKeys);
+  const isBackgroundColor = new Uint8Array(palette.length);
+  palette.forEach((color, paletteIndex) => {
+    if (backgroundKeySet.has(color.key)) isBackgroundColor[paletteIndex] = 1;
+  });
+
+  const external = grid.external ? grid.external.slice() : new Uint8Array(cellCount);
+  const visited = new Uint8Array(cellCount);
+  const queue = new Int32Array(cellCount);
+  let head = 0;
+  let tail = 0;
+
+  const enqueue = (cellIndex: number) => {
+    if (visited[cellIndex]) return;
+    visited[cellIndex] = 1;
+    // 之前已被标记为外部背景的单元格同样视为背景区域
+    if (isBackgroundColor[indices[cellIndex]] || external[cellIndex]) {
+      external[cellIndex] = 1;
+      queue[tail++] = cellIndex;
+    }
+  };
+
+  // 所有边界单元格作为起点
+  for (let i = 0; i < width; i++) {
+    enqueue(i);
+    enqueue((height - 1) * width + i);
+  }
+  for (let j = 0; j < height; j++) {
+    enqueue(j * width);
+    enqueue(j * width + width - 1);
+  }
+
+  while (head < tail) {
+    const cellIndex = queue[head++];
+    const i = cellIndex % width;
+    const j = (cellIndex - i) / width;
+    if (j > 0) enqueue(cellIndex - width);
+    if (j < height - 1) enqueue(cellIndex + width);
+    if (i > 0) enqueue(cellIndex - 1);
+    if (i < width - 1) enqueue(cellIndex + 1);
+  }
+
+  console.log(`Background removal marked ${tail} cells as external.`);
+  return { ...grid, external };
+}
@@ -0,0 +1,80 @@
+// 平均色模式使用的积分图（summed-area table）
+// 对 R、G、B 三个通道和不透明像素数分别做二维前缀和，按 [r, g, b, count] 交错存放在一个 Uint32Array 中，
+// 尺寸为 (width + 1) x (height + 1)，第 0 行和第 0 列为 0。构建只需扫描一遍图片，之后任意矩形区域的
+// 平均色都可以用四次查表得到，与区域大小无关，同一张图片生成多个粒度的网格时不再重复扫描像素。
+//
+// 前缀和按 2^32 取模存储（Uint32Array 写入时自动截断），查询时四个角相加减后再取模即可还原区域和，
+// 只要单个区域内的和小于 2^32（单元格像素数少于约 1680 万）结果就是精确的，与逐像素累加完全一致。
+
+// 每个位置存放的通道数：r, g, b, 不透明像素数
+const CHANNELS = 4;
+
+// 查询结果精确的最大区域像素数：区域内每个通道的和不超过 2^32 - 1
+export const INTEGRAL_MAX_REGION_PIXELS = Math.floor(0xffffffff / 255);
+
+// 积分图占用的字节数
+export function getIntegralImageByteLength(width: number, height: number): number {
+  return (width + 1) * (height + 1) * CHANNELS * Uint32Array.BYTES_PER_ELEMENT;
+}
+
+/**
+ * 构建积分图，alpha 小于 128 的像素不计入（与逐像素计算平均色的规则一致）
+ * @param data RGBA 像素数据
+ * @param width 图片宽度
+ * @param height 图片高度
+ * @param integral 输出数组，长度为 (width + 1) * (height + 1) * 4，必须已清零（新分配的数组即可）
+ */
+export function buildIntegralImage(data: Uint8ClampedArray, width: number, height: number, integral: Uint32Array): void {
+  const stride = (width + 1) * CHANNELS;
+  for (let y = 0; y < height; y++) {
+    // 当前行的前缀和，加上上一行同一列的积分值即为当前位置的积分值
+    let r = 0, g = 0, b = 0, count = 0;
+    let src = y * width * 4;
+    let above = y * stride + CHANNELS;
+    let dst = above + stride;
+    for (let x = 0; x < width; x++, src += 4, above += CHANNELS, dst += CHANNELS) {
+      if (data[src + 3] >= 128) {
+        r += data[src];
+        g += data[src + 1];
+        b += data[src + 2];
+        count++;
+      }
+      integral[dst] = integral[above] + r;
+      integral[dst + 1] = integral[above + 1] + g;
+      integral[dst + 2] = integral[above + 2] + b;
+      integral[dst + 3] = integral[above + 3] + count;
+    }
+  }
+}
+
+/**
+ * 计算矩形区域 [x0, x1) x [y0, y1) 的平均色，区域像素数不能超过 INTEGRAL_MAX_REGION_PIXELS
+ * @param integral buildIntegralImage 构建的积分图
+ * @param width 图片宽度
+ * @returns 打包为 (r << 16) | (g << 8) | b 的平均色，区域内没有不透明像素时返回 -1
+ */
+export function getIntegralAverageColor(
+  integral: Uint32Array,
+  width: number,
+  x0: number,
+  y0: number,
+  x1: number,
+  y1: number
+): number {
+  const stride = (width + 1) * CHANNELS;
+  const topLeft = y0 * stride + x0 * CHANNELS;
+  const topRight = y0 * stride + x1 * CHANNELS;
+  const bottomLeft = y1 * stride + x0 * CHANNELS;
+  const bottomRight = y1 * stride + x1 * CHANNELS;
+
+  const count = (integral[bottomRight + 3] - integral[topRight + 3] - integral[bottomLeft + 3] + integral[topLeft + 3]) >>> 0;
+  if (count === 0) {
+    return -1;
+  }
+  const rSum = (integral[bottomRight] - integral[topRight] - integral[bottomLeft] + integral[topLeft]) >>> 0;
+  const gSum = (integral[bottomRight + 1] - integral[topRight + 1] - integral[bottomLeft + 1] + integral[topLeft + 1]) >>> 0;
+  const bSum = (integral[bottomRight + 2] - integral[topRight + 2] - integral[bottomLeft + 2] + integral[topLeft + 2]) >>> 0;
+  return (Math.round(rSum / count) << 16)
+    | (Math.round(gSum / count) << 8)
+    | Math.round(bSum / count);
+}
@@ -0,0 +1,105 @@
+// 简单的 LRU 缓存
+// 利用 Map 保持插入顺序的特性：每次访问把条目移到末尾，超出容量时淘汰最前面的条目
+
+export interface LruCacheOptions<V> {
+  // 总大小上限（单位由 sizeOf 决定，例如字节），需要同时提供 sizeOf
+  maxSize?: number;
+  // 计算单个条目的大小
+  sizeOf?: (value: V) => number;
+  // 条目在最后一次写入或访问之后的存活时间（毫秒），不设置时不过期
+  ttlMs?: number;
+}
+
+interface CacheEntry<V> {
+  value: V;
+  size: number;
+  expiresAt: number;
+}
+
+export class LruCache<K, V> {
+  // 访问和写入都会刷新过期时间，因此 Map 中的顺序同时也是过期时间的顺序
+  private readonly entries = new Map<K, CacheEntry<V>>();
+  private readonly maxSize: number;
+  private readonly sizeOf: ((value: V) => number) | null;
+  private readonly ttlMs: number;
+  private currentSize = 0;
+
+  constructor(private readonly maxEntries: number, options: LruCacheOptions<V> = {}) {
+    this.maxSize = options.maxSize ?? Infinity;
+    this.sizeOf = options.sizeOf ?? null;
+    this.ttlMs = options.ttlMs ?? Infinity;
+  }
+
+  get size(): number {
+    return this.entries.size;
+  }
+
+  // 所有条目的大小之和，未提供 sizeOf 时为 0
+  get totalSize(): number {
+    return this.currentSize;
+  }
+
+  get(key: K): V | undefined {
+    const entry = this.entries.get(key);
+    if (entry === undefined) {
+      return undefined;
+    }
+    const now = Date.now();
+    if (entry.expiresAt <= now) {
+      this.delete(key);
+      return undefined;
+    }
+    // 标记为最近使用
+    this.entries.delete(key);
+    entry.expiresAt = now + this.ttlMs;
+    this.entries.set(key, entry);
+    return entry.value;
+  }
+
+  has(key: K): boolean {
+    const entry = this.entries.get(key);
+    return entry !== undefined && entry.expiresAt > Date.now();
+  }
+
+  set(key: K, value: V): void {
+    this.delete(key);
+    const size = this.sizeOf ? this.sizeOf(value) : 0;
+    // 单个条目超过总大小上限时不缓存
+    if (size > this.maxSize) {
+      return;
+    }
+    this.entries.set(key, { value, size, expiresAt: Date.now() + this.ttlMs });
+    this.currentSize += size;
+    while (this.entries.size > this.maxEntries || this.currentSize > this.maxSize) {
+      const oldestKey = this.entries.keys().next().value as K;
+      this.delete(oldestKey);
+    }
+  }
+
+  delete(key: K): boolean {
+    const entry = this.entries.get(key);
+    if (entry === undefined) {
+      return false;
+    }
+    this.entries.delete(key);
+    this.currentSize -= entry.size;
+    return true;
+  }
+
+  // 删除所有已过期的条目，返回删除的数量
+  prune(): number {
+    const now = Date.now();
+    let removed = 0;
+    for (const [key, entry] of this.entries) {
+      if (entry.expiresAt > now) break;
+      this.delete(key);
+      removed++;
+    }
+    return removed;
+  }
+
+  clear(): void {
+    this.entries.clear();
+    this.currentSize = 0;
+  }
+}
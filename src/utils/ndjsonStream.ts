@@ -0,0 +1,84 @@
+// NDJSON 流式响应：每行一个 JSON 对象，客户端可以边接收边处理，服务端也不必一次构建完整的响应对象
+import { IndexedPixelGrid } from './pixelGrid';
+
+export const NDJSON_CONTENT_TYPE = 'application/x-ndjson; charset=utf-8';
+
+const encoder = new TextEncoder();
+
+// 序列化为一行 NDJSON
+export function toNdjsonLine(value: unknown): string {
+  return `${JSON.stringify(value)}\n`;
+}
+
+// 客户端是否请求流式响应：表单参数 stream=true，或 Accept 请求头包含 application/x-ndjson
+export function wantsNdjson(request: Request, formData: FormData): boolean {
+  return formData.get('stream') === 'true' || (request.headers.get('accept') || '').includes('application/x-ndjson');
+}
+
+/**
+ * 把逐行生成的 NDJSON 包装成流式响应
+ * 按客户端读取的速度向生成器取下一行（背压）；客户端断开时结束生成器。
+ * 生成过程中出错时输出一行 {"type":"error"} 后结束。
+ */
+export function createNdjsonResponse(lines: AsyncIterable<string> | Iterable<string>, headers: Record<string, string> = {}): Response {
+  const iterator = Symbol.asyncIterator in lines
+    ? (lines as AsyncIterable<string>)[Symbol.asyncIterator]()
+    : (lines as Iterable<string>)[Symbol.iterator]();
+
+  const stream = new ReadableStream<Uint8Array>({
+    async pull(controller) {
+      try {
+        const { value, done } = await iterator.next();
+        if (done) {
+          controller.close();
+        } else {
+          controller.enqueue(encoder.encode(value));
+        }
+      } catch (error) {
+        console.error('流式响应生成错误:', error);
+        controller.enqueue(encoder.encode(toNdjsonLine({
+          type: 'error',
+          error: '流式响应生成失败',
+          details: error instanceof Error ? error.message : '未知错误'
+        })));
+        controller.close();
+      }
+    },
+    async cancel() {
+      await iterator.return?.();
+    }
+  });
+
+  return new Response(stream, {
+    headers: {
+      'Content-Type': NDJSON_CONTENT_TYPE,
+      'Cache-Control': 'no-cache',
+      ...headers
+    }
+  });
+}
+
+/**
+ * 逐行输出网格：{"type":"row", ...fields, "y": 行号, "cells": [...]}
+ * cells 中单元格的格式与 mappedData 相同。每个调色板颜色只序列化一次，拼接字符串时不为单元格创建对象。
+ * @param fields 每行附加的字段（如 granularity）
+ */
+export function* gridRowLines(grid: IndexedPixelGrid, fields: Record<string, unknown> = {}): Generator<string> {
+  const { width, height, indices, palette, external } = grid;
+  const internalCells = palette.map(color => JSON.stringify({ key: color.key, color: color.hex }));
+  const externalCells = palette.map(color => JSON.stringify({ key: color.key, color: color.hex, isExternal: true }));
+  // 去掉结尾的 "}"，之后拼接行号和单元格
+  const prefix = JSON.stringify({ type: 'row', ...fields }).slice(0, -1);
+
+  const cells: string[] = new Array(width);
+  for (let y = 0; y < height; y++) {
+    const rowOffset = y * width;
+    for (let x = 0; x < width; x++) {
+      const cellIndex = rowOffset + x;
+      cells[x] = external && external[cellIndex]
+        ? externalCells[indices[cellIndex]]
+        : internalCells[indices[cellIndex]];
+    }
+    yield `${prefix},"y":${y},"cells":[${cells.join(',')}]}\n`;
+  }
+}
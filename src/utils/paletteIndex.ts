@@ -0,0 +1,141 @@
+// 调色板最近色索引
+// 将RGB空间划分为若干立方体桶，每个桶只保留"可能成为最近色"的候选颜色，
+// 查询时只需扫描所在桶的少量候选，结果与 findClosestPaletteColor 的线性扫描完全一致。
+import { PaletteColor } from './pixelation';
+import { LruCache } from './lruCache';
+
+// 每个通道取高 BUCKET_BITS 位作为桶坐标
+const BUCKET_BITS = 4;
+const BUCKET_SHIFT = 8 - BUCKET_BITS;
+const BUCKETS_PER_AXIS = 1 << BUCKET_BITS;
+const BUCKET_SIZE = 1 << BUCKET_SHIFT;
+const BUCKET_COUNT = BUCKETS_PER_AXIS * BUCKETS_PER_AXIS * BUCKETS_PER_AXIS;
+
+export interface PaletteIndex {
+  palette: PaletteColor[];
+  /**
+   * 查找与给定颜色最接近的调色板颜色下标
+   * 距离相同时返回调色板中靠前的颜色，与线性扫描的结果一致
+   * @returns 调色板下标，调色板为空时返回 -1
+   */
+  nearestIndex(r: number, g: number, b: number): number;
+}
+
+// 点到区间 [lo, hi] 的最小/最大距离分量
+function minAxisDistance(value: number, lo: number, hi: number): number {
+  if (value < lo) return lo - value;
+  if (value > hi) return value - hi;
+  return 0;
+}
+
+function maxAxisDistance(value: number, lo: number, hi: number): number {
+  return Math.max(value - lo, hi - value);
+}
+
+/**
+ * 为调色板构建最近色索引
+ * 桶的候选列表在第一次被查询时才计算，构建本身几乎没有开销
+ * @param palette 调色板颜色数组（构建后不应再修改）
+ */
+export function buildPaletteIndex(palette: PaletteColor[]): PaletteIndex {
+  const size = palette.length;
+  const paletteR = new Int32Array(size);
+  const paletteG = new Int32Array(size);
+  const paletteB = new Int32Array(size);
+  palette.forEach((color, i) => {
+    paletteR[i] = color.rgb.r;
+    paletteG[i] = color.rgb.g;
+    paletteB[i] = color.rgb.b;
+  });
+
+  const buckets: (Uint16Array | undefined)[] = new Array(BUCKET_COUNT);
+  const minDistances = new Float64Array(size);
+
+  // 计算某个桶的候选颜色：到桶内任意点的距离都不可能小于最近上界的颜色被剔除
+  const buildBucket = (bucket: number): Uint16Array => {
+    const rLo = (bucket >> (2 * BUCKET_BITS)) << BUCKET_SHIFT;
+    const gLo = ((bucket >> BUCKET_BITS) & (BUCKETS_PER_AXIS - 1)) << BUCKET_SHIFT;
+    const bLo = (bucket & (BUCKETS_PER_AXIS - 1)) << BUCKET_SHIFT;
+    // 上界取开区间端点，兼容非整数的输入颜色
+    const rHi = rLo + BUCKET_SIZE;
+    const gHi = gLo + BUCKET_SIZE;
+    const bHi = bLo + BUCKET_SIZE;
+
+    let bound = Infinity;
+    for (let i = 0; i < size; i++) {
+      const dMinR = minAxisDistance(paletteR[i], rLo, rHi);
+      const dMinG = minAxisDistance(paletteG[i], gLo, gHi);
+      const dMinB = minAxisDistance(paletteB[i], bLo, bHi);
+      minDistances[i] = dMinR * dMinR + dMinG * dMinG + dMinB * dMinB;
+
+      const dMaxR = maxAxisDistance(paletteR[i], rLo, rHi);
+      const dMaxG = maxAxisDistance(paletteG[i], gLo, gHi);
+      const dMaxB = maxAxisDistance(paletteB[i], bLo, bHi);
+      bound = Math.min(bound, dMaxR * dMaxR + dMaxG * dMaxG + dMaxB * dMaxB);
+    }
+
+    // 保持调色板原有顺序，保证距离相同时的选择与线性扫描一致
+    const candidates: number[] = [];
+    for (let i = 0; i < size; i++) {
+      if (minDistances[i] <= bound) candidates.push(i);
+    }
+    return Uint16Array.from(candidates);
+  };
+
+  // 在候选颜色中查找最近色，candidates 为 null 时扫描整个调色板
+  const scan = (r: number, g: number, b: number, candidates: ArrayLike<number> | null): number => {
+    const count = candidates ? candidates.length : size;
+    let best = -1;
+    let bestDistance = Infinity;
+    for (let k = 0; k < count; k++) {
+      const i = candidates ? candidates[k] : k;
+      const dr = r - paletteR[i];
+      const dg = g - paletteG[i];
+      const db = b - paletteB[i];
+      const distance = dr * dr + dg * dg + db * db;
+      if (distance < bestDistance) {
+        bestDistance = distance;
+        best = i;
+        if (distance === 0) break; // 完全匹配，提前退出
+      }
+    }
+    return best;
+  };
+
+  const nearestIndex = (r: number, g: number, b: number): number => {
+    if (size === 0) return -1;
+    // 超出 0-255 范围的输入不属于任何桶，直接线性扫描
+    if (!(r >= 0 && r < 256 && g >= 0 && g < 256 && b >= 0 && b < 256)) {
+      return scan(r, g, b, null);
+    }
+    const bucket = ((r >> BUCKET_SHIFT) << (2 * BUCKET_BITS)) | ((g >> BUCKET_SHIFT) << BUCKET_BITS) | (b >> BUCKET_SHIFT);
+    let candidates = buckets[bucket];
+    if (!candidates) {
+      candidates = buildBucket(bucket);
+      buckets[bucket] = candidates;
+    }
+    return scan(r, g, b, candidates);
+  };
+
+  return { palette, nearestIndex };
+}
+
+// 以调色板数组本身为键缓存索引，同一个调色板只构建一次
+const paletteIndexCache = new WeakMap<PaletteColor[], PaletteIndex>();
+// 工作线程每次收到的调色板都是结构化克隆出的新数组，因此再按颜色内容缓存最近使用的索引
+// 查询结果只依赖各下标的 RGB 值，内容相同的调色板可以共用同一个索引
+const paletteIndexCacheByContent = new LruCache<string, PaletteIndex>(8);
+
+export function getPaletteIndex(palette: PaletteColor[]): PaletteIndex {
+  let index = paletteIndexCache.get(palette);
+  if (!index) {
+    const contentKey = palette.map(({ rgb }) => `${rgb.r},${rgb.g},${rgb.b}`).join(';');
+    index = paletteIndexCacheByContent.get(contentKey);
+    if (!index) {
+      index = buildPaletteIndex(palette);
+      paletteIndexCacheByContent.set(contentKey, index);
+    }
+    paletteIndexCache.set(palette, index);
+  }
+  return index;
+}
@@ -0,0 +1,84 @@
+// 进程级调色板缓存
+// 默认调色板和预制调色板按 (调色板, 色号系统) 缓存，自定义调色板按内容哈希缓存并按 LRU 淘汰。
+// 返回的调色板数组在请求之间共享，调用方不能修改。
+import { createHash } from 'crypto';
+import { PaletteColor } from './pixelation';
+import { ColorSystem } from './colorSystemUtils';
+import { getDefaultPalette, getAvailablePresetPalettes, parseCustomPalette } from './apiUtils';
+import { LruCache } from './lruCache';
+import { CustomPalette, PresetPalette } from '@/types/paletteTypes';
+import { SERVER_CONFIG } from '../config/serverConfig';
+
+const defaultPalettes = new Map<ColorSystem, PaletteColor[]>();
+const presetPalettes = new Map<string, PaletteColor[]>();
+const customPalettes = new LruCache<string, PaletteColor[]>(SERVER_CONFIG.palette.customPaletteCacheSize);
+let presetPaletteList: PresetPalette[] | null = null;
+
+// 获取预制调色板列表，只在第一次调用时读取 src/assert 目录
+export function getCachedPresetPalettes(): PresetPalette[] {
+  if (!presetPaletteList) {
+    presetPaletteList = getAvailablePresetPalettes();
+  }
+  return presetPaletteList;
+}
+
+// 获取默认调色板（290色）
+export function getCachedDefaultPalette(colorSystem: ColorSystem): PaletteColor[] {
+  let palette = defaultPalettes.get(colorSystem);
+  if (!palette) {
+    palette = getDefaultPalette(colorSystem);
+    defaultPalettes.set(colorSystem, palette);
+  }
+  return palette;
+}
+
+// 获取预制调色板，先按名称查找，找不到再按ID查找（与 parsePresetPalette 一致）
+export function getCachedPresetPalette(paletteNameOrId: string, colorSystem: ColorSystem): PaletteColor[] {
+  const presets = getCachedPresetPalettes();
+  const presetPalette = presets.find(palette => palette.name === paletteNameOrId)
+    || presets.find(palette => palette.id === paletteNameOrId);
+
+  if (!presetPalette) {
+    throw new Error(`预制调色板不存在: ${paletteNameOrId}`);
+  }
+
+  const cacheKey = `${presetPalette.id}|${colorSystem}`;
+  let palette = presetPalettes.get(cacheKey);
+  if (!palette) {
+    palette = parseCustomPalette(presetPalette.data, colorSystem);
+    presetPalettes.set(cacheKey, palette);
+  }
+  return palette;
+}
+
+// 自定义调色板的内容哈希，只包含影响解析结果的字段
+export function getCustomPaletteHash(customPaletteData: CustomPalette): string {
+  return createHash('sha256')
+    .update(JSON.stringify([customPaletteData?.version, customPaletteData?.selectedHexValues]))
+    .digest('hex');
+}
+
+// 已解析调色板的内容哈希（色号和颜色），按数组本身缓存，用于结果缓存的键
+const paletteHashes = new WeakMap<PaletteColor[], string>();
+
+export function getPaletteHash(palette: PaletteColor[]): string {
+  let hash = paletteHashes.get(palette);
+  if (!hash) {
+    hash = createHash('sha256')
+      .update(JSON.stringify(palette.map(color => [color.key, color.hex])))
+      .digest('hex');
+    paletteHashes.set(palette, hash);
+  }
+  return hash;
+}
+
+// 获取自定义调色板，解析失败时抛出与 parseCustomPalette 相同的错误且不缓存
+export function getCachedCustomPalette(customPaletteData: CustomPalette, colorSystem: ColorSystem): PaletteColor[] {
+  const cacheKey = `${getCustomPaletteHash(customPaletteData)}|${colorSystem}`;
+  let palette = customPalettes.get(cacheKey);
+  if (!palette) {
+    palette = parseCustomPalette(customPaletteData, colorSystem);
+    customPalettes.set(cacheKey, palette);
+  }
+  return palette;
+}
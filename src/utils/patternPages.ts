@@ -0,0 +1,194 @@
+// 分页输出图纸：把网格切成若干块，每块绘制为一页（PNG 压缩包或多页 PDF）
+// 每页只绘制一块网格，内存占用与页面大小有关，与整张图纸的尺寸无关
+import { Readable } from 'stream';
+import { createCanvas } from 'canvas';
+import { IndexedPixelGrid } from './pixelGrid';
+import { ZipOutputEntry } from './zipArchive';
+import {
+  PatternCellWindow,
+  PatternLayout,
+  PNG_ENCODE_CONFIG,
+  PatternRenderParams,
+  calculatePatternStats,
+  computePatternLayout,
+  drawPatternBackground,
+  drawPatternGrid,
+  drawPatternStats
+} from './serverImageDownloader';
+
+// 默认每页的单元格数（边长）：150 DPI 下一个单元格约 5mm，30 格约为 A4 纸的宽度
+export const DEFAULT_PAGE_CELLS = 30;
+
+export interface PatternPage {
+  // 页码，从 1 开始
+  number: number;
+  window: PatternCellWindow;
+  title: string;
+}
+
+// 每页的边长取 gridInterval 的整数倍，分隔线和坐标不会落在页面边缘之外
+function pageBlockSize(pageCells: number, gridInterval: number): number {
+  if (gridInterval > 0 && gridInterval <= pageCells) {
+    return Math.floor(pageCells / gridInterval) * gridInterval;
+  }
+  return pageCells;
+}
+
+/**
+ * 按行优先顺序规划分页
+ * 每页标题注明页码和所覆盖的列、行范围（从 1 开始，与坐标轴一致）
+ */
+export function planPatternPages(grid: IndexedPixelGrid, pageCells: number, gridInterval: number, title?: string): PatternPage[] {
+  const blockSize = pageBlockSize(pageCells, gridInterval);
+  const pageColumns = Math.ceil(grid.width / blockSize);
+  const pageRows = Math.ceil(grid.height / blockSize);
+  const total = pageColumns * pageRows;
+
+  const pages: PatternPage[] = [];
+  for (let pageRow = 0; pageRow < pageRows; pageRow++) {
+    for (let pageColumn = 0; pageColumn < pageColumns; pageColumn++) {
+      const window = {
+        x0: pageColumn * blockSize,
+        y0: pageRow * blockSize,
+        x1: Math.min(grid.width, (pageColumn + 1) * blockSize),
+        y1: Math.min(grid.height, (pageRow + 1) * blockSize)
+      };
+      const number = pages.length + 1;
+      pages.push({
+        number,
+        window,
+        title: `${title ? `${title} · ` : ''}第 ${number}/${total} 页 · 列 ${window.x0 + 1}-${window.x1} · 行 ${window.y0 + 1}-${window.y1}`
+      });
+    }
+  }
+  return pages;
+}
+
+// 所有网格页使用同一个完整块大小的布局，边缘不满一块的页面保持相同的页面尺寸和单元格大小
+function pageLayout(params: PatternRenderParams, pages: PatternPage[]): PatternLayout {
+  const { x1, y1 } = pages[0].window;
+  return computePatternLayout(x1, y1, null, { ...params, title: pages[0].title });
+}
+
+// 用量统计单独成页，宽度与网格页相同
+function statsLayout(params: PatternRenderParams, pageColumns: number, statsItemCount: number): PatternLayout {
+  return computePatternLayout(pageColumns, 0, statsItemCount, {
+    ...params,
+    options: { ...params.options, showCoordinates: false }
+  });
+}
+
+// 分页 PNG 的文件名：page-001.png …，页数超过 999 时按页数补齐位数
+function pageFileName(pages: PatternPage[], page: PatternPage): string {
+  const digits = Math.max(3, String(pages.length).length);
+  return `page-${String(page.number).padStart(digits, '0')}.png`;
+}
+
+// 单独绘制统计页
+function renderStatsPage(grid: IndexedPixelGrid, params: PatternRenderParams, pages: PatternPage[]): ZipOutputEntry {
+  const { title, options } = params;
+  const { colorCounts, totalBeadCount } = calculatePatternStats(grid, options.showTransparentLabels);
+  const stats = statsLayout(params, pages[0].window.x1, Object.keys(colorCounts).length);
+  const canvas = createCanvas(stats.width, stats.height);
+  const ctx = canvas.getContext('2d');
+  drawPatternBackground(ctx, stats, title);
+  drawPatternStats(ctx, stats, colorCounts, totalBeadCount, stats.gridTop + 16 * stats.dpiScale);
+  return { name: 'stats.png', data: canvas.toBuffer('image/png', PNG_ENCODE_CONFIG) };
+}
+
+// 每个网格页的像素数（所有网格页尺寸相同），用于估算渲染开销
+export function estimatePatternPagePixels(grid: IndexedPixelGrid, params: PatternRenderParams, pageCells = DEFAULT_PAGE_CELLS): number {
+  const layout = pageLayout(params, planPatternPages(grid, pageCells, params.options.gridInterval, params.title));
+  return layout.width * layout.height;
+}
+
+// 分页 PNG 的文件数：网格页，加上 includeStats 时的统计页
+export function countPatternPageFiles(grid: IndexedPixelGrid, params: PatternRenderParams, pageCells = DEFAULT_PAGE_CELLS): number {
+  const pages = planPatternPages(grid, pageCells, params.options.gridInterval, params.title);
+  return pages.length + (params.options.includeStats ? 1 : 0);
+}
+
+/**
+ * 绘制分页 PNG 中的第 fileIndex 个文件（从 0 开始，网格页之后为统计页）
+ * 每次调用使用新的画布，各页可以分别交给工作线程绘制
+ */
+export function renderPatternPageFile(
+  grid: IndexedPixelGrid,
+  params: PatternRenderParams,
+  pageCells: number,
+  fileIndex: number
+): ZipOutputEntry {
+  const pages = planPatternPages(grid, pageCells, params.options.gridInterval, params.title);
+  const page = pages[fileIndex];
+  if (!page) {
+    return renderStatsPage(grid, params, pages);
+  }
+  const layout = pageLayout(params, pages);
+  const canvas = createCanvas(layout.width, layout.height);
+  const ctx = canvas.getContext('2d');
+  drawPatternBackground(ctx, layout, page.title);
+  drawPatternGrid(ctx, grid, layout, page.window, params.options);
+  return { name: pageFileName(pages, page), data: canvas.toBuffer('image/png', PNG_ENCODE_CONFIG) };
+}
+
+/**
+ * 逐页绘制 PNG，每次产出一页（page-001.png …，统计页为 stats.png）
+ * 网格页共用一块画布，统计页在网格页全部输出后再绘制
+ */
+export async function* renderPatternPages(
+  grid: IndexedPixelGrid,
+  params: PatternRenderParams,
+  pageCells = DEFAULT_PAGE_CELLS
+): AsyncGenerator<ZipOutputEntry> {
+  const { title, options } = params;
+  const pages = planPatternPages(grid, pageCells, options.gridInterval, title);
+  const layout = pageLayout(params, pages);
+
+  const canvas = createCanvas(layout.width, layout.height);
+  const ctx = canvas.getContext('2d');
+  for (const page of pages) {
+    drawPatternBackground(ctx, layout, page.title);
+    drawPatternGrid(ctx, grid, layout, page.window, options);
+    yield { name: pageFileName(pages, page), data: canvas.toBuffer('image/png', PNG_ENCODE_CONFIG) };
+  }
+
+  if (options.includeStats) {
+    yield renderStatsPage(grid, params, pages);
+  }
+}
+
+/**
+ * 绘制多页 PDF，每块网格一页，统计单独一页
+ * PDF 为矢量内容，页面尺寸按一个单元格 5mm（与 150 DPI 下的 PNG 相同的物理尺寸）换算为点
+ */
+export function renderPatternPdf(
+  grid: IndexedPixelGrid,
+  params: PatternRenderParams,
+  pageCells = DEFAULT_PAGE_CELLS
+): Readable {
+  const { title, options } = params;
+  const pages = planPatternPages(grid, pageCells, options.gridInterval, title);
+  const layout = pageLayout(params, pages);
+  // 布局以 150 DPI 的像素为基准，1 点 = 1/72 英寸
+  const pointScale = 72 / (150 * layout.dpiScale);
+
+  const canvas = createCanvas(layout.width * pointScale, layout.height * pointScale, 'pdf');
+  const ctx = canvas.getContext('2d');
+  pages.forEach((page, index) => {
+    if (index > 0) ctx.addPage(layout.width * pointScale, layout.height * pointScale);
+    ctx.setTransform(pointScale, 0, 0, pointScale, 0, 0);
+    drawPatternBackground(ctx, layout, page.title);
+    drawPatternGrid(ctx, grid, layout, page.window, options);
+  });
+
+  if (options.includeStats) {
+    const { colorCounts, totalBeadCount } = calculatePatternStats(grid, options.showTransparentLabels);
+    const stats = statsLayout(params, pages[0].window.x1, Object.keys(colorCounts).length);
+    ctx.addPage(stats.width * pointScale, stats.height * pointScale);
+    ctx.setTransform(pointScale, 0, 0, pointScale, 0, 0);
+    drawPatternBackground(ctx, stats, title);
+    drawPatternStats(ctx, stats, colorCounts, totalBeadCount, stats.gridTop + 16 * stats.dpiScale);
+  }
+
+  return canvas.createPDFStream();
+}
@@ -0,0 +1,82 @@
+// 图纸存储
+// /api/convert 传入 storePattern=true 时把生成的网格保存在服务端并返回 patternId，
+// /api/download 只需提交 patternId（以及少量修改），不必把整个 pixelData 再传回服务端。
+// 按字节数做 LRU 淘汰，条目在最后一次使用之后超过 TTL 即被删除。
+import { randomUUID } from 'crypto';
+import { IndexedPixelGrid } from './pixelGrid';
+import { ColorSystem } from './pixelation';
+import { LruCache } from './lruCache';
+import { SERVER_CONFIG } from '../config/serverConfig';
+
+export interface StoredPattern {
+  // 网格在请求之间共享（也可能与转换结果缓存共享），不能修改
+  grid: IndexedPixelGrid;
+  colorSystem: ColorSystem;
+}
+
+export interface PatternStoreStats {
+  enabled: boolean;
+  entries: number;
+  bytes: number;
+  maxBytes: number;
+  ttlSeconds: number;
+  hits: number;
+  misses: number;
+}
+
+// 调色板表每项的估算字节数
+const PALETTE_ENTRY_BYTES = 64;
+
+const { maxMB, ttlSeconds } = SERVER_CONFIG.patternStore;
+const maxBytes = maxMB * 1024 * 1024;
+const ttlMs = ttlSeconds * 1000;
+const counters = { hits: 0, misses: 0 };
+
+const patterns = new LruCache<string, StoredPattern>(Infinity, {
+  maxSize: maxBytes,
+  sizeOf: ({ grid }) => grid.indices.byteLength
+    + (grid.external ? grid.external.byteLength : 0)
+    + grid.palette.length * PALETTE_ENTRY_BYTES,
+  ttlMs
+});
+
+// 空闲时也按时释放过期的图纸，不阻止进程退出
+if (maxBytes > 0) {
+  setInterval(() => patterns.prune(), ttlMs).unref();
+}
+
+export function isPatternStoreEnabled(): boolean {
+  return maxBytes > 0;
+}
+
+// 保存图纸并返回 patternId，未启用存储时返回 null
+export function storePattern(grid: IndexedPixelGrid, colorSystem: ColorSystem): string | null {
+  if (!isPatternStoreEnabled()) {
+    return null;
+  }
+  const patternId = randomUUID();
+  patterns.set(patternId, { grid, colorSystem });
+  return patternId;
+}
+
+// 查询图纸，不存在或已过期时返回 null
+export function getStoredPattern(patternId: string): StoredPattern | null {
+  const pattern = patterns.get(patternId);
+  if (pattern) {
+    counters.hits++;
+    return pattern;
+  }
+  counters.misses++;
+  return null;
+}
+
+export function getPatternStoreStats(): PatternStoreStats {
+  return {
+    enabled: isPatternStoreEnabled(),
+    entries: patterns.size,
+    bytes: patterns.totalSize,
+    maxBytes,
+    ttlSeconds,
+    ...counters
+  };
+}
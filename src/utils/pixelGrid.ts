@@ -0,0 +1,190 @@
+// 紧凑的像素网格表示
+// 每个单元格只保存一个调色板下标（Uint16Array），颜色信息统一放在共享的调色板表中。
+// 转换、统计、渲染等阶段都在这个结构上进行，只在 JSON 输入/输出时才与 MappedPixel[][] 互相转换。
+import { PaletteColor, MappedPixel, hexToRgb } from './pixelation';
+import { ColorCount } from '@/types/paletteTypes';
+
+export interface IndexedPixelGrid {
+  // 网格横向数量
+  width: number;
+  // 网格纵向数量
+  height: number;
+  // 每个单元格的调色板下标，按行优先存储，长度为 width * height
+  indices: Uint16Array;
+  // 单元格共享的调色板表
+  palette: PaletteColor[];
+  // 外部背景标记，1 表示该单元格为外部背景；没有外部背景时为 null
+  external: Uint8Array | null;
+}
+
+// 将网格转换为 MappedPixel[][]，同一颜色的单元格共享同一个对象
+export function indexedGridToMappedData(grid: IndexedPixelGrid): MappedPixel[][] {
+  const { width, height, indices, palette, external } = grid;
+  const internalPixels: MappedPixel[] = palette.map(color => ({ key: color.key, color: color.hex }));
+  const externalPixels: MappedPixel[] = palette.map(color => ({ key: color.key, color: color.hex, isExternal: true }));
+
+  const mappedData: MappedPixel[][] = new Array(height);
+  for (let j = 0; j < height; j++) {
+    const row: MappedPixel[] = new Array(width);
+    const rowOffset = j * width;
+    for (let i = 0; i < width; i++) {
+      const cellIndex = rowOffset + i;
+      row[i] = external && external[cellIndex]
+        ? externalPixels[indices[cellIndex]]
+        : internalPixels[indices[cellIndex]];
+    }
+    mappedData[j] = row;
+  }
+  return mappedData;
+}
+
+/**
+ * 将客户端提交的 MappedPixel[][] 转换为网格
+ * 调色板表由数据中出现的 (色号, 颜色) 组合构成；为 null 的单元格视为外部背景
+ * width / height 不是正整数，或与 mappedData 的行数、每行的长度不一致时抛出异常（在分配网格之前检查）
+ */
+export function indexedGridFromMappedData(mappedData: MappedPixel[][], width: number, height: number): IndexedPixelGrid {
+  if (!Number.isInteger(width) || !Number.isInteger(height) || width <= 0 || height <= 0) {
+    throw new Error('width 和 height 必须是正整数');
+  }
+  if (!Array.isArray(mappedData) || mappedData.length !== height) {
+    throw new Error(`mappedData 应为 ${height} 行，实际为 ${Array.isArray(mappedData) ? mappedData.length : 0} 行`);
+  }
+  for (let j = 0; j < height; j++) {
+    if (!Array.isArray(mappedData[j]) || mappedData[j].length !== width) {
+      throw new Error(`mappedData 第 ${j + 1} 行应为 ${width} 个单元格`);
+    }
+  }
+
+  const indices = new Uint16Array(width * height);
+  const palette: PaletteColor[] = [];
+  const paletteLookup = new Map<string, number>();
+  let external: Uint8Array | null = null;
+
+  for (let j = 0; j < height; j++) {
+    const row = mappedData[j];
+    for (let i = 0; i < width; i++) {
+      const cellIndex = j * width + i;
+      const cell = row[i];
+      if (!cell || cell.isExternal) {
+        if (!external) external = new Uint8Array(width * height);
+        external[cellIndex] = 1;
+        if (!cell) continue;
+      }
+
+      const hex = cell.color || '#FFFFFF';
+      const lookupKey = `${cell.key}\u0000${hex}`;
+      let paletteIndex = paletteLookup.get(lookupKey);
+      if (paletteIndex === undefined) {
+        paletteIndex = palette.length;
+        paletteLookup.set(lookupKey, paletteIndex);
+        palette.push({ key: cell.key, hex, rgb: hexToRgb(hex) || { r: 0, g: 0, b: 0 } });
+      }
+      indices[cellIndex] = paletteIndex;
+    }
+  }
+
+  return { width, height, indices, palette, external };
+}
+
+// 统计网格中各色号的数量，忽略外部背景单元格
+// 结果的键顺序和颜色与按单元格顺序遍历 MappedPixel[][] 的统计结果一致
+export function calculateGridColorCounts(grid: IndexedPixelGrid): ColorCount {
+  const { indices, palette, external } = grid;
+  const countsByIndex = new Uint32Array(palette.length);
+  const firstSeenOrder: number[] = [];
+
+  for (let cellIndex = 0; cellIndex < indices.length; cellIndex++) {
+    if (external && external[cellIndex]) continue;
+    const paletteIndex = indices[cellIndex];
+    if (countsByIndex[paletteIndex]++ === 0) {
+      firstSeenOrder.push(paletteIndex);
+    }
+  }
+
+  // 不同调色板项可能共用同一个色号（例如无法映射的 '?'），按色号合并
+  const colorCounts: ColorCount = {};
+  for (const paletteIndex of firstSeenOrder) {
+    const { key, hex } = palette[paletteIndex];
+    if (colorCounts[key]) {
+      colorCounts[key].count += countsByIndex[paletteIndex];
+    } else {
+      colorCounts[key] = { count: countsByIndex[paletteIndex], color: hex };
+    }
+  }
+  return colorCounts;
+}
+
+// 对单个单元格的修改，x 为列、y 为行（从 0 开始）
+export interface GridCellEdit {
+  x: number;
+  y: number;
+  // 新的色号，省略时保持原来的颜色
+  key?: string;
+  // 新的颜色，省略时使用图纸中同一色号的颜色
+  color?: string;
+  // 是否为外部背景，省略时为 false
+  isExternal?: boolean;
+}
+
+/**
+ * 在网格副本上应用单元格修改，不改变原网格
+ * 修改格式错误时抛出异常
+ */
+export function applyGridEdits(grid: IndexedPixelGrid, edits: GridCellEdit[]): IndexedPixelGrid {
+  const { width, height } = grid;
+  const indices = grid.indices.slice();
+  const palette = grid.palette.slice();
+  let external = grid.external ? grid.external.slice() : null;
+
+  const paletteLookup = new Map<string, number>();
+  const keyLookup = new Map<string, number>();
+  palette.forEach((color, paletteIndex) => {
+    paletteLookup.set(`${color.key}\u0000${color.hex}`, paletteIndex);
+    if (!keyLookup.has(color.key)) keyLookup.set(color.key, paletteIndex);
+  });
+
+  edits.forEach((edit, editIndex) => {
+    const { x, y, key, color, isExternal } = (edit || {}) as GridCellEdit;
+    if (!Number.isInteger(x) || !Number.isInteger(y) || x < 0 || y < 0 || x >= width || y >= height) {
+      throw new Error(`第 ${editIndex + 1} 项修改的坐标 (${x}, ${y}) 超出图纸范围 ${width}x${height}`);
+    }
+    const cellIndex = y * width + x;
+
+    if (key !== undefined) {
+      if (typeof key !== 'string' || key === '') {
+        throw new Error(`第 ${editIndex + 1} 项修改的色号无效`);
+      }
+      let paletteIndex: number | undefined;
+      if (color === undefined) {
+        paletteIndex = keyLookup.get(key);
+        if (paletteIndex === undefined) {
+          throw new Error(`色号 ${key} 不在图纸中，需要同时提供 color`);
+        }
+      } else {
+        const rgb = typeof color === 'string' ? hexToRgb(color) : null;
+        if (!rgb) {
+          throw new Error(`第 ${editIndex + 1} 项修改的颜色 ${color} 不是有效的十六进制颜色`);
+        }
+        const lookupKey = `${key}\u0000${color}`;
+        paletteIndex = paletteLookup.get(lookupKey);
+        if (paletteIndex === undefined) {
+          paletteIndex = palette.length;
+          palette.push({ key, hex: color, rgb });
+          paletteLookup.set(lookupKey, paletteIndex);
+          if (!keyLookup.has(key)) keyLookup.set(key, paletteIndex);
+        }
+      }
+      indices[cellIndex] = paletteIndex;
+    }
+
+    if (isExternal) {
+      if (!external) external = new Uint8Array(width * height);
+      external[cellIndex] = 1;
+    } else if (external) {
+      external[cellIndex] = 0;
+    }
+  });
+
+  return { width, height, indices, palette, external };
+}
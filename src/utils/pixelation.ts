@@ -1,3 +1,8 @@
+import { getPaletteIndex } from './paletteIndex';
+import { IndexedPixelGrid, indexedGridToMappedData } from './pixelGrid';
+import { PackedColorHistogram } from './colorHistogram';
+import { getIntegralAverageColor, INTEGRAL_MAX_REGION_PIXELS } from './integralImage';
+
 // 定义像素化模式
 export enum PixelationMode {
   Dominant = 'dominant', // 卡通模式（主色）
@@ -8,7 +13,7 @@ export enum PixelationMode {
 export type ColorSystem = 'MARD' | 'COCO' | '漫漫' | '盼盼' | '咪小窝';
 
 // 兼容Node.js Canvas的ImageData类型
-interface CompatibleImageData {
+export interface CompatibleImageData {
   data: Uint8ClampedArray;
   width: number;
   height: number;
@@ -86,6 +91,9 @@ export function findClosestPaletteColor(
 
 // --- 核心像素化计算逻辑 ---
 
+// 主导色模式使用的直方图，所有单元格共用同一张表（每个工作线程有各自的模块实例）
+const dominantHistogram = new PackedColorHistogram();
+
 /**
  * 计算图像指定区域的代表色（根据所选模式）
  * @param imageData 包含像素数据的 ImageData 对象
@@ -94,7 +102,7 @@ export function findClosestPaletteColor(
  * @param width 区域宽度
  * @param height 区域高度
  * @param mode 计算模式 ('dominant' 或 'average')
- * @returns 代表色的 RGB 对象，或 null（如果区域无效或全透明）
+ * @returns 打包为 (r << 16) | (g << 8) | b 的代表色，或 -1（如果区域无效或全透明）
  */
 function calculateCellRepresentativeColor(
     imageData: CompatibleImageData,
@@ -103,14 +111,16 @@ function calculateCellRepresentativeColor(
     width: number,
     height: number,
     mode: PixelationMode
-): RgbColor | null {
+): number {
     const data = imageData.data;
     const imgWidth = imageData.width;
     let rSum = 0, gSum = 0, bSum = 0;
     let pixelCount = 0;
-    const colorCountsInCell: { [key: string]: number } = {};
-    let dominantColorRgb: RgbColor | null = null;
+    let dominantColor = 0;
     let maxCount = 0;
+    if (mode !== PixelationMode.Average) {
+        dominantHistogram.reset();
+    }
 
     const endX = startX + width;
     const endY = startY + height;
@@ -132,33 +142,162 @@ function calculateCellRepresentativeColor(
                 gSum += g;
                 bSum += b;
             } else { // Dominant mode
-                const colorKey = `${r},${g},${b}`;
-                colorCountsInCell[colorKey] = (colorCountsInCell[colorKey] || 0) + 1;
-                if (colorCountsInCell[colorKey] > maxCount) {
-                    maxCount = colorCountsInCell[colorKey];
-                    dominantColorRgb = { r, g, b };
+                // 计数严格大于当前最大值时才更新，计数相同时保留先达到该计数的颜色
+                const color = (r << 16) | (g << 8) | b;
+                const count = dominantHistogram.increment(color);
+                if (count > maxCount) {
+                    maxCount = count;
+                    dominantColor = color;
                 }
             }
         }
     }
 
     if (pixelCount === 0) {
-        return null; // 区域内没有不透明像素
+        return -1; // 区域内没有不透明像素
     }
 
     if (mode === PixelationMode.Average) {
-        return {
-            r: Math.round(rSum / pixelCount),
-            g: Math.round(gSum / pixelCount),
-            b: Math.round(bSum / pixelCount),
-        };
+        return (Math.round(rSum / pixelCount) << 16)
+            | (Math.round(gSum / pixelCount) << 8)
+            | Math.round(bSum / pixelCount);
     } else { // Dominant mode
-        return dominantColorRgb; // 可能为 null 如果只有一个透明像素
+        return dominantColor;
     }
 }
 
 /**
- * 根据原始图像数据、网格尺寸、调色板和模式计算像素化网格数据。
+ * 根据图像像素数据、网格尺寸、调色板和模式计算紧凑的像素化网格。
+ * @param imageData 原始图像的像素数据
+ * @param N 网格横向数量
+ * @param M 网格纵向数量
+ * @param palette 当前使用的调色板
+ * @param mode 像素化模式 (Dominant/Average)
+ * @param t1FallbackColor 空白或全透明单元格使用的备用色
+ * @param integral 图像的积分图（见 integralImage.ts），提供时平均色模式直接查表计算
+ * @returns 调色板下标形式的网格，调色板表为 palette（备用色不在其中时追加在末尾）
+ */
+export function pixelateImageData(
+    imageData: CompatibleImageData,
+    N: number,
+    M: number,
+    palette: PaletteColor[],
+    mode: PixelationMode,
+    t1FallbackColor: PaletteColor,
+    integral: Uint32Array | null = null
+): IndexedPixelGrid {
+    const grid = createFallbackGrid(N, M, palette, t1FallbackColor);
+    pixelateRowBand(imageData, N, M, 0, M, palette, mode, grid.indices[0], grid.indices, integral);
+    return grid;
+}
+
+/**
+ * 计算第 rowStart 行到第 rowEnd 行（不含）单元格的调色板下标。
+ * 每个单元格只依赖自己覆盖的原图区域，因此把网格按行切成多段分别计算，结果与整体计算完全一致。
+ * @param imageData 原始图像的像素数据
+ * @param N 网格横向数量
+ * @param M 网格纵向数量
+ * @param rowStart 起始行（含）
+ * @param rowEnd 结束行（不含）
+ * @param palette 当前使用的调色板
+ * @param mode 像素化模式 (Dominant/Average)
+ * @param fallbackIndex 空白或全透明单元格使用的调色板下标
+ * @param indices 输出数组，第 rowStart 行写在下标 0 处，长度至少为 (rowEnd - rowStart) * N
+ * @param integral 图像的积分图，提供时平均色模式每个单元格只需 O(1) 查表，结果与逐像素累加一致
+ */
+export function pixelateRowBand(
+    imageData: CompatibleImageData,
+    N: number,
+    M: number,
+    rowStart: number,
+    rowEnd: number,
+    palette: PaletteColor[],
+    mode: PixelationMode,
+    fallbackIndex: number,
+    indices: Uint16Array,
+    integral: Uint32Array | null = null
+): void {
+    const imgWidth = imageData.width;
+    const imgHeight = imageData.height;
+    const cellWidthOriginal = imgWidth / N;
+    const cellHeightOriginal = imgHeight / M;
+    // 同一调色板的最近色索引只构建一次，避免每个单元格都线性扫描整个调色板
+    const paletteIndex = palette.length > 0 ? getPaletteIndex(palette) : null;
+    // 单元格过大（只有极少的单元格覆盖整张大图时）积分图的取模查询不再精确，改为逐像素累加
+    const maxCellPixels = (Math.ceil(cellWidthOriginal) + 1) * (Math.ceil(cellHeightOriginal) + 1);
+    const useIntegral = integral !== null && mode === PixelationMode.Average && maxCellPixels <= INTEGRAL_MAX_REGION_PIXELS;
+
+    for (let j = rowStart; j < rowEnd; j++) {
+        const rowOffset = (j - rowStart) * N;
+        for (let i = 0; i < N; i++) {
+            const startXOriginal = Math.floor(i * cellWidthOriginal);
+            const startYOriginal = Math.floor(j * cellHeightOriginal);
+            // 计算精确的单元格结束位置，避免超出图像边界
+            const endXOriginal = Math.min(imgWidth, Math.ceil((i + 1) * cellWidthOriginal));
+            const endYOriginal = Math.min(imgHeight, Math.ceil((j + 1) * cellHeightOriginal));
+            // 计算实际的单元格宽高
+            const currentCellWidth = Math.max(1, endXOriginal - startXOriginal);
+            const currentCellHeight = Math.max(1, endYOriginal - startYOriginal);
+
+            // 使用提取的函数计算代表色（平均色模式有积分图时直接查表）
+            const representativeColor = useIntegral
+                ? getIntegralAverageColor(
+                    integral!,
+                    imgWidth,
+                    startXOriginal,
+                    startYOriginal,
+                    startXOriginal + currentCellWidth,
+                    startYOriginal + currentCellHeight
+                )
+                : calculateCellRepresentativeColor(
+                    imageData,
+                    startXOriginal,
+                    startYOriginal,
+                    currentCellWidth,
+                    currentCellHeight,
+                    mode
+                );
+
+            // 如果单元格为空或全透明（或调色板为空），使用备用色
+            indices[rowOffset + i] = representativeColor >= 0 && paletteIndex
+                ? paletteIndex.nearestIndex(representativeColor >> 16, (representativeColor >> 8) & 0xff, representativeColor & 0xff)
+                : fallbackIndex;
+        }
+    }
+}
+
+/**
+ * 把网格的 M 行尽量均匀地切成 bandCount 段，用于 pixelateRowBand 分段计算
+ * @returns 每段的 [rowStart, rowEnd)
+ */
+export function splitRowBands(M: number, bandCount: number): Array<[number, number]> {
+    const count = Math.max(1, Math.min(bandCount, M));
+    const bands: Array<[number, number]> = [];
+    for (let band = 0; band < count; band++) {
+        bands.push([Math.floor(band * M / count), Math.floor((band + 1) * M / count)]);
+    }
+    return bands;
+}
+
+// 创建全部填充为备用色的网格，备用色的调色板下标即 indices[0]
+export function createFallbackGrid(N: number, M: number, palette: PaletteColor[], t1FallbackColor: PaletteColor): IndexedPixelGrid {
+    let gridPalette = palette;
+    let fallbackIndex = palette.indexOf(t1FallbackColor);
+    if (fallbackIndex === -1) {
+        gridPalette = [...palette, t1FallbackColor];
+        fallbackIndex = palette.length;
+    }
+    return {
+        width: N,
+        height: M,
+        indices: new Uint16Array(N * M).fill(fallbackIndex),
+        palette: gridPalette,
+        external: null
+    };
+}
+
+/**
+ * 根据原始图像的 Canvas 上下文计算紧凑的像素化网格。
  * @param originalCtx 原始图像的 Canvas 2D Context
  * @param imgWidth 原始图像宽度
  * @param imgHeight 原始图像高度
@@ -167,9 +306,9 @@ function calculateCellRepresentativeColor(
  * @param palette 当前使用的调色板
  * @param mode 像素化模式 (Dominant/Average)
  * @param t1FallbackColor T1 或其他备用颜色数据
- * @returns 计算后的 MappedPixel 网格数据
+ * @returns 调色板下标形式的网格
  */
-export function calculatePixelGrid(
+export function calculateIndexedPixelGrid(
     originalCtx: CompatibleContext,
     imgWidth: number,
     imgHeight: number,
@@ -177,59 +316,44 @@ export function calculatePixelGrid(
     M: number,
     palette: PaletteColor[],
     mode: PixelationMode,
-    t1FallbackColor: PaletteColor // 传入备用色
-): MappedPixel[][] {
+    t1FallbackColor: PaletteColor
+): IndexedPixelGrid {
     console.log(`Calculating pixel grid with mode: ${mode}`);
-    const mappedData: MappedPixel[][] = Array(M).fill(null).map(() => Array(N).fill({ key: t1FallbackColor.key, color: t1FallbackColor.hex }));
-    const cellWidthOriginal = imgWidth / N;
-    const cellHeightOriginal = imgHeight / M;
 
     let fullImageData: CompatibleImageData | null = null;
     try {
         fullImageData = originalCtx.getImageData(0, 0, imgWidth, imgHeight);
     } catch (e) {
         console.error("Failed to get full image data:", e);
-        // 如果无法获取图像数据，返回一个空的或默认的网格
-        return mappedData;
     }
 
     if (!fullImageData) {
         console.error("No image data available");
-        return mappedData;
+        // 如果无法获取图像数据，返回一个填充备用色的网格
+        return createFallbackGrid(N, M, palette, t1FallbackColor);
     }
 
-    for (let j = 0; j < M; j++) {
-        for (let i = 0; i < N; i++) {
-            const startXOriginal = Math.floor(i * cellWidthOriginal);
-            const startYOriginal = Math.floor(j * cellHeightOriginal);
-            // 计算精确的单元格结束位置，避免超出图像边界
-            const endXOriginal = Math.min(imgWidth, Math.ceil((i + 1) * cellWidthOriginal));
-            const endYOriginal = Math.min(imgHeight, Math.ceil((j + 1) * cellHeightOriginal));
-            // 计算实际的单元格宽高
-            const currentCellWidth = Math.max(1, endXOriginal - startXOriginal);
-            const currentCellHeight = Math.max(1, endYOriginal - startYOriginal);
-
-            // 使用提取的函数计算代表色
-            const representativeRgb = calculateCellRepresentativeColor(
-                fullImageData, // 现在已经确保不为null
-                startXOriginal,
-                startYOriginal,
-                currentCellWidth,
-                currentCellHeight,
-                mode
-            );
-
-            let finalCellColorData: MappedPixel;
-            if (representativeRgb) {
-                const closestBead = findClosestPaletteColor(representativeRgb, palette);
-                finalCellColorData = { key: closestBead.key, color: closestBead.hex };
-            } else {
-                // 如果单元格为空或全透明，使用备用色
-                finalCellColorData = { key: t1FallbackColor.key, color: t1FallbackColor.hex };
-            }
-            mappedData[j][i] = finalCellColorData;
-        }
-    }
+    const grid = pixelateImageData(fullImageData, N, M, palette, mode, t1FallbackColor);
     console.log(`Pixel grid calculation complete for mode: ${mode}`);
-    return mappedData;
-}
\ No newline at end of file
+    return grid;
+}
+
+/**
+ * 根据原始图像数据、网格尺寸、调色板和模式计算像素化网格数据。
+ * 兼容旧接口，内部基于 calculateIndexedPixelGrid 计算后再展开为 MappedPixel[][]
+ * @returns 计算后的 MappedPixel 网格数据
+ */
+export function calculatePixelGrid(
+    originalCtx: CompatibleContext,
+    imgWidth: number,
+    imgHeight: number,
+    N: number,
+    M: number,
+    palette: PaletteColor[],
+    mode: PixelationMode,
+    t1FallbackColor: PaletteColor // 传入备用色
+): MappedPixel[][] {
+    return indexedGridToMappedData(
+        calculateIndexedPixelGrid(originalCtx, imgWidth, imgHeight, N, M, palette, mode, t1FallbackColor)
+    );
+}
@@ -0,0 +1,154 @@
+// /api/download 渲染结果缓存
+// 以网格内容哈希和规范化后的下载参数为键，缓存编码后的输出（PNG / SVG / ZIP / PDF），按字节数做 LRU 淘汰。
+// 键只由输入决定，同时用作 ETag：客户端带上 If-None-Match 重新下载同一张图纸时，不必渲染也不必传输。
+import { createHash } from 'crypto';
+import { IndexedPixelGrid } from './pixelGrid';
+import { LruCache } from './lruCache';
+import { PNG_ENCODE_CONFIG, PatternRenderParams } from './serverImageDownloader';
+import { DownloadOutput } from '../types/downloadTypes';
+import { SERVER_CONFIG } from '../config/serverConfig';
+
+// 渲染结果版本，绘制方式变化时递增，使旧的缓存和客户端保存的 ETag 失效
+// 2：PDF 中同一行连续的同色单元格合并为一个矩形
+const RENDER_VERSION = 2;
+
+export type RenderCacheStatus = 'hit' | 'miss' | 'disabled';
+
+export interface RenderCacheStats {
+  enabled: boolean;
+  entries: number;
+  bytes: number;
+  maxBytes: number;
+  hits: number;
+  misses: number;
+  // 通过 If-None-Match 返回 304 的次数
+  notModified: number;
+}
+
+const maxBytes = SERVER_CONFIG.download.cacheMB * 1024 * 1024;
+const counters = { hits: 0, misses: 0, notModified: 0 };
+
+const renders = new LruCache<string, Buffer>(Infinity, {
+  maxSize: maxBytes,
+  sizeOf: data => data.length
+});
+
+// 保存的图纸在多次下载之间是同一个网格对象，哈希只计算一次
+const gridHashes = new WeakMap<IndexedPixelGrid, string>();
+
+export function isRenderCacheEnabled(): boolean {
+  return maxBytes > 0;
+}
+
+// 网格内容哈希：尺寸、调色板表、下标数组和外部背景标记
+export function hashPatternGrid(grid: IndexedPixelGrid): string {
+  let gridHash = gridHashes.get(grid);
+  if (!gridHash) {
+    const { width, height, indices, palette, external } = grid;
+    const hash = createHash('sha256')
+      .update(JSON.stringify([width, height, palette.map(color => [color.key, color.hex]), external !== null]))
+      .update(new Uint8Array(indices.buffer, indices.byteOffset, indices.byteLength));
+    if (external) {
+      hash.update(external);
+    }
+    gridHash = hash.digest('hex');
+    gridHashes.set(grid, gridHash);
+  }
+  return gridHash;
+}
+
+/**
+ * 计算缓存键（同时作为 ETag）
+ * 只包含影响输出的参数，按渲染时的实际取值规范化：例如 fixed 模式没有 fixedWidth 时按 dpi 模式渲染，
+ * dpi 模式下 fixedWidth 不影响结果
+ */
+export function getRenderCacheKey(
+  grid: IndexedPixelGrid,
+  { title, renderMode, options }: PatternRenderParams,
+  output: DownloadOutput,
+  pageCells: number
+): string {
+  const fixed = renderMode === 'fixed' && !!options.fixedWidth;
+  const params = [
+    RENDER_VERSION,
+    output,
+    output === 'pages' || output === 'pdf' ? pageCells : null,
+    title || '',
+    fixed ? ['fixed', options.fixedWidth] : ['dpi', options.dpi || 150],
+    !!options.showGrid,
+    options.gridInterval,
+    !!options.showCoordinates,
+    options.gridLineColor || null,
+    options.outerBorderColor || null,
+    !!options.includeStats,
+    !!options.showTransparentLabels,
+    output === 'png' || output === 'pages' ? [PNG_ENCODE_CONFIG.compressionLevel, PNG_ENCODE_CONFIG.filters] : null
+  ];
+  return createHash('sha256').update(`${hashPatternGrid(grid)}|${JSON.stringify(params)}`).digest('hex');
+}
+
+// If-None-Match 是否包含指定的 ETag（忽略弱校验前缀 W/）
+export function matchesIfNoneMatch(ifNoneMatch: string | null, etag: string): boolean {
+  if (!ifNoneMatch) {
+    return false;
+  }
+  return ifNoneMatch.split(',').some(value => {
+    const tag = value.trim().replace(/^W\//, '');
+    return tag === '*' || tag === etag;
+  });
+}
+
+export function recordNotModified(): void {
+  counters.notModified++;
+}
+
+// 查询缓存，返回的 Buffer 在请求之间共享，调用方不能修改
+export function getCachedRender(key: string): Buffer | undefined {
+  if (!isRenderCacheEnabled()) {
+    return undefined;
+  }
+  const data = renders.get(key);
+  if (data) {
+    counters.hits++;
+  } else {
+    counters.misses++;
+  }
+  return data;
+}
+
+/**
+ * 原样转发输出的数据块，同时收集完整的输出，全部输出完成后写入缓存
+ * 超过缓存上限的输出不再收集；客户端中途断开时不写入缓存
+ */
+export async function* cacheRenderOutput(key: string, chunks: AsyncIterable<Buffer>): AsyncGenerator<Buffer> {
+  if (!isRenderCacheEnabled()) {
+    yield* chunks;
+    return;
+  }
+  let collected: Buffer[] | null = [];
+  let collectedBytes = 0;
+  for await (const chunk of chunks) {
+    if (collected) {
+      collectedBytes += chunk.length;
+      if (collectedBytes <= maxBytes) {
+        collected.push(chunk);
+      } else {
+        collected = null;
+      }
+    }
+    yield chunk;
+  }
+  if (collected) {
+    renders.set(key, Buffer.concat(collected, collectedBytes));
+  }
+}
+
+export function getRenderCacheStats(): RenderCacheStats {
+  return {
+    enabled: isRenderCacheEnabled(),
+    entries: renders.size,
+    bytes: renders.totalSize,
+    maxBytes,
+    ...counters
+  };
+}
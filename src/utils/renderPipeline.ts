@@ -0,0 +1,98 @@
+// 图纸渲染任务（在工作线程中执行，见 renderWorker.ts、renderService.ts）
+// 每个任务输出一个完整的文件：整张 PNG / SVG、多页 PDF，或分页输出中的一页 PNG。
+// 增量渲染任务在缓存的底图上只重绘修改过的单元格。
+import { Readable } from 'stream';
+import { IndexedPixelGrid } from './pixelGrid';
+import {
+  PatternRenderParams,
+  SharedPatternPixels,
+  renderGridImageBuffer,
+  renderGridImageSvg,
+  renderPatchedGridImageBuffer
+} from './serverImageDownloader';
+import { renderPatternPageFile, renderPatternPdf } from './patternPages';
+
+// 整张图片（output=png / svg）
+export interface RenderImageTask {
+  type: 'png' | 'svg';
+  grid: IndexedPixelGrid;
+  params: PatternRenderParams;
+}
+
+// 多页 PDF（output=pdf）
+export interface RenderPdfTask {
+  type: 'pdf';
+  grid: IndexedPixelGrid;
+  params: PatternRenderParams;
+  pageCells: number;
+}
+
+// 分页输出中的第 fileIndex 个 PNG 文件（output=pages）
+export interface RenderPageTask {
+  type: 'page';
+  grid: IndexedPixelGrid;
+  params: PatternRenderParams;
+  pageCells: number;
+  fileIndex: number;
+}
+
+// 修改后的整张图片（output=png 且提交了 edits），在底图上重绘修改过的单元格
+export interface RenderPatchTask {
+  type: 'patch';
+  // 修改后的网格
+  grid: IndexedPixelGrid;
+  params: PatternRenderParams;
+  // 修改过的单元格下标
+  cells: Uint32Array;
+  // 缓存的底图，为 null 时先绘制 baseGrid，底图随结果返回
+  base: SharedPatternPixels | null;
+  baseGrid: IndexedPixelGrid | null;
+}
+
+export type RenderWorkerTask = RenderImageTask | RenderPdfTask | RenderPageTask | RenderPatchTask;
+
+export interface RenderWorkerResult {
+  // 分页输出中的文件名，其他任务为空字符串
+  name: string;
+  data: Uint8Array;
+  // 增量渲染任务新绘制的底图，其他情况为 null
+  base: SharedPatternPixels | null;
+}
+
+async function readStream(stream: Readable): Promise<Buffer> {
+  const chunks: Buffer[] = [];
+  for await (const chunk of stream) {
+    chunks.push(chunk);
+  }
+  return Buffer.concat(chunks);
+}
+
+// 转移给调用线程的数据必须独占整个 ArrayBuffer（小 Buffer 可能来自共享的内存池）
+function toTransferable(data: Buffer): Uint8Array {
+  if (data.byteOffset === 0 && data.byteLength === data.buffer.byteLength) {
+    return new Uint8Array(data.buffer, 0, data.byteLength);
+  }
+  return new Uint8Array(data);
+}
+
+// 执行渲染任务，返回结果和需要转移的缓冲区
+export async function runRenderWorkerTask(
+  task: RenderWorkerTask
+): Promise<{ response: RenderWorkerResult; transferList: ArrayBuffer[] }> {
+  let name = '';
+  let data: Buffer;
+  let base: SharedPatternPixels | null = null;
+  if (task.type === 'patch') {
+    ({ data, base } = renderPatchedGridImageBuffer(task.grid, task.params, task.cells, task.base, task.baseGrid));
+  } else if (task.type === 'page') {
+    ({ name, data } = renderPatternPageFile(task.grid, task.params, task.pageCells, task.fileIndex));
+  } else if (task.type === 'pdf') {
+    data = await readStream(renderPatternPdf(task.grid, task.params, task.pageCells));
+  } else if (task.type === 'svg') {
+    data = renderGridImageSvg(task.grid, task.params);
+  } else {
+    data = await renderGridImageBuffer(task.grid, task.params);
+  }
+  const response = { name, data: toTransferable(data), base };
+  return { response, transferList: [response.data.buffer as ArrayBuffer] };
+}
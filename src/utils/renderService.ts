@@ -0,0 +1,188 @@
+// 图纸渲染调度
+// /api/download 的渲染默认交给有界的工作线程池执行（node-canvas 的绘制和编码是同步的，大图会阻塞请求线程）。
+// 每个任务按画布像素数估算开销：单张画布超出像素预算的任务直接拒绝，
+// 同时渲染的像素数之和超出预算时任务排队等待；队列按估算的完成期限排序，小任务优先但大任务不会一直等待。
+// 分页输出逐页提交任务，每页单独计算开销。
+// 提交了 edits 的整张 PNG 在缓存的底图上增量渲染（见 baseRenderCache.ts）。
+// DOWNLOAD_POOL_SIZE=0 时不使用工作线程，在请求线程中直接渲染（流式编码）。
+import { Worker } from 'worker_threads';
+import { IndexedPixelGrid } from './pixelGrid';
+import {
+  PatternRenderParams,
+  estimateGridImagePixels,
+  renderGridImageStream,
+  renderGridImageSvg
+} from './serverImageDownloader';
+import {
+  countPatternPageFiles,
+  estimatePatternPagePixels,
+  renderPatternPages,
+  renderPatternPdf
+} from './patternPages';
+import { ZipOutputEntry, createZipStream } from './zipArchive';
+import { RenderWorkerResult, RenderWorkerTask, runRenderWorkerTask } from './renderPipeline';
+import { getCachedBaseRender, isBaseRenderCacheEnabled, setCachedBaseRender } from './baseRenderCache';
+import { getRenderCacheKey } from './renderCache';
+import { WorkerPool, WorkerPoolStats } from './workerPool';
+import { DownloadOutput } from '../types/downloadTypes';
+import { SERVER_CONFIG } from '../config/serverConfig';
+
+// 每百万像素推迟的排队期限（毫秒）
+const PRIORITY_MS_PER_MEGAPIXEL = 20;
+
+const pixelBudget = SERVER_CONFIG.downloadPool.pixelBudgetMP * 1000 * 1000;
+
+// 单张画布超出像素预算时抛出的错误，调用方据此返回 413
+export class RenderTooLargeError extends Error {
+  constructor(readonly pixels: number) {
+    super(`画布约 ${Math.ceil(pixels / 1e6)} 百万像素，超出渲染预算 ${SERVER_CONFIG.downloadPool.pixelBudgetMP} 百万像素`);
+    this.name = 'RenderTooLargeError';
+  }
+}
+
+// 增量渲染的依据：修改前的网格和修改过的单元格
+export interface RenderPatch {
+  baseGrid: IndexedPixelGrid;
+  cells: Uint32Array;
+}
+
+export interface RenderPoolStats extends WorkerPoolStats {
+  // 正在渲染的画布像素数之和
+  runningPixels: number;
+  pixelBudget: number;
+}
+
+// 工作线程按需启动，创建线程池本身没有开销
+const renderPool = SERVER_CONFIG.downloadPool.size > 0
+  ? new WorkerPool<RenderWorkerTask, RenderWorkerResult>(
+    // new URL(..., import.meta.url) 的写法让打包工具把工作线程入口单独打包
+    () => new Worker(new URL('./renderWorker.ts', import.meta.url)),
+    SERVER_CONFIG.downloadPool.size,
+    SERVER_CONFIG.downloadPool.maxQueueLength,
+    pixelBudget
+  )
+  : null;
+
+// 矢量输出的开销与 dpi 无关，按 150 DPI 的布局估算
+function atBaseDpi(params: PatternRenderParams): PatternRenderParams {
+  return { ...params, renderMode: 'dpi', options: { ...params.options, dpi: 150 } };
+}
+
+/**
+ * 估算渲染开销（单张画布的像素数）
+ * SVG / PDF 是矢量输出，按 150 DPI 下整张图片 / 单页的像素数估算
+ */
+export function estimateRenderPixels(
+  grid: IndexedPixelGrid,
+  params: PatternRenderParams,
+  output: DownloadOutput,
+  pageCells: number
+): number {
+  if (output === 'png') {
+    return estimateGridImagePixels(grid, params);
+  }
+  if (output === 'svg') {
+    return estimateGridImagePixels(grid, atBaseDpi(params));
+  }
+  if (output === 'pdf') {
+    return estimatePatternPagePixels(grid, atBaseDpi(params), pageCells);
+  }
+  return estimatePatternPagePixels(grid, params, pageCells);
+}
+
+function toBuffer(data: Uint8Array): Buffer {
+  return Buffer.from(data.buffer, data.byteOffset, data.byteLength);
+}
+
+async function* singleChunk(data: Buffer): AsyncGenerator<Buffer> {
+  yield data;
+}
+
+// 按顺序输出分页文件，当前页写入压缩包时下一页已经开始渲染
+async function* collectPages(
+  first: RenderWorkerResult,
+  fileCount: number,
+  runPage: (fileIndex: number) => Promise<RenderWorkerResult>
+): AsyncGenerator<ZipOutputEntry> {
+  let result = first;
+  for (let fileIndex = 1; ; fileIndex++) {
+    const next = fileIndex < fileCount ? runPage(fileIndex) : null;
+    // 客户端中途断开时不再等待预取的页，避免未处理的拒绝
+    next?.catch(() => undefined);
+    yield { name: result.name, data: toBuffer(result.data) };
+    if (!next) return;
+    result = await next;
+  }
+}
+
+/**
+ * 渲染下载输出，返回按顺序输出的数据块
+ * 任务被接受（分页输出为第一页渲染完成）后才返回，因此过载和超出预算的错误都在发送响应头之前抛出。
+ * 单张画布超出像素预算时抛出 RenderTooLargeError，线程池队列已满时抛出 WorkerPoolOverloadedError。
+ * @param patch 提交了 edits 时的修改前网格和修改过的单元格，整张 PNG 据此增量渲染
+ */
+export async function renderDownload(
+  grid: IndexedPixelGrid,
+  params: PatternRenderParams,
+  output: DownloadOutput,
+  pageCells: number,
+  patch: RenderPatch | null = null
+): Promise<AsyncIterable<Buffer>> {
+  const cost = estimateRenderPixels(grid, params, output, pageCells);
+  if (cost > pixelBudget) {
+    throw new RenderTooLargeError(cost);
+  }
+  const taskOptions = { priority: Date.now() + (cost / 1e6) * PRIORITY_MS_PER_MEGAPIXEL, cost };
+
+  if (output === 'png' && patch && isBaseRenderCacheEnabled()) {
+    // 底图按修改前的网格和相同的下载参数缓存；未命中时由同一个任务绘制底图并返回
+    const baseKey = getRenderCacheKey(patch.baseGrid, params, output, pageCells);
+    const base = getCachedBaseRender(baseKey);
+    const task: RenderWorkerTask = {
+      type: 'patch',
+      grid,
+      params,
+      cells: patch.cells,
+      base,
+      baseGrid: base ? null : patch.baseGrid
+    };
+    const result = renderPool
+      ? await renderPool.run(task, [], false, taskOptions)
+      : (await runRenderWorkerTask(task)).response;
+    if (result.base) {
+      setCachedBaseRender(baseKey, result.base);
+    }
+    return singleChunk(toBuffer(result.data));
+  }
+
+  if (!renderPool) {
+    if (output === 'pages') {
+      return createZipStream(renderPatternPages(grid, params, pageCells));
+    }
+    if (output === 'svg') {
+      return singleChunk(renderGridImageSvg(grid, params));
+    }
+    return output === 'pdf' ? renderPatternPdf(grid, params, pageCells) : renderGridImageStream(grid, params);
+  }
+
+  if (output === 'pages') {
+    // 后续页属于已被接受的请求，沿用第一页的优先级，不受队列长度限制
+    const runPage = (fileIndex: number, admitted: boolean) => renderPool.run(
+      { type: 'page', grid, params, pageCells, fileIndex }, [], admitted, taskOptions
+    );
+    const first = await runPage(0, false);
+    return createZipStream(collectPages(first, countPatternPageFiles(grid, params, pageCells), fileIndex => runPage(fileIndex, true)));
+  }
+
+  const task: RenderWorkerTask = output === 'pdf'
+    ? { type: 'pdf', grid, params, pageCells }
+    : { type: output, grid, params };
+  const { data } = await renderPool.run(task, [], false, taskOptions);
+  return singleChunk(toBuffer(data));
+}
+
+export function getRenderPoolStats(): RenderPoolStats | null {
+  return renderPool
+    ? { ...renderPool.getStats(), runningPixels: renderPool.getRunningCost(), pixelBudget }
+    : null;
+}
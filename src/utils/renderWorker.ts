@@ -0,0 +1,23 @@
+// 图纸渲染工作线程入口，由 renderService.ts 中的线程池加载
+import { parentPort } from 'worker_threads';
+import { RenderWorkerTask, RenderWorkerResult, runRenderWorkerTask } from './renderPipeline';
+import { WorkerResponse } from './workerPool';
+
+if (!parentPort) {
+  throw new Error('renderWorker 只能在工作线程中运行');
+}
+const port = parentPort;
+
+port.on('message', async (task: RenderWorkerTask) => {
+  try {
+    const { response, transferList } = await runRenderWorkerTask(task);
+    const message: WorkerResponse<RenderWorkerResult> = { ok: true, result: response };
+    port.postMessage(message, transferList);
+  } catch (error) {
+    const message: WorkerResponse<RenderWorkerResult> = {
+      ok: false,
+      error: error instanceof Error ? error.message : '未知错误'
+    };
+    port.postMessage(message);
+  }
+});
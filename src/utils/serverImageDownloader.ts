@@ -1,50 +1,116 @@
 // 服务器端图片生成器 - 基于 imageDownloader.ts 适配
+// 布局计算和各部分的绘制拆分为独立的函数，整张图片和分页输出（patternPages.ts）共用
 import { DownloadImage } from '../types/downloadTypes';
-import { createCanvas } from 'canvas';
+import { Readable } from 'stream';
+import { createCanvas, Canvas, CanvasRenderingContext2D, PngConfig } from 'canvas';
 import { getContrastColor, sortColorKeys } from './imageDownloader';
-import { calculateColorCounts, filterColorCountsForBeadUsage } from './apiUtils';
+import { filterColorCountsForBeadUsage } from './apiUtils';
+import { IndexedPixelGrid, calculateGridColorCounts, indexedGridFromMappedData } from './pixelGrid';
+import { ColorCount } from '@/types/paletteTypes';
+import { GlyphAtlas, sharedGlyphAtlas } from './glyphAtlas';
+import { SERVER_CONFIG } from '../config/serverConfig';
+
+// 绘图参数（不含像素数据）
+export type PatternRenderParams = Omit<DownloadImage, 'pixelData'>;
+
+// 网格中要绘制的单元格范围：列 [x0, x1)，行 [y0, y1)
+export interface PatternCellWindow {
+  x0: number;
+  y0: number;
+  x1: number;
+  y1: number;
+}
 
-// 服务器端下载图片的主函数 - 返回 Buffer 而不是下载文件
-export async function generateImageBuffer({
-  title,
-  pixelData,
-  renderMode,
-  options
-}: DownloadImage): Promise<Buffer> {
+// 图纸布局：图片尺寸和各区域的位置
+export interface PatternLayout {
+  dpiScale: number;
+  // 单元格边长（像素）
+  cellSize: number;
+  // 坐标轴标注占用的宽度/高度，不显示坐标时为 0
+  axisLabelSize: number;
+  statsFontSize: number;
+  // 统计区域随网格宽度放大的系数
+  widthFactor: number;
+  titleBarHeight: number;
+  // 网格左上角的位置和网格尺寸
+  gridLeft: number;
+  gridTop: number;
+  gridWidth: number;
+  gridHeight: number;
+  statsHeight: number;
+  // 图片尺寸
+  width: number;
+  height: number;
+}
 
-  if (!pixelData || !pixelData.mappedData || !pixelData.width || !pixelData.height || pixelData.width === 0 || pixelData.height === 0) {
-    throw new Error("下载失败: 像素数据或尺寸无效。");
-  }
+// 整张图纸绘制完成后的像素（RGBA，SharedArrayBuffer，可直接交给工作线程读取），作为增量渲染的底图
+export interface SharedPatternPixels {
+  // 绘制时的布局尺寸（与 PatternLayout 的 width / height 相同，可能不是整数）
+  width: number;
+  height: number;
+  rgba: SharedArrayBuffer;
+}
 
-  const mappedPixelData = pixelData.mappedData;
-  const N = pixelData.width;
-  const M = pixelData.height;
+// PNG 编码参数（压缩级别和行过滤器），由 DOWNLOAD_PNG_COMPRESSION / DOWNLOAD_PNG_FILTERS 配置
+export const PNG_ENCODE_CONFIG: PngConfig = {
+  compressionLevel: SERVER_CONFIG.download.pngCompressionLevel as PngConfig['compressionLevel'],
+  filters: SERVER_CONFIG.download.pngFilters
+};
+
+// 统计区域使用的字体
+const STATS_FONT_FAMILY = '"Noto Sans CJK SC", "Microsoft YaHei", "WenQuanYi Micro Hei", sans-serif';
+
+/**
+ * 按调色板下标对窗口内的内部单元格分桶（计数排序，O(单元格数)）
+ * 第 p 种颜色的单元格下标为 order[starts[p]] 到 order[starts[p + 1] - 1]，按行优先顺序排列
+ */
+function groupCellsByColor(grid: IndexedPixelGrid, window: PatternCellWindow): { order: Uint32Array; starts: Uint32Array } {
+  const { width, indices, palette, external } = grid;
+  const { x0, y0, x1, y1 } = window;
+  const starts = new Uint32Array(palette.length + 1);
+  for (let j = y0; j < y1; j++) {
+    for (let cellIndex = j * width + x0; cellIndex < j * width + x1; cellIndex++) {
+      if (!external || !external[cellIndex]) starts[indices[cellIndex] + 1]++;
+    }
+  }
+  for (let paletteIndex = 0; paletteIndex < palette.length; paletteIndex++) {
+    starts[paletteIndex + 1] += starts[paletteIndex];
+  }
 
-  // 统计色号
-  let colorCounts = calculateColorCounts(mappedPixelData);
+  const order = new Uint32Array(starts[palette.length]);
+  const next = starts.slice(0, palette.length);
+  for (let j = y0; j < y1; j++) {
+    for (let cellIndex = j * width + x0; cellIndex < j * width + x1; cellIndex++) {
+      if (!external || !external[cellIndex]) order[next[indices[cellIndex]]++] = cellIndex;
+    }
+  }
+  return { order, starts };
+}
 
-  // 根据是否显示透明标签过滤统计数据
+// 统计色号，根据是否显示透明标签过滤统计数据
+export function calculatePatternStats(grid: IndexedPixelGrid, showTransparentLabels?: boolean): { colorCounts: ColorCount; totalBeadCount: number } {
   const { filteredCounts, filteredTotal } = filterColorCountsForBeadUsage(
-    colorCounts,
-    !options.showTransparentLabels
+    calculateGridColorCounts(grid),
+    !showTransparentLabels
   );
-  // 使用过滤后的统计数据
-  colorCounts = filteredCounts;
-  const totalBeadCount = filteredTotal;
-
-  // 从下载选项中获取设置
-  const {
-    showGrid,
-    gridInterval,
-    showCoordinates,
-    gridLineColor,
-    outerBorderColor,
-    includeStats,
-    dpi = 150, // 设置默认值
-    fixedWidth,
-    showTransparentLabels
-  } = options;
+  return { colorCounts: filteredCounts, totalBeadCount: filteredTotal };
+}
 
+/**
+ * 计算图纸布局
+ * @param columns 网格列数
+ * @param rows 网格行数
+ * @param statsItemCount 统计区域的色号数量，为 null 时不绘制统计区域
+ */
+export function computePatternLayout(
+  columns: number,
+  rows: number,
+  statsItemCount: number | null,
+  { title, renderMode, options }: PatternRenderParams
+): PatternLayout {
+  const N = columns;
+  const M = rows;
+  const { showCoordinates, dpi = 150, fixedWidth } = options;
 
   // 根据渲染模式计算基础单元格大小
   let downloadCellSize: number;
@@ -91,12 +157,10 @@ export async function generateImageBuffer({
   const gridHeight = M * downloadCellSize;
 
   // 添加适当高度的标题栏
-  const titleBarHeight = title ? 80 * dpiScale : 0; // 减小高度，使布局更紧凑  // 计算统计区域的大小
-  if (includeStats && colorCounts) {
-    const colorKeys = Object.keys(colorCounts);
+  const titleBarHeight = title ? 80 * dpiScale : 0; // 减小高度，使布局更紧凑
+  // 计算统计区域的大小
+  if (statsItemCount !== null) {
     const statsTopMargin = 24 * dpiScale;
-    // const finalWidth = gridWidth + axisLabelSize + extraLeftMargin + extraRightMargin;
-    // const availableStatsWidth = finalWidth - (statsPadding * 2);
 
     // 色块的基础尺寸（适中大小以容纳文字）
     const baseSwatchSize = Math.max(24 * dpiScale, 28 * dpiScale);
@@ -111,13 +175,12 @@ export async function generateImageBuffer({
     // 根据网格宽度动态计算列数，确保不会太紧密
     const statsAvailableWidth = gridWidth;
     const numColumns = Math.max(1, Math.floor(statsAvailableWidth / itemTotalWidth));
-    const numRows = Math.ceil(colorKeys.length / numColumns);
+    const numRows = Math.ceil(statsItemCount / numColumns);
 
     // 优化行高计算，确保有足够空间
     const statsRowHeight = swatchSize + 16 * dpiScale; // 增加行间距防止覆盖
     const titleHeight = 2 * (statsFontSize + 2 * dpiScale); // 匹配实际的 itemStartY 计算
     const footerHeight = 30 * dpiScale; // 总计部分的高度，与 totalY 后的额外空间匹配
-    // const bottomMargin = 30 * dpiScale; // 底部额外边距，确保总计文字不被截断
     statsHeight = titleHeight + (numRows * statsRowHeight) + footerHeight + (statsPadding * 2) + statsTopMargin;
   }
 
@@ -125,123 +188,210 @@ export async function generateImageBuffer({
   const contentWidth = gridWidth + axisLabelSize + extraLeftMargin + extraRightMargin;
   const contentHeight = titleBarHeight + gridHeight + axisLabelSize + statsHeight + extraTopMargin + extraBottomMargin;
 
-  // 直接使用内容尺寸，不再强制调整比例
-  const downloadWidth = contentWidth;
-  const downloadHeight = contentHeight;
-
-  // 计算偏移量 - 由于不再调整图片比例，这里的偏移量实际上是0
-  const offsetX = 0;
-  const offsetY = 0;
-
-  // 创建 Node.js Canvas
-  const canvas = createCanvas(downloadWidth, downloadHeight);
-  const ctx = canvas.getContext('2d');
+  return {
+    dpiScale,
+    cellSize: downloadCellSize,
+    axisLabelSize,
+    statsFontSize,
+    widthFactor,
+    titleBarHeight,
+    gridLeft: extraLeftMargin + axisLabelSize,
+    gridTop: titleBarHeight + extraTopMargin + axisLabelSize,
+    gridWidth,
+    gridHeight,
+    statsHeight,
+    width: contentWidth,
+    height: contentHeight
+  };
+}
 
-  // 设置背景色
+// 绘制白色背景和标题栏（如果有标题）
+export function drawPatternBackground(ctx: CanvasRenderingContext2D, layout: PatternLayout, title?: string): void {
   ctx.fillStyle = '#FFFFFF';
-  ctx.fillRect(0, 0, downloadWidth, downloadHeight);
+  ctx.fillRect(0, 0, layout.width, layout.height);
 
-  // 绘制标题栏（如果有标题）
-  if (title && titleBarHeight > 0) {
+  if (title && layout.titleBarHeight > 0) {
     // 不绘制背景色，直接绘制标题文字
     ctx.fillStyle = '#1F2937';
     // 指定多种字体，包括支持中文的字体
-    ctx.font = `bold ${Math.floor(24 * dpiScale)}px "Noto Sans CJK SC", "Microsoft YaHei", "WenQuanYi Micro Hei", sans-serif`;
+    ctx.font = `bold ${Math.floor(24 * layout.dpiScale)}px ${STATS_FONT_FAMILY}`;
     ctx.textAlign = 'center';
     ctx.textBaseline = 'middle';
-    ctx.fillText(title, offsetX + contentWidth / 2, offsetY + titleBarHeight / 2);
+    ctx.fillText(title, layout.width / 2, layout.titleBarHeight / 2);
   }
+}
 
-  // 绘制坐标轴（如果需要）
-  if (showCoordinates) {
-    ctx.fillStyle = '#666666';
-    ctx.font = `${Math.floor(statsFontSize * 0.8)}px sans-serif`;
+/**
+ * 绘制窗口范围内的坐标轴标签，网格原点（gridLeft, gridTop）对应窗口左上角的单元格
+ * 标签位于网格上方和左侧，文字较大时可能伸进网格内，先于单元格绘制
+ */
+function drawAxisLabels(
+  ctx: CanvasRenderingContext2D,
+  layout: PatternLayout,
+  window: PatternCellWindow,
+  gridInterval: number
+): void {
+  const { dpiScale, cellSize, axisLabelSize, statsFontSize, gridLeft, gridTop } = layout;
+  const { x0, y0, x1, y1 } = window;
+  ctx.fillStyle = '#666666';
+  ctx.font = `${Math.floor(statsFontSize * 0.8)}px sans-serif`;
+
+  // X轴坐标 - 只在网格间隔处显示，从第一个间隔开始
+  ctx.textAlign = 'center';
+  ctx.textBaseline = 'middle';
+  for (let i = Math.ceil((x0 + 1) / gridInterval) * gridInterval; i <= x1; i += gridInterval) {
+    const textX = gridLeft + (i - 1 - x0) * cellSize + cellSize / 2;
+    const textY = gridTop - axisLabelSize / 2;
+    ctx.fillText(i.toString(), textX, textY);
+  }
 
-    // X轴坐标 - 只在网格间隔处显示，从第一个间隔开始
-    ctx.textAlign = 'center';
-    ctx.textBaseline = 'middle';
-    for (let i = gridInterval; i <= N; i += gridInterval) {
-      if (i <= N) { // 确保不超过边界
-        const textX = offsetX + extraLeftMargin + (i - 1) * downloadCellSize + axisLabelSize + downloadCellSize / 2;
-        const textY = offsetY + titleBarHeight + extraTopMargin + axisLabelSize / 2;
-        ctx.fillText(i.toString(), textX, textY);
-      }
-    }
+  // Y轴坐标 - 只在网格间隔处显示，从第一个间隔开始，右对齐避免被格子遮挡
+  ctx.textAlign = 'right';
+  ctx.textBaseline = 'middle';
+  for (let j = Math.ceil((y0 + 1) / gridInterval) * gridInterval; j <= y1; j += gridInterval) {
+    const textX = gridLeft - 5 * dpiScale; // 右对齐并留出间距
+    const textY = gridTop + (j - 1 - y0) * cellSize + cellSize / 2;
+    ctx.fillText(j.toString(), textX, textY);
+  }
+}
 
-    // Y轴坐标 - 只在网格间隔处显示，从第一个间隔开始，右对齐避免被格子遮挡
-    ctx.textAlign = 'right';
-    ctx.textBaseline = 'middle';
-    for (let j = gridInterval; j <= M; j += gridInterval) {
-      if (j <= M) { // 确保不超过边界
-        const textX = offsetX + extraLeftMargin + axisLabelSize - 5 * dpiScale; // 右对齐并留出间距
-        const textY = offsetY + titleBarHeight + extraTopMargin + (j - 1) * downloadCellSize + axisLabelSize + downloadCellSize / 2;
-        ctx.fillText(j.toString(), textX, textY);
-      }
-    }
+/**
+ * 绘制网格窗口：坐标轴、单元格、分隔线和外边框
+ * 坐标和分隔线按整张图纸的坐标计算，分页时每页的坐标与整张图纸一致
+ * @param glyphs 色号标签贴图缓存，为 null 时直接绘制文字；PDF / SVG 画布总是直接绘制文字，保持矢量输出
+ */
+export function drawPatternGrid(
+  ctx: CanvasRenderingContext2D,
+  grid: IndexedPixelGrid,
+  layout: PatternLayout,
+  window: PatternCellWindow,
+  options: PatternRenderParams['options'],
+  glyphs: GlyphAtlas | null = sharedGlyphAtlas
+): void {
+  const { showGrid, gridInterval, showCoordinates, gridLineColor, outerBorderColor, showTransparentLabels } = options;
+  const { dpiScale, cellSize, gridLeft, gridTop } = layout;
+  const { x0, y0, x1, y1 } = window;
+  const N = grid.width;
+  const windowWidth = (x1 - x0) * cellSize;
+  const windowHeight = (y1 - y0) * cellSize;
+
+  // 绘制坐标轴（如果需要）
+  if (showCoordinates) {
+    drawAxisLabels(ctx, layout, window, gridInterval);
   }
 
   // 计算字体大小用于单元格内文本
-  const fontSize = Math.max(8 * dpiScale, Math.min(16 * dpiScale, downloadCellSize / 3));
+  const fontSize = Math.max(8 * dpiScale, Math.min(16 * dpiScale, cellSize / 3));
   ctx.font = `bold ${fontSize}px sans-serif`;
   ctx.textAlign = 'center';
   ctx.textBaseline = 'middle';
 
-  // 绘制所有单元格
-  for (let j = 0; j < M; j++) {
-    for (let i = 0; i < N; i++) {
-      const cellData = mappedPixelData[j][i];
-      const drawX = offsetX + extraLeftMargin + i * downloadCellSize + axisLabelSize;
-      const drawY = offsetY + titleBarHeight + extraTopMargin + j * downloadCellSize + axisLabelSize;
-
-      if (cellData && !cellData.isExternal) {
-        // 内部单元格：使用珠子颜色填充并绘制文本
-        const cellColor = cellData.color || '#FFFFFF';
-        const cellKey = cellData.key; // 直接使用像素数据中的 key
-
-        ctx.fillStyle = cellColor;
-        ctx.fillRect(drawX, drawY, downloadCellSize, downloadCellSize);
-
-        // 检查是否是透明色，以及是否应该显示字体
-        const isTransparent = cellKey === 'T01' || cellKey === 'ERASE';
-        const shouldShowLabel = !isTransparent || (isTransparent && showTransparentLabels);
-
-        if (shouldShowLabel) {
-          ctx.fillStyle = getContrastColor(cellColor);
-          ctx.fillText(cellKey, drawX + downloadCellSize / 2, drawY + downloadCellSize / 2);
+  // 绘制所有单元格：按颜色分组，每种颜色只设置一次 fillStyle，并把该颜色的所有单元格合并为一条路径填充
+  // 外部背景单元格保持画布的白色背景，不需要绘制
+  // PDF / SVG 画布把同一行中连续的同色单元格合并为一个矩形，输出大小只与色块段数有关；
+  // 位图画布仍逐格绘制，保持与之前完全相同的像素
+  const { palette: cellPalette } = grid;
+  const { order, starts } = groupCellsByColor(grid, window);
+  const mergeRuns = ctx.canvas.type !== 'image';
+
+  for (let paletteIndex = 0; paletteIndex < cellPalette.length; paletteIndex++) {
+    if (starts[paletteIndex] === starts[paletteIndex + 1]) continue;
+    ctx.fillStyle = cellPalette[paletteIndex].hex;
+    ctx.beginPath();
+    for (let k = starts[paletteIndex]; k < starts[paletteIndex + 1]; k++) {
+      const cellIndex = order[k];
+      const i = cellIndex % N;
+      const j = (cellIndex - i) / N;
+      let runLength = 1;
+      if (mergeRuns) {
+        // 同一颜色的单元格按行优先排列，下标连续且不换行的单元格在同一行相邻
+        while (k + 1 < starts[paletteIndex + 1] && order[k + 1] === cellIndex + runLength && i + runLength < x1) {
+          runLength++;
+          k++;
         }
-      } else {
-        // 外部背景：填充白色
-        ctx.fillStyle = '#FFFFFF';
-        ctx.fillRect(drawX, drawY, downloadCellSize, downloadCellSize);
       }
+      ctx.rect(gridLeft + (i - x0) * cellSize, gridTop + (j - y0) * cellSize, cellSize * runLength, cellSize);
+    }
+    ctx.fill();
+  }
 
-      // 绘制单元格边框
-      ctx.strokeStyle = '#DDDDDD';
-      ctx.lineWidth = 0.5 * dpiScale;
-      ctx.strokeRect(drawX + 0.5, drawY + 0.5, downloadCellSize, downloadCellSize);
+  // 绘制色号：对比色和是否显示（透明色默认不显示）按调色板项只计算一次，
+  // 再按对比色分组绘制，整个网格只切换几次 fillStyle
+  const labelColors = cellPalette.map(({ key, hex }) => {
+    const isTransparent = key === 'T01' || key === 'ERASE';
+    return !isTransparent || showTransparentLabels ? getContrastColor(hex) : null;
+  });
+  if (glyphs && ctx.canvas.type === 'image' && Number.isInteger(cellSize)) {
+    // 每种色号只排版一次，之后贴图；网格原点的小数部分在贴图中计入，贴到整数坐标上
+    const baseLeft = Math.floor(gridLeft);
+    const baseTop = Math.floor(gridTop);
+    const phaseX = Math.round((gridLeft - baseLeft) * 100) / 100;
+    const phaseY = Math.round((gridTop - baseTop) * 100) / 100;
+    for (let paletteIndex = 0; paletteIndex < cellPalette.length; paletteIndex++) {
+      const labelColor = labelColors[paletteIndex];
+      if (!labelColor || starts[paletteIndex] === starts[paletteIndex + 1]) continue;
+      const { image, offsetX, offsetY } = glyphs.get(cellPalette[paletteIndex].key, ctx.font, labelColor, cellSize, phaseX, phaseY);
+      for (let k = starts[paletteIndex]; k < starts[paletteIndex + 1]; k++) {
+        const cellIndex = order[k];
+        const i = cellIndex % N;
+        const j = (cellIndex - i) / N;
+        ctx.drawImage(image, baseLeft + (i - x0) * cellSize + offsetX, baseTop + (j - y0) * cellSize + offsetY);
+      }
+    }
+  } else {
+    const halfCellSize = cellSize / 2;
+    for (const labelColor of new Set(labelColors)) {
+      if (!labelColor) continue;
+      ctx.fillStyle = labelColor;
+      for (let paletteIndex = 0; paletteIndex < cellPalette.length; paletteIndex++) {
+        if (labelColors[paletteIndex] !== labelColor) continue;
+        const cellKey = cellPalette[paletteIndex].key;
+        for (let k = starts[paletteIndex]; k < starts[paletteIndex + 1]; k++) {
+          const cellIndex = order[k];
+          const i = cellIndex % N;
+          const j = (cellIndex - i) / N;
+          ctx.fillText(cellKey, gridLeft + (i - x0) * cellSize + halfCellSize, gridTop + (j - y0) * cellSize + halfCellSize);
+        }
+      }
     }
   }
 
+  // 绘制单元格边框：相邻单元格共用边线，全部格线合并为一条路径，只描边一次
+  ctx.strokeStyle = '#DDDDDD';
+  ctx.lineWidth = 0.5 * dpiScale;
+  ctx.beginPath();
+  for (let i = 0; i <= x1 - x0; i++) {
+    const lineX = gridLeft + i * cellSize + 0.5;
+    ctx.moveTo(lineX, gridTop + 0.5);
+    ctx.lineTo(lineX, gridTop + windowHeight + 0.5);
+  }
+  for (let j = 0; j <= y1 - y0; j++) {
+    const lineY = gridTop + j * cellSize + 0.5;
+    ctx.moveTo(gridLeft + 0.5, lineY);
+    ctx.lineTo(gridLeft + windowWidth + 0.5, lineY);
+  }
+  ctx.stroke();
+
   // 绘制分隔网格线（如果需要）
   if (showGrid) {
     ctx.strokeStyle = gridLineColor || '#141414'; // 默认使用纯黑色
     ctx.lineWidth = 1.5 * dpiScale;
 
     // 垂直分隔线
-    for (let i = gridInterval; i < N; i += gridInterval) {
-      const lineX = offsetX + extraLeftMargin + i * downloadCellSize + axisLabelSize;
+    for (let i = (Math.floor(x0 / gridInterval) + 1) * gridInterval; i < x1; i += gridInterval) {
+      const lineX = gridLeft + (i - x0) * cellSize;
       ctx.beginPath();
-      ctx.moveTo(lineX, offsetY + titleBarHeight + extraTopMargin + axisLabelSize);
-      ctx.lineTo(lineX, offsetY + titleBarHeight + extraTopMargin + axisLabelSize + M * downloadCellSize);
+      ctx.moveTo(lineX, gridTop);
+      ctx.lineTo(lineX, gridTop + windowHeight);
       ctx.stroke();
     }
 
     // 水平分隔线
-    for (let j = gridInterval; j < M; j += gridInterval) {
-      const lineY = offsetY + titleBarHeight + extraTopMargin + j * downloadCellSize + axisLabelSize;
+    for (let j = (Math.floor(y0 / gridInterval) + 1) * gridInterval; j < y1; j += gridInterval) {
+      const lineY = gridTop + (j - y0) * cellSize;
       ctx.beginPath();
-      ctx.moveTo(offsetX + extraLeftMargin + axisLabelSize, lineY);
-      ctx.lineTo(offsetX + extraLeftMargin + axisLabelSize + N * downloadCellSize, lineY);
+      ctx.moveTo(gridLeft, lineY);
+      ctx.lineTo(gridLeft + windowWidth, lineY);
       ctx.stroke();
     }
   }
@@ -250,105 +400,308 @@ export async function generateImageBuffer({
   if (outerBorderColor) {
     ctx.strokeStyle = outerBorderColor;
     ctx.lineWidth = 2 * dpiScale; // 较粗的外边框
+    ctx.strokeRect(gridLeft, gridTop, windowWidth, windowHeight);
+  }
+}
 
-    const borderX = offsetX + extraLeftMargin + axisLabelSize;
-    const borderY = offsetY + titleBarHeight + extraTopMargin + axisLabelSize;
-    const borderWidth = N * downloadCellSize;
-    const borderHeight = M * downloadCellSize;
+/**
+ * 在已绘制好的整张图纸上重绘指定的单元格（包括色号和经过它的格线、分隔线、外边框）
+ * 每个单元格连同周围一圈单元格按原来的顺序重新绘制，并裁剪到该单元格加上线宽的范围，
+ * 开销只与单元格数量有关，不随图纸大小增长
+ * @param cells 单元格下标（y * width + x）
+ * @param glyphs 色号标签贴图缓存，与 drawPatternGrid 相同
+ */
+export function redrawPatternCells(
+  ctx: CanvasRenderingContext2D,
+  grid: IndexedPixelGrid,
+  layout: PatternLayout,
+  cells: ArrayLike<number>,
+  options: PatternRenderParams['options'],
+  glyphs: GlyphAtlas | null = sharedGlyphAtlas
+): void {
+  const { width, height } = grid;
+  const { cellSize, gridLeft, gridTop, axisLabelSize, statsFontSize } = layout;
+  // 裁剪范围向外扩展的像素数，覆盖外边框（2 * dpiScale）的一半和抗锯齿
+  const margin = Math.ceil(layout.dpiScale) + 1;
+  // 坐标轴标签由下面单独重绘，窗口不绘制
+  const cellOptions = { ...options, showCoordinates: false };
+  const fullWindow = { x0: 0, y0: 0, x1: width, y1: height };
+  // X 轴标签文字的下边缘（字号较大时会伸进网格内）
+  const xLabelBottom = gridTop - axisLabelSize / 2 + Math.floor(statsFontSize * 0.8);
+
+  for (let k = 0; k < cells.length; k++) {
+    const i = cells[k] % width;
+    const j = (cells[k] - i) / width;
+    const window = {
+      x0: Math.max(0, i - 1),
+      y0: Math.max(0, j - 1),
+      x1: Math.min(width, i + 2),
+      y1: Math.min(height, j + 2)
+    };
+    const left = Math.floor(gridLeft + i * cellSize) - margin;
+    const top = Math.floor(gridTop + j * cellSize) - margin;
+    const size = cellSize + 2 * margin + 1;
+
+    ctx.save();
+    ctx.beginPath();
+    ctx.rect(left, top, size, size);
+    ctx.clip();
+    ctx.fillStyle = '#FFFFFF';
+    ctx.fillRect(left, top, size, size);
+    // 裁剪范围可能与坐标轴标签重叠（第一行 / 第一列附近），与整张绘制时一样先绘制标签，
+    // 按整张图纸的坐标绘制全部标签，由裁剪范围截取
+    if (options.showCoordinates && (top < xLabelBottom || left < gridLeft)) {
+      drawAxisLabels(ctx, layout, fullWindow, options.gridInterval);
+    }
+    // 以窗口左上角为网格原点绘制，单元格和格线的位置与整张绘制时相同
+    drawPatternGrid(ctx, grid, {
+      ...layout,
+      gridLeft: gridLeft + window.x0 * cellSize,
+      gridTop: gridTop + window.y0 * cellSize
+    }, window, cellOptions, glyphs);
+    ctx.restore();
+  }
+}
 
-    ctx.strokeRect(borderX, borderY, borderWidth, borderHeight);
-  }  // 绘制统计信息（如果需要）
-  if (includeStats && colorCounts) {
-    const colorKeys = Object.keys(colorCounts);
-    // 按色号排序（恢复原有排序方式）
-    const sortedColorKeys = colorKeys.sort(sortColorKeys);
+// 整张图片中统计区域的顶部位置
+function statsStartY(layout: PatternLayout): number {
+  return layout.gridTop + layout.gridHeight + 16 * layout.dpiScale;
+}
 
-    // 调整统计区域的起始位置，使布局更紧凑
-    const statsStartY = offsetY + titleBarHeight + extraTopMargin + gridHeight + axisLabelSize + 16 * dpiScale;
-    const availableWidth = contentWidth - (statsPadding * 2);
+/**
+ * 绘制豆子用量统计
+ * @param statsStartY 统计区域顶部的位置
+ */
+export function drawPatternStats(
+  ctx: CanvasRenderingContext2D,
+  layout: PatternLayout,
+  colorCounts: ColorCount,
+  totalBeadCount: number,
+  statsStartY: number
+): void {
+  const { dpiScale, statsFontSize, widthFactor, gridLeft, gridWidth } = layout;
+  const statsPadding = 20 * dpiScale;
+  const colorKeys = Object.keys(colorCounts);
+  // 按色号排序（恢复原有排序方式）
+  const sortedColorKeys = colorKeys.sort(sortColorKeys);
+  const availableWidth = layout.width - (statsPadding * 2);
+
+  // 色块的基础尺寸（适中大小以容纳文字）
+  const baseSwatchSize = Math.max(24 * dpiScale, 28 * dpiScale);
+  const swatchSize = Math.floor(baseSwatchSize + (widthFactor * 10 * dpiScale)); // 减小增长幅度
+
+  // 优化统计项宽度计算 - 动态计算实际需要的文字宽度
+  ctx.font = `${Math.max(10 * dpiScale, statsFontSize)}px ${STATS_FONT_FAMILY}`;
+  let maxTextWidth = 0;
+  sortedColorKeys.forEach(colorKey => {
+    const colorData = colorCounts[colorKey];
+    const textWidth = ctx.measureText(`${colorData.count}`).width;
+    maxTextWidth = Math.max(maxTextWidth, textWidth);
+  });
+
+  // 每个统计项的总宽度（色块 + 间距 + 实际文字宽度 + 额外边距）
+  const itemTotalWidth = swatchSize + 12 * dpiScale + maxTextWidth + 20 * dpiScale; // 增加间距
+
+  // 根据可用宽度动态计算列数，确保不会太紧密
+  const numColumns = Math.max(1, Math.floor(availableWidth / itemTotalWidth));
+
+  // 统计标题 - 与网格左边对齐
+  ctx.fillStyle = '#333333';
+  ctx.font = `bold ${statsFontSize + 2 * dpiScale}px ${STATS_FONT_FAMILY}`;
+  ctx.textAlign = 'left';
+  ctx.textBaseline = 'top';
+  ctx.fillText('豆子用量统计', gridLeft, statsStartY);
+
+  // 绘制颜色统计 - 增加标题到色块的间距
+  const itemStartY = statsStartY + 2*(statsFontSize+2*dpiScale); // 增加标题到内容的间距，防止覆盖
+
+  // 重新计算可用宽度，确保不会超出边界
+  const statsAreaWidth = gridWidth; // 使用网格宽度作为统计区域宽度
+  const actualColumnWidth = Math.floor(statsAreaWidth / numColumns);
+
+  // 计算色块内文字的字体大小 - 增大文字大小以提高可读性
+  const swatchFontSize = Math.max(10 * dpiScale, Math.min(16 * dpiScale, swatchSize / 3));
+  const countFontSize = Math.max(10 * dpiScale, statsFontSize);
+
+  sortedColorKeys.forEach((colorKey, index) => {
+    const colorData = colorCounts[colorKey];
+    const column = index % numColumns;
+    const row = Math.floor(index / numColumns);
+
+    // 统计项与网格左边对齐
+    const itemX = gridLeft + column * actualColumnWidth;
+    const itemY = itemStartY + row * (swatchSize + 16 * dpiScale); // 增加行间距防止覆盖
+
+    // 绘制色块
+    ctx.fillStyle = colorData.color;
+    ctx.fillRect(itemX, itemY, swatchSize, swatchSize);
+
+    // 绘制色块边框
+    ctx.strokeStyle = '#DDDDDD';
+    ctx.lineWidth = 1;
+    ctx.strokeRect(itemX, itemY, swatchSize, swatchSize);
+
+    // 在色块内绘制颜色代码 - colorKey就是色号
+    ctx.fillStyle = getContrastColor(colorData.color);
+    ctx.font = `bold ${swatchFontSize}px sans-serif`;
+    ctx.textAlign = 'center';
+    ctx.textBaseline = 'middle';
+    ctx.fillText(colorKey, itemX + swatchSize / 2, itemY + swatchSize / 2);
 
-    // 色块的基础尺寸（适中大小以容纳文字）
-    const baseSwatchSize = Math.max(24 * dpiScale, 28 * dpiScale);
-    const swatchSize = Math.floor(baseSwatchSize + (widthFactor * 10 * dpiScale)); // 减小增长幅度
+    // 在右侧绘制数量，垂直居中对齐
+    ctx.fillStyle = '#333333';
+    ctx.font = `${countFontSize}px ${STATS_FONT_FAMILY}`;
+    ctx.textAlign = 'left';
+    ctx.textBaseline = 'middle'; // 垂直居中
+    ctx.fillText(`${colorData.count}`, itemX + swatchSize + 12 * dpiScale, itemY + swatchSize / 2);
+  });
+
+  // 总计 - 确保有足够的空间，与网格左边对齐
+  const totalY = itemStartY + Math.ceil(sortedColorKeys.length / numColumns) * (swatchSize + 16 * dpiScale); // 增加间距
+  ctx.fillStyle = '#333333';
+  ctx.font = `bold ${statsFontSize + 1 * dpiScale}px ${STATS_FONT_FAMILY}`;
+  ctx.textAlign = 'left';
+  ctx.textBaseline = 'top';
+  ctx.fillText(`总计: ${totalBeadCount} 颗`, gridLeft, totalY);
+}
+
+// 服务器端下载图片的主函数 - 返回 Buffer 而不是下载文件
+export async function generateImageBuffer({
+  title,
+  pixelData,
+  renderMode,
+  options
+}: DownloadImage): Promise<Buffer> {
+
+  if (!pixelData || !pixelData.mappedData || !pixelData.width || !pixelData.height || pixelData.width === 0 || pixelData.height === 0) {
+    throw new Error("下载失败: 像素数据或尺寸无效。");
+  }
 
-    // 优化统计项宽度计算 - 动态计算实际需要的文字宽度
-    ctx.font = `${Math.max(10 * dpiScale, statsFontSize)}px "Noto Sans CJK SC", "Microsoft YaHei", "WenQuanYi Micro Hei", sans-serif`;
-    let maxTextWidth = 0;
-    sortedColorKeys.forEach(colorKey => {
-      const colorData = colorCounts[colorKey];
-      const textWidth = ctx.measureText(`${colorData.count}`).width;
-      maxTextWidth = Math.max(maxTextWidth, textWidth);
-    });
+  // 客户端提交的 MappedPixel[][] 只在入口处转换一次，后续统计和绘制都基于紧凑网格
+  const grid = indexedGridFromMappedData(pixelData.mappedData, pixelData.width, pixelData.height);
+  return renderGridImageBuffer(grid, { title, renderMode, options });
+}
 
-    // 每个统计项的总宽度（色块 + 间距 + 实际文字宽度 + 额外边距）
-    const itemTotalWidth = swatchSize + 12 * dpiScale + maxTextWidth + 20 * dpiScale; // 增加间距
+// 整张图片的画布像素数，用于估算渲染开销（只计算布局，不绘制）
+export function estimateGridImagePixels(grid: IndexedPixelGrid, params: PatternRenderParams): number {
+  const { options } = params;
+  const statsItemCount = options.includeStats
+    ? Object.keys(calculatePatternStats(grid, options.showTransparentLabels).colorCounts).length
+    : null;
+  const layout = computePatternLayout(grid.width, grid.height, statsItemCount, params);
+  return layout.width * layout.height;
+}
 
-    // 根据可用宽度动态计算列数，确保不会太紧密
-    const numColumns = Math.max(1, Math.floor(availableWidth / itemTotalWidth));
+// 基于紧凑网格绘制整张图纸，type 为 'svg' 时绘制到矢量画布
+function drawGridImage(grid: IndexedPixelGrid, params: PatternRenderParams, type?: 'svg'): Canvas {
+  const { title, options } = params;
+  const { colorCounts, totalBeadCount } = calculatePatternStats(grid, options.showTransparentLabels);
+  const layout = computePatternLayout(
+    grid.width,
+    grid.height,
+    options.includeStats ? Object.keys(colorCounts).length : null,
+    params
+  );
 
-    // 统计标题 - 与网格左边对齐
-    const gridLeftEdge = offsetX + extraLeftMargin + axisLabelSize;
-    const statsLeftAlign = gridLeftEdge;
+  // 创建 Node.js Canvas
+  const canvas = createCanvas(layout.width, layout.height, type);
+  const ctx = canvas.getContext('2d');
 
-    ctx.fillStyle = '#333333';
-    ctx.font = `bold ${statsFontSize + 2 * dpiScale}px "Noto Sans CJK SC", "Microsoft YaHei", "WenQuanYi Micro Hei", sans-serif`;
-    ctx.textAlign = 'left';
-    ctx.textBaseline = 'top';
-    ctx.fillText('豆子用量统计', statsLeftAlign, statsStartY);
-
-    // 绘制颜色统计 - 增加标题到色块的间距
-    const itemStartY = statsStartY + 2*(statsFontSize+2*dpiScale); // 增加标题到内容的间距，防止覆盖
-
-    // 重新计算可用宽度，确保不会超出边界
-    const statsAreaWidth = gridWidth; // 使用网格宽度作为统计区域宽度
-    const actualColumnWidth = Math.floor(statsAreaWidth / numColumns);
-
-    // 计算色块内文字的字体大小 - 增大文字大小以提高可读性
-    const swatchFontSize = Math.max(10 * dpiScale, Math.min(16 * dpiScale, swatchSize / 3));
-    const countFontSize = Math.max(10 * dpiScale, statsFontSize);
-
-    sortedColorKeys.forEach((colorKey, index) => {
-      const colorData = colorCounts[colorKey];
-      const column = index % numColumns;
-      const row = Math.floor(index / numColumns);
-
-      // 统计项与网格左边对齐
-      const itemX = gridLeftEdge + column * actualColumnWidth;
-      const itemY = itemStartY + row * (swatchSize + 16 * dpiScale); // 增加行间距防止覆盖
-
-      // 绘制色块
-      ctx.fillStyle = colorData.color;
-      ctx.fillRect(itemX, itemY, swatchSize, swatchSize);
-
-      // 绘制色块边框
-      ctx.strokeStyle = '#DDDDDD';
-      ctx.lineWidth = 1;
-      ctx.strokeRect(itemX, itemY, swatchSize, swatchSize);
-
-      // 在色块内绘制颜色代码 - colorKey就是色号
-      ctx.fillStyle = getContrastColor(colorData.color);
-      ctx.font = `bold ${swatchFontSize}px sans-serif`;
-      ctx.textAlign = 'center';
-      ctx.textBaseline = 'middle';
-      ctx.fillText(colorKey, itemX + swatchSize / 2, itemY + swatchSize / 2);
-
-      // 在右侧绘制数量，垂直居中对齐
-      ctx.fillStyle = '#333333';
-      ctx.font = `${countFontSize}px "Noto Sans CJK SC", "Microsoft YaHei", "WenQuanYi Micro Hei", sans-serif`;
-      ctx.textAlign = 'left';
-      ctx.textBaseline = 'middle'; // 垂直居中
-      ctx.fillText(`${colorData.count}`, itemX + swatchSize + 12 * dpiScale, itemY + swatchSize / 2);
-    });
-
-    // 总计 - 确保有足够的空间，与网格左边对齐
-    const totalY = itemStartY + Math.ceil(sortedColorKeys.length / numColumns) * (swatchSize + 16 * dpiScale); // 增加间距
-    ctx.fillStyle = '#333333';
-    ctx.font = `bold ${statsFontSize + 1 * dpiScale}px "Noto Sans CJK SC", "Microsoft YaHei", "WenQuanYi Micro Hei", sans-serif`;
-    ctx.textAlign = 'left';
-    ctx.textBaseline = 'top';
-    ctx.fillText(`总计: ${totalBeadCount} 颗`, gridLeftEdge, totalY);
+  drawPatternBackground(ctx, layout, title);
+  drawPatternGrid(ctx, grid, layout, { x0: 0, y0: 0, x1: grid.width, y1: grid.height }, options);
+
+  // 绘制统计信息（如果需要），调整统计区域的起始位置，使布局更紧凑
+  if (options.includeStats) {
+    drawPatternStats(ctx, layout, colorCounts, totalBeadCount, statsStartY(layout));
+  }
+  return canvas;
+}
+
+// 读取画布像素，保存为增量渲染的底图
+function capturePatternPixels(canvas: Canvas, layout: { width: number; height: number }): SharedPatternPixels {
+  const { data } = canvas.getContext('2d').getImageData(0, 0, canvas.width, canvas.height);
+  const rgba = new SharedArrayBuffer(data.byteLength);
+  new Uint8ClampedArray(rgba).set(data);
+  return { width: layout.width, height: layout.height, rgba };
+}
+
+// 基于紧凑网格绘制整张图纸，返回 PNG buffer
+export async function renderGridImageBuffer(grid: IndexedPixelGrid, params: PatternRenderParams): Promise<Buffer> {
+  return drawGridImage(grid, params).toBuffer('image/png', PNG_ENCODE_CONFIG);
+}
+
+// 基于紧凑网格绘制整张图纸，返回 PNG 数据流：编码器每输出一块数据就可以发送，不必先拼接成完整的文件
+export function renderGridImageStream(grid: IndexedPixelGrid, params: PatternRenderParams): Readable {
+  return drawGridImage(grid, params).createPNGStream(PNG_ENCODE_CONFIG);
+}
+
+/**
+ * 基于紧凑网格绘制整张图纸，返回 SVG
+ * 与相同参数的 PNG 使用同一个布局，SVG 的坐标单位即 PNG 的像素；
+ * 单元格按颜色合并为矩形，色号和坐标为矢量文字，文件大小与 dpi 无关
+ */
+export function renderGridImageSvg(grid: IndexedPixelGrid, params: PatternRenderParams): Buffer {
+  return drawGridImage(grid, params, 'svg').toBuffer();
+}
+
+/**
+ * 增量渲染整张图纸：在底图上只重绘修改过的单元格和统计区域，返回 PNG buffer
+ * base 为 null 时先完整绘制 baseGrid，并在结果中返回它的像素供调用方缓存；
+ * 修改改变了统计区域的行数（图片高度变化）时整张重绘
+ * @param grid 修改后的网格
+ * @param cells 修改过的单元格下标
+ */
+export function renderPatchedGridImageBuffer(
+  grid: IndexedPixelGrid,
+  params: PatternRenderParams,
+  cells: ArrayLike<number>,
+  base: SharedPatternPixels | null,
+  baseGrid: IndexedPixelGrid | null
+): { data: Buffer; base: SharedPatternPixels | null } {
+  const { options } = params;
+  let canvas: Canvas;
+  let basePixels = base;
+  let capturedBase: SharedPatternPixels | null = null;
+  if (base) {
+    canvas = createCanvas(base.width, base.height);
+    const ctx = canvas.getContext('2d');
+    const imageData = ctx.createImageData(canvas.width, canvas.height);
+    imageData.data.set(new Uint8ClampedArray(base.rgba));
+    ctx.putImageData(imageData, 0, 0);
+  } else {
+    if (!baseGrid) {
+      throw new Error('增量渲染缺少底图');
+    }
+    canvas = drawGridImage(baseGrid, params);
+    const baseStats = calculatePatternStats(baseGrid, options.showTransparentLabels);
+    const baseLayout = computePatternLayout(
+      baseGrid.width,
+      baseGrid.height,
+      options.includeStats ? Object.keys(baseStats.colorCounts).length : null,
+      params
+    );
+    basePixels = capturedBase = capturePatternPixels(canvas, baseLayout);
   }
 
-  // 返回PNG buffer
-  return canvas.toBuffer('image/png');
+  const { colorCounts, totalBeadCount } = calculatePatternStats(grid, options.showTransparentLabels);
+  const layout = computePatternLayout(
+    grid.width,
+    grid.height,
+    options.includeStats ? Object.keys(colorCounts).length : null,
+    params
+  );
+  if (layout.width !== basePixels!.width || layout.height !== basePixels!.height) {
+    return { data: drawGridImage(grid, params).toBuffer('image/png', PNG_ENCODE_CONFIG), base: capturedBase };
+  }
+
+  const ctx = canvas.getContext('2d');
+  redrawPatternCells(ctx, grid, layout, cells, options);
+  if (options.includeStats) {
+    // 清除网格外边框下方的统计区域后重绘
+    const clearTop = layout.gridTop + layout.gridHeight + 8 * layout.dpiScale;
+    ctx.fillStyle = '#FFFFFF';
+    ctx.fillRect(0, clearTop, layout.width, layout.height - clearTop);
+    drawPatternStats(ctx, layout, colorCounts, totalBeadCount, statsStartY(layout));
+  }
+  return { data: canvas.toBuffer('image/png', PNG_ENCODE_CONFIG), base: capturedBase };
 }
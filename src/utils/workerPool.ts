@@ -0,0 +1,218 @@
+// 通用的 worker_threads 线程池
+// 每个工作线程同一时间只处理一个任务；所有线程都忙时任务进入有界队列，队列已满时立即拒绝。
+// 队列按任务优先级排序（值越小越先执行，相同优先级按提交顺序）。
+// 可以为任务指定开销，同时执行的任务开销之和不超过 maxCost；没有任务在执行时，开销超出上限的任务也会单独执行。
+// 工作线程约定：收到任务数据后回复 { ok: true, result } 或 { ok: false, error }。
+import { Worker, TransferListItem } from 'worker_threads';
+
+// 队列已满时抛出的错误，调用方据此返回"服务繁忙"响应
+export class WorkerPoolOverloadedError extends Error {
+  constructor(message: string = '服务繁忙，任务队列已满') {
+    super(message);
+    this.name = 'WorkerPoolOverloadedError';
+  }
+}
+
+export interface WorkerPoolStats {
+  size: number;
+  started: number;
+  busy: number;
+  queued: number;
+  maxQueueLength: number;
+}
+
+export type WorkerResponse<TResult> =
+  | { ok: true; result: TResult }
+  | { ok: false; error: string };
+
+export interface WorkerTaskOptions {
+  // 优先级，值越小越先执行，默认 0
+  priority?: number;
+  // 任务开销（单位由调用方决定，例如像素数），默认 0
+  cost?: number;
+}
+
+interface PoolTask<TPayload, TResult> {
+  payload: TPayload;
+  transferList: TransferListItem[];
+  priority: number;
+  cost: number;
+  resolve: (result: TResult) => void;
+  reject: (error: Error) => void;
+}
+
+export class WorkerPool<TPayload, TResult> {
+  private readonly workers = new Set<Worker>();
+  private readonly idleWorkers: Worker[] = [];
+  private readonly runningTasks = new Map<Worker, PoolTask<TPayload, TResult>>();
+  private readonly queue: PoolTask<TPayload, TResult>[] = [];
+  private runningCost = 0;
+
+  /**
+   * @param createWorker 创建工作线程的函数，线程按需创建
+   * @param size 最大工作线程数量
+   * @param maxQueueLength 最大排队任务数
+   * @param maxCost 同时执行的任务开销之和的上限
+   */
+  constructor(
+    private readonly createWorker: () => Worker,
+    private readonly size: number,
+    private readonly maxQueueLength: number,
+    private readonly maxCost: number = Infinity
+  ) {}
+
+  /**
+   * 提交任务
+   * @param payload 任务数据
+   * @param transferList 需要转移所有权的 ArrayBuffer 等对象（提交后在调用线程中不可再用）
+   * @param ignoreQueueLimit 为 true 时即使队列已满也排队（用于已被接受的任务拆分出的子任务）
+   * @param options 任务的优先级和开销
+   */
+  run(
+    payload: TPayload,
+    transferList: TransferListItem[] = [],
+    ignoreQueueLimit: boolean = false,
+    { priority = 0, cost = 0 }: WorkerTaskOptions = {}
+  ): Promise<TResult> {
+    return new Promise<TResult>((resolve, reject) => {
+      const task: PoolTask<TPayload, TResult> = { payload, transferList, priority, cost, resolve, reject };
+      if (ignoreQueueLimit || this.queue.length < this.maxQueueLength || (this.queue.length === 0 && this.canStart(task))) {
+        this.enqueue(task);
+        this.drainQueue();
+      } else {
+        reject(new WorkerPoolOverloadedError());
+      }
+    });
+  }
+
+  // 没有空闲线程、线程数已达上限且队列已满，此时提交的任务会被拒绝
+  isOverloaded(): boolean {
+    return this.idleWorkers.length === 0
+      && this.workers.size >= this.size
+      && this.queue.length >= this.maxQueueLength;
+  }
+
+  // 正在执行的任务开销之和
+  getRunningCost(): number {
+    return this.runningCost;
+  }
+
+  getStats(): WorkerPoolStats {
+    return {
+      size: this.size,
+      started: this.workers.size,
+      busy: this.runningTasks.size,
+      queued: this.queue.length,
+      maxQueueLength: this.maxQueueLength
+    };
+  }
+
+  // 关闭所有工作线程，未完成的任务全部拒绝
+  async destroy(): Promise<void> {
+    const pendingTasks = [...this.runningTasks.values(), ...this.queue.splice(0)];
+    const workers = [...this.workers];
+    this.workers.clear();
+    this.idleWorkers.length = 0;
+    this.runningTasks.clear();
+    this.runningCost = 0;
+    pendingTasks.forEach(task => task.reject(new Error('线程池已关闭')));
+    await Promise.all(workers.map(worker => worker.terminate()));
+  }
+
+  // 取得空闲线程，没有空闲线程且未达到上限时创建新线程
+  private acquireWorker(): Worker | null {
+    const idleWorker = this.idleWorkers.pop();
+    if (idleWorker) {
+      return idleWorker;
+    }
+    if (this.workers.size < this.size) {
+      return this.spawnWorker();
+    }
+    return null;
+  }
+
+  private spawnWorker(): Worker {
+    const worker = this.createWorker();
+    // 空闲线程不阻止进程退出
+    worker.unref();
+    this.workers.add(worker);
+
+    worker.on('message', (response: WorkerResponse<TResult>) => {
+      const task = this.runningTasks.get(worker);
+      this.finishTask(worker);
+      if (task) {
+        if (response.ok) {
+          task.resolve(response.result);
+        } else {
+          task.reject(new Error(response.error));
+        }
+      }
+      this.release(worker);
+    });
+
+    // 线程异常退出时拒绝正在处理的任务，并由后续任务按需创建新线程
+    const handleFailure = (error: Error) => {
+      if (!this.workers.delete(worker)) return;
+      const task = this.runningTasks.get(worker);
+      this.finishTask(worker);
+      const idleIndex = this.idleWorkers.indexOf(worker);
+      if (idleIndex !== -1) this.idleWorkers.splice(idleIndex, 1);
+      task?.reject(error);
+      this.drainQueue();
+    };
+    worker.on('error', handleFailure);
+    worker.on('exit', code => handleFailure(new Error(`工作线程异常退出，退出码 ${code}`)));
+
+    return worker;
+  }
+
+  // 有空闲（或可以新建的）线程，且任务开销不超出剩余额度
+  private canStart(task: PoolTask<TPayload, TResult>): boolean {
+    const hasWorker = this.idleWorkers.length > 0 || this.workers.size < this.size;
+    return hasWorker && (this.runningCost === 0 || this.runningCost + task.cost <= this.maxCost);
+  }
+
+  // 按优先级插入队列，相同优先级的任务排在已有任务之后
+  private enqueue(task: PoolTask<TPayload, TResult>): void {
+    let index = this.queue.length;
+    while (index > 0 && this.queue[index - 1].priority > task.priority) {
+      index--;
+    }
+    this.queue.splice(index, 0, task);
+  }
+
+  private dispatch(worker: Worker, task: PoolTask<TPayload, TResult>): void {
+    this.runningTasks.set(worker, task);
+    this.runningCost += task.cost;
+    try {
+      worker.postMessage(task.payload, task.transferList);
+    } catch (error) {
+      // 任务数据无法序列化，线程本身仍然可用
+      this.finishTask(worker);
+      task.reject(error instanceof Error ? error : new Error(String(error)));
+      this.release(worker);
+    }
+  }
+
+  private finishTask(worker: Worker): void {
+    const task = this.runningTasks.get(worker);
+    if (task) {
+      this.runningTasks.delete(worker);
+      this.runningCost -= task.cost;
+    }
+  }
+
+  private release(worker: Worker): void {
+    if (!this.workers.has(worker)) return;
+    this.idleWorkers.push(worker);
+    this.drainQueue();
+  }
+
+  // 按优先级顺序启动排队中的任务，队首任务的开销超出剩余额度时等待正在执行的任务完成
+  private drainQueue(): void {
+    while (this.queue.length > 0 && this.canStart(this.queue[0])) {
+      const worker = this.acquireWorker()!;
+      this.dispatch(worker, this.queue.shift()!);
+    }
+  }
+}
@@ -0,0 +1,181 @@
+// 最小的 ZIP 读写实现：读取批量转换时上传的图片压缩包，以及流式生成分页下载的压缩包
+// 读取时只读取中央目录，支持未压缩（stored）和 deflate 两种方式；不支持加密和 ZIP64。
+import { inflateRawSync } from 'zlib';
+
+const END_OF_CENTRAL_DIRECTORY_SIGNATURE = 0x06054b50;
+const CENTRAL_DIRECTORY_SIGNATURE = 0x02014b50;
+const LOCAL_FILE_HEADER_SIGNATURE = 0x04034b50;
+// 中央目录结束记录的固定长度，之后最多跟随 65535 字节的注释
+const END_OF_CENTRAL_DIRECTORY_SIZE = 22;
+const METHOD_STORED = 0;
+const METHOD_DEFLATE = 8;
+// 通用标志第 11 位：文件名使用 UTF-8 编码
+const FLAG_UTF8 = 0x800;
+
+export interface ZipEntry {
+  // 压缩包内的路径
+  name: string;
+  // 解压后的大小（中央目录中声明的值，未压缩的文件取两者中较大的一个）
+  size: number;
+  // 解压文件内容，每次调用都会重新解压，按需读取以免同时占用所有文件的内存
+  // 解压后的数据不会超过 size，超过时抛出异常
+  read(): Buffer;
+}
+
+function findEndOfCentralDirectory(archive: Buffer): number {
+  const minOffset = Math.max(0, archive.length - END_OF_CENTRAL_DIRECTORY_SIZE - 0xffff);
+  for (let offset = archive.length - END_OF_CENTRAL_DIRECTORY_SIZE; offset >= minOffset; offset--) {
+    if (archive.readUInt32LE(offset) === END_OF_CENTRAL_DIRECTORY_SIGNATURE) {
+      return offset;
+    }
+  }
+  throw new Error('不是有效的 ZIP 文件');
+}
+
+/**
+ * 列出压缩包中的文件（不包括目录）
+ * 格式错误或使用了不支持的特性时抛出异常
+ * @param maxEntrySize 单个文件解压后的大小上限（字节），size 超出上限的文件在 read() 时直接拒绝，不会解压
+ */
+export function readZipEntries(archive: Buffer, maxEntrySize = 0xffffffff): ZipEntry[] {
+  const endOffset = findEndOfCentralDirectory(archive);
+  const entryCount = archive.readUInt16LE(endOffset + 10);
+  let offset = archive.readUInt32LE(endOffset + 16);
+  if (entryCount === 0xffff || offset === 0xffffffff) {
+    throw new Error('不支持 ZIP64 格式的压缩包');
+  }
+
+  const entries: ZipEntry[] = [];
+  for (let index = 0; index < entryCount; index++) {
+    if (offset + 46 > archive.length || archive.readUInt32LE(offset) !== CENTRAL_DIRECTORY_SIGNATURE) {
+      throw new Error('ZIP 中央目录已损坏');
+    }
+    const flags = archive.readUInt16LE(offset + 8);
+    const method = archive.readUInt16LE(offset + 10);
+    const compressedSize = archive.readUInt32LE(offset + 20);
+    const uncompressedSize = archive.readUInt32LE(offset + 24);
+    const nameLength = archive.readUInt16LE(offset + 28);
+    const extraLength = archive.readUInt16LE(offset + 30);
+    const commentLength = archive.readUInt16LE(offset + 32);
+    const localHeaderOffset = archive.readUInt32LE(offset + 42);
+    // 第 11 位表示文件名使用 UTF-8 编码，否则按 latin1 读取
+    const name = archive.toString(flags & FLAG_UTF8 ? 'utf8' : 'latin1', offset + 46, offset + 46 + nameLength);
+    offset += 46 + nameLength + extraLength + commentLength;
+
+    if (name.endsWith('/')) {
+      continue;
+    }
+    if (flags & 0x1) {
+      throw new Error(`不支持加密的文件: ${name}`);
+    }
+    if (method !== METHOD_STORED && method !== METHOD_DEFLATE) {
+      throw new Error(`不支持的压缩方式 ${method}: ${name}`);
+    }
+
+    // 未压缩的文件按实际存储的数据量计算，避免声明的大小偏小
+    const size = method === METHOD_STORED ? Math.max(uncompressedSize, compressedSize) : uncompressedSize;
+    entries.push({
+      name,
+      size,
+      read: () => {
+        if (size > maxEntrySize) {
+          throw new Error(`${name} 解压后 ${size} 字节，超过单个文件上限 ${maxEntrySize} 字节`);
+        }
+        if (archive.readUInt32LE(localHeaderOffset) !== LOCAL_FILE_HEADER_SIGNATURE) {
+          throw new Error(`ZIP 文件头已损坏: ${name}`);
+        }
+        // 本地文件头中的文件名和扩展字段长度可能与中央目录不同
+        const dataOffset = localHeaderOffset + 30
+          + archive.readUInt16LE(localHeaderOffset + 26)
+          + archive.readUInt16LE(localHeaderOffset + 28);
+        const data = archive.subarray(dataOffset, dataOffset + compressedSize);
+        // 解压结果超过声明的大小时 inflateRawSync 抛出异常，实际占用的内存不会超过上限
+        return method === METHOD_STORED
+          ? Buffer.from(data)
+          : inflateRawSync(data, { maxOutputLength: Math.max(Math.min(size, maxEntrySize), 1) });
+      }
+    });
+  }
+  return entries;
+}
+
+// CRC-32（多项式 0xEDB88320）查找表
+const CRC32_TABLE = (() => {
+  const table = new Uint32Array(256);
+  for (let n = 0; n < 256; n++) {
+    let c = n;
+    for (let k = 0; k < 8; k++) {
+      c = c & 1 ? 0xedb88320 ^ (c >>> 1) : c >>> 1;
+    }
+    table[n] = c >>> 0;
+  }
+  return table;
+})();
+
+function crc32(data: Buffer): number {
+  let crc = 0xffffffff;
+  for (let index = 0; index < data.length; index++) {
+    crc = CRC32_TABLE[(crc ^ data[index]) & 0xff] ^ (crc >>> 8);
+  }
+  return (crc ^ 0xffffffff) >>> 0;
+}
+
+export interface ZipOutputEntry {
+  name: string;
+  data: Buffer;
+}
+
+/**
+ * 流式生成 ZIP 压缩包：每个文件读到后立即输出文件头和内容，最后输出中央目录
+ * 文件以未压缩（stored）方式保存（PNG 等已压缩的数据再 deflate 收益很小），同一时间只持有一个文件的内容
+ */
+export async function* createZipStream(entries: AsyncIterable<ZipOutputEntry> | Iterable<ZipOutputEntry>): AsyncGenerator<Buffer> {
+  const centralDirectory: Buffer[] = [];
+  let entryCount = 0;
+  let offset = 0;
+
+  for await (const { name, data } of entries) {
+    const nameBytes = Buffer.from(name, 'utf8');
+    const crc = crc32(data);
+    if (offset + data.length > 0xffffffff || entryCount >= 0xffff) {
+      throw new Error('压缩包过大，不支持 ZIP64 格式');
+    }
+
+    const localHeader = Buffer.alloc(30);
+    localHeader.writeUInt32LE(LOCAL_FILE_HEADER_SIGNATURE, 0);
+    localHeader.writeUInt16LE(20, 4); // 解压所需版本
+    localHeader.writeUInt16LE(FLAG_UTF8, 6);
+    localHeader.writeUInt16LE(METHOD_STORED, 8);
+    localHeader.writeUInt32LE(crc, 14);
+    localHeader.writeUInt32LE(data.length, 18);
+    localHeader.writeUInt32LE(data.length, 22);
+    localHeader.writeUInt16LE(nameBytes.length, 26);
+
+    const centralHeader = Buffer.alloc(46);
+    centralHeader.writeUInt32LE(CENTRAL_DIRECTORY_SIGNATURE, 0);
+    centralHeader.writeUInt16LE(20, 4); // 创建版本
+    centralHeader.writeUInt16LE(20, 6); // 解压所需版本
+    centralHeader.writeUInt16LE(FLAG_UTF8, 8);
+    centralHeader.writeUInt16LE(METHOD_STORED, 10);
+    centralHeader.writeUInt32LE(crc, 16);
+    centralHeader.writeUInt32LE(data.length, 20);
+    centralHeader.writeUInt32LE(data.length, 24);
+    centralHeader.writeUInt16LE(nameBytes.length, 28);
+    centralHeader.writeUInt32LE(offset, 42);
+    centralDirectory.push(centralHeader, nameBytes);
+    entryCount++;
+
+    yield Buffer.concat([localHeader, nameBytes]);
+    yield data;
+    offset += localHeader.length + nameBytes.length + data.length;
+  }
+
+  const directory = Buffer.concat(centralDirectory);
+  const end = Buffer.alloc(END_OF_CENTRAL_DIRECTORY_SIZE);
+  end.writeUInt32LE(END_OF_CENTRAL_DIRECTORY_SIGNATURE, 0);
+  end.writeUInt16LE(entryCount, 8);
+  end.writeUInt16LE(entryCount, 10);
+  end.writeUInt32LE(directory.length, 12);
+  end.writeUInt32LE(offset, 16);
+  yield Buffer.concat([directory, end]);
+}
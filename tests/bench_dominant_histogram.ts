@@ -0,0 +1,124 @@
+/**
+ * 主导色直方图基准测试
+ * 比较原来以 `${r},${g},${b}` 字符串为键的单元格统计与 PackedColorHistogram 的耗时，
+ * 并逐个单元格检查 pixelateImageData 的结果与字符串实现完全一致（包括计数相同时的取舍规则）。
+ *
+ * 运行: npm run bench:histogram  (即 npx tsx tests/bench_dominant_histogram.ts)
+ */
+import {
+  pixelateImageData,
+  CompatibleImageData,
+  PaletteColor,
+  PixelationMode,
+  RgbColor,
+  hexToRgb
+} from '../src/utils/pixelation';
+import { getPaletteIndex } from '../src/utils/paletteIndex';
+import { getMardToHexMapping } from '../src/utils/colorSystemUtils';
+
+const IMAGE_WIDTH = 1600;
+const IMAGE_HEIGHT = 1200;
+const GRANULARITIES = [5, 50, 200];
+const ROUNDS = 3;
+
+function createImage(pixel: (x: number, y: number, noise: number) => [number, number, number, number]): CompatibleImageData {
+  const data = new Uint8ClampedArray(IMAGE_WIDTH * IMAGE_HEIGHT * 4);
+  let seed = 12345;
+  for (let y = 0; y < IMAGE_HEIGHT; y++) {
+    for (let x = 0; x < IMAGE_WIDTH; x++) {
+      seed = (Math.imul(seed, 1103515245) + 12345) >>> 0;
+      data.set(pixel(x, y, (seed >>> 16) & 0xff), (y * IMAGE_WIDTH + x) * 4);
+    }
+  }
+  return { data, width: IMAGE_WIDTH, height: IMAGE_HEIGHT };
+}
+
+const IMAGES: { name: string; image: CompatibleImageData }[] = [
+  // 大面积纯色（卡通图）
+  { name: '色块', image: createImage((x, y) => [(x >> 7) * 40, (y >> 7) * 60, ((x + y) >> 8) * 30, 255]) },
+  // 每个像素颜色都不同（照片噪声），直方图最大
+  { name: '噪声', image: createImage((x, y, noise) => [(x + noise) & 0xff, (y * 3 + noise) & 0xff, noise, 255]) },
+  // 两种颜色交替，大量计数相同的情况；左上角透明
+  { name: '棋盘', image: createImage((x, y) => (x + y) % 2 ? [255, 0, 0, x < 200 && y < 200 ? 0 : 255] : [0, 0, 255, 255]) }
+];
+
+// 原实现：字符串为键的对象计数
+function stringKeyedDominantColor(imageData: CompatibleImageData, startX: number, startY: number, width: number, height: number): RgbColor | null {
+  const data = imageData.data;
+  const colorCountsInCell: { [key: string]: number } = {};
+  let dominantColorRgb: RgbColor | null = null;
+  let maxCount = 0;
+  for (let y = startY; y < startY + height; y++) {
+    for (let x = startX; x < startX + width; x++) {
+      const index = (y * imageData.width + x) * 4;
+      if (data[index + 3] < 128) continue;
+      const r = data[index];
+      const g = data[index + 1];
+      const b = data[index + 2];
+      const colorKey = `${r},${g},${b}`;
+      colorCountsInCell[colorKey] = (colorCountsInCell[colorKey] || 0) + 1;
+      if (colorCountsInCell[colorKey] > maxCount) {
+        maxCount = colorCountsInCell[colorKey];
+        dominantColorRgb = { r, g, b };
+      }
+    }
+  }
+  return dominantColorRgb;
+}
+
+// 与 pixelateImageData 相同的网格划分，代表色使用字符串实现
+function referencePixelate(imageData: CompatibleImageData, N: number, M: number, palette: PaletteColor[]): Uint16Array {
+  const indices = new Uint16Array(N * M);
+  const paletteIndex = getPaletteIndex(palette);
+  const cellWidth = imageData.width / N;
+  const cellHeight = imageData.height / M;
+  for (let j = 0; j < M; j++) {
+    for (let i = 0; i < N; i++) {
+      const startX = Math.floor(i * cellWidth);
+      const startY = Math.floor(j * cellHeight);
+      const endX = Math.min(imageData.width, Math.ceil((i + 1) * cellWidth));
+      const endY = Math.min(imageData.height, Math.ceil((j + 1) * cellHeight));
+      const rgb = stringKeyedDominantColor(imageData, startX, startY, Math.max(1, endX - startX), Math.max(1, endY - startY));
+      indices[j * N + i] = rgb ? paletteIndex.nearestIndex(rgb.r, rgb.g, rgb.b) : 0;
+    }
+  }
+  return indices;
+}
+
+function timeBest(run: () => Uint16Array): { time: number; result: Uint16Array } {
+  let time = Infinity;
+  let result = new Uint16Array(0);
+  for (let round = 0; round < ROUNDS; round++) {
+    const start = performance.now();
+    result = run();
+    time = Math.min(time, performance.now() - start);
+  }
+  return { time, result };
+}
+
+function main() {
+  const palette = Object.entries(getMardToHexMapping()).map(([key, hex]) => ({ key, hex, rgb: hexToRgb(hex)! }));
+  console.log(`${'图片'.padEnd(6)}${'粒度'.padStart(6)}${'字符串键(ms)'.padStart(14)}${'整数直方图(ms)'.padStart(16)}${'加速比'.padStart(8)}  结果一致`);
+
+  let allMatched = true;
+  for (const { name, image } of IMAGES) {
+    for (const N of GRANULARITIES) {
+      const M = Math.max(1, Math.round(N * IMAGE_HEIGHT / IMAGE_WIDTH));
+      const reference = timeBest(() => referencePixelate(image, N, M, palette));
+      // 备用色取调色板第一个颜色，与参考实现中全透明单元格的下标 0 一致
+      const packed = timeBest(() => pixelateImageData(image, N, M, palette, PixelationMode.Dominant, palette[0]).indices);
+      const matched = reference.result.every((value, cellIndex) => value === packed.result[cellIndex]);
+      allMatched = allMatched && matched;
+      console.log(
+        `${name.padEnd(6)}${String(N).padStart(8)}${reference.time.toFixed(1).padStart(14)}${packed.time.toFixed(1).padStart(16)}` +
+        `${(reference.time / packed.time).toFixed(1).padStart(9)}x  ${matched ? '✅' : '❌'}`
+      );
+    }
+  }
+
+  if (!allMatched) {
+    process.exitCode = 1;
+  }
+}
+
+main();
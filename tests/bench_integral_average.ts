@@ -0,0 +1,80 @@
+/**
+ * 平均色积分图基准测试
+ * 模拟一次生成多个尺寸的图纸：比较每个粒度都逐像素累加，与先构建一次积分图再按单元格查表的总耗时，
+ * 并逐个单元格检查两种方式的结果完全一致（包括半透明像素的处理）。
+ *
+ * 运行: npm run bench:integral  (即 npx tsx tests/bench_integral_average.ts)
+ */
+import { pixelateImageData, CompatibleImageData, PixelationMode, hexToRgb } from '../src/utils/pixelation';
+import { buildIntegralImage, getIntegralImageByteLength } from '../src/utils/integralImage';
+import { getMardToHexMapping } from '../src/utils/colorSystemUtils';
+
+const IMAGE_SIZES: Array<[number, number]> = [[1600, 1200], [4000, 3000]];
+const GRANULARITIES = [30, 50, 80, 120, 200];
+const ROUNDS = 3;
+
+// 渐变加噪声，左上角一块半透明区域
+function createImage(width: number, height: number): CompatibleImageData {
+  const data = new Uint8ClampedArray(width * height * 4);
+  let seed = 12345;
+  for (let y = 0; y < height; y++) {
+    for (let x = 0; x < width; x++) {
+      seed = (Math.imul(seed, 1103515245) + 12345) >>> 0;
+      const noise = (seed >>> 16) & 0x3f;
+      const index = (y * width + x) * 4;
+      data[index] = (x * 255 / width + noise) & 0xff;
+      data[index + 1] = (y * 255 / height + noise) & 0xff;
+      data[index + 2] = ((x + y) & 0xff) ^ noise;
+      data[index + 3] = x < width / 4 && y < height / 4 ? noise * 4 : 255;
+    }
+  }
+  return { data, width, height };
+}
+
+function timeBest<T>(run: () => T): { time: number; result: T } {
+  let time = Infinity;
+  let result = run();
+  for (let round = 0; round < ROUNDS; round++) {
+    const start = performance.now();
+    result = run();
+    time = Math.min(time, performance.now() - start);
+  }
+  return { time, result };
+}
+
+function main() {
+  const palette = Object.entries(getMardToHexMapping()).map(([key, hex]) => ({ key, hex, rgb: hexToRgb(hex)! }));
+  console.log(`粒度: ${GRANULARITIES.join(', ')}`);
+  console.log(`${'图片尺寸'.padEnd(12)}${'逐像素(ms)'.padStart(12)}${'构建积分图(ms)'.padStart(16)}${'查表(ms)'.padStart(10)}${'加速比'.padStart(8)}  结果一致`);
+
+  let allMatched = true;
+  for (const [width, height] of IMAGE_SIZES) {
+    const image = createImage(width, height);
+    const gridSizes = GRANULARITIES.map(N => [N, Math.max(1, Math.round(N * height / width))]);
+
+    const direct = timeBest(() => gridSizes.map(([N, M]) =>
+      pixelateImageData(image, N, M, palette, PixelationMode.Average, palette[0]).indices));
+    const build = timeBest(() => {
+      const integral = new Uint32Array(getIntegralImageByteLength(width, height) / Uint32Array.BYTES_PER_ELEMENT);
+      buildIntegralImage(image.data, width, height, integral);
+      return integral;
+    });
+    const lookup = timeBest(() => gridSizes.map(([N, M]) =>
+      pixelateImageData(image, N, M, palette, PixelationMode.Average, palette[0], build.result).indices));
+
+    const matched = direct.result.every((indices, sizeIndex) =>
+      indices.every((value, cellIndex) => value === lookup.result[sizeIndex][cellIndex]));
+    allMatched = allMatched && matched;
+    const integralTotal = build.time + lookup.time;
+    console.log(
+      `${`${width}x${height}`.padEnd(14)}${direct.time.toFixed(1).padStart(12)}${build.time.toFixed(1).padStart(16)}` +
+      `${lookup.time.toFixed(1).padStart(10)}${(direct.time / integralTotal).toFixed(1).padStart(9)}x  ${matched ? '✅' : '❌'}`
+    );
+  }
+
+  if (!allMatched) {
+    process.exitCode = 1;
+  }
+}
+
+main();
@@ -0,0 +1,100 @@
+/**
+ * 调色板最近色索引基准测试
+ * 对默认290色调色板以及 src/assert/ 中的所有预制调色板，
+ * 比较 findClosestPaletteColor 线性扫描与 PaletteIndex 查询的结果和耗时。
+ *
+ * 运行: npm run bench:palette  (即 npx tsx tests/bench_palette_index.ts)
+ */
+import * as fs from 'fs';
+import * as path from 'path';
+import { findClosestPaletteColor, hexToRgb, PaletteColor, RgbColor } from '../src/utils/pixelation';
+import { buildPaletteIndex } from '../src/utils/paletteIndex';
+import { getColorKeyByHex, getMardToHexMapping } from '../src/utils/colorSystemUtils';
+
+const RANDOM_SAMPLES = 200000;
+const SWEEP_STEP = 5;
+
+function toPalette(hexValues: string[]): PaletteColor[] {
+  return hexValues
+    .map(hex => {
+      const rgb = hexToRgb(hex);
+      return rgb ? { key: getColorKeyByHex(hex, 'MARD'), hex: hex.toUpperCase(), rgb } : null;
+    })
+    .filter((color): color is PaletteColor => color !== null);
+}
+
+function loadPalettes(): { name: string; palette: PaletteColor[] }[] {
+  const palettes = [{ name: '290色(默认)', palette: toPalette(Object.values(getMardToHexMapping())) }];
+  const assertDir = path.join(__dirname, '..', 'src', 'assert');
+  for (const file of fs.readdirSync(assertDir).filter(f => f.endsWith('.json')).sort()) {
+    const data = JSON.parse(fs.readFileSync(path.join(assertDir, file), 'utf-8'));
+    palettes.push({ name: data.name || path.basename(file, '.json'), palette: toPalette(data.selectedHexValues) });
+  }
+  return palettes;
+}
+
+// 固定种子的线性同余随机数，保证每次运行的样本一致
+function createSamples(palette: PaletteColor[]): RgbColor[] {
+  const samples: RgbColor[] = [];
+  let seed = 12345;
+  const next = () => {
+    seed = (Math.imul(seed, 1103515245) + 12345) >>> 0;
+    return (seed >>> 16) & 0xff;
+  };
+  for (let i = 0; i < RANDOM_SAMPLES; i++) {
+    samples.push({ r: next(), g: next(), b: next() });
+  }
+  // 均匀扫描整个RGB立方体
+  for (let r = 0; r < 256; r += SWEEP_STEP) {
+    for (let g = 0; g < 256; g += SWEEP_STEP) {
+      for (let b = 0; b < 256; b += SWEEP_STEP) {
+        samples.push({ r, g, b });
+      }
+    }
+  }
+  // 调色板颜色本身（完全匹配的情况）
+  palette.forEach(color => samples.push({ ...color.rgb }));
+  return samples;
+}
+
+function main() {
+  console.log(`${'调色板'.padEnd(14)}${'颜色数'.padStart(6)}${'样本数'.padStart(10)}${'线性扫描(ms)'.padStart(14)}${'索引首次(ms)'.padStart(14)}${'索引复用(ms)'.padStart(14)}${'加速比'.padStart(8)}  结果一致`);
+
+  let allMatched = true;
+  for (const { name, palette } of loadPalettes()) {
+    const samples = createSamples(palette);
+
+    let start = performance.now();
+    const linearResults = samples.map(rgb => findClosestPaletteColor(rgb, palette));
+    const linearTime = performance.now() - start;
+
+    // 计时包含索引构建（按需构建桶）的开销
+    start = performance.now();
+    const index = buildPaletteIndex(palette);
+    const indexedResults = samples.map(rgb => palette[index.nearestIndex(rgb.r, rgb.g, rgb.b)]);
+    const indexedTime = performance.now() - start;
+
+    // 同一索引再次查询（跨请求复用已缓存的调色板索引时的情况）
+    start = performance.now();
+    samples.forEach(rgb => index.nearestIndex(rgb.r, rgb.g, rgb.b));
+    const warmTime = performance.now() - start;
+
+    let mismatches = 0;
+    for (let i = 0; i < samples.length; i++) {
+      if (linearResults[i] !== indexedResults[i]) mismatches++;
+    }
+    allMatched = allMatched && mismatches === 0;
+
+    console.log(
+      `${name.padEnd(14)}${String(palette.length).padStart(6)}${String(samples.length).padStart(10)}` +
+      `${linearTime.toFixed(1).padStart(14)}${indexedTime.toFixed(1).padStart(14)}${warmTime.toFixed(1).padStart(14)}` +
+      `${(linearTime / warmTime).toFixed(1).padStart(7)}x  ${mismatches === 0 ? '✅' : `❌ ${mismatches} 处不一致`}`
+    );
+  }
+
+  if (!allMatched) {
+    process.exitCode = 1;
+  }
+}
+
+main();
@@ -0,0 +1,151 @@
+/**
+ * 分段并行像素化基准测试
+ * 生成一张 6000x4000 的合成图片（放入 SharedArrayBuffer），以粒度 200 分别用 1..N 个工作线程
+ * 按行分段像素化，与单线程 pixelateImageData 的结果逐个单元格比较，并输出加速曲线。
+ *
+ * 运行: npm run bench:parallel  (即 npx tsx tests/bench_parallel_pixelation.ts)
+ * 可选参数: 最大线程数，默认为 CPU 核数
+ */
+import * as os from 'os';
+import { Worker, isMainThread, parentPort } from 'worker_threads';
+import {
+  pixelateImageData,
+  pixelateRowBand,
+  createFallbackGrid,
+  splitRowBands,
+  CompatibleImageData,
+  PaletteColor,
+  PixelationMode,
+  hexToRgb
+} from '../src/utils/pixelation';
+import { getMardToHexMapping } from '../src/utils/colorSystemUtils';
+import { WorkerPool, WorkerResponse } from '../src/utils/workerPool';
+
+const IMAGE_WIDTH = 6000;
+const IMAGE_HEIGHT = 4000;
+const GRANULARITY = 200;
+const ROUNDS = 3;
+
+interface BandTask {
+  rgba: SharedArrayBuffer;
+  width: number;
+  height: number;
+  N: number;
+  M: number;
+  rowStart: number;
+  rowEnd: number;
+  palette: PaletteColor[];
+  mode: PixelationMode;
+  fallbackIndex: number;
+}
+
+function loadPalette(): PaletteColor[] {
+  return Object.entries(getMardToHexMapping()).map(([key, hex]) => ({ key, hex, rgb: hexToRgb(hex)! }));
+}
+
+// 色块 + 噪声 + 透明区域的合成图片，使 dominant 模式的直方图有足够多的不同颜色
+function createImage(): CompatibleImageData {
+  const rgba = new SharedArrayBuffer(IMAGE_WIDTH * IMAGE_HEIGHT * 4);
+  const data = new Uint8ClampedArray(rgba);
+  let seed = 12345;
+  for (let y = 0; y < IMAGE_HEIGHT; y++) {
+    for (let x = 0; x < IMAGE_WIDTH; x++) {
+      seed = (Math.imul(seed, 1103515245) + 12345) >>> 0;
+      const noise = (seed >>> 16) & 0x0f;
+      const index = (y * IMAGE_WIDTH + x) * 4;
+      data[index] = ((x >> 6) * 37 + noise) & 0xff;
+      data[index + 1] = ((y >> 6) * 53 + noise) & 0xff;
+      data[index + 2] = (((x + y) >> 7) * 71) & 0xff;
+      data[index + 3] = x < 300 && y < 300 ? 0 : 255;
+    }
+  }
+  return { data, width: IMAGE_WIDTH, height: IMAGE_HEIGHT };
+}
+
+async function runWithWorkers(
+  workerCount: number,
+  image: CompatibleImageData,
+  palette: PaletteColor[],
+  mode: PixelationMode,
+  expected: Uint16Array
+): Promise<{ time: number; matched: boolean }> {
+  const N = GRANULARITY;
+  const M = Math.max(1, Math.round(N * image.height / image.width));
+  const pool = new WorkerPool<BandTask, Uint16Array>(() => new Worker(__filename), workerCount, 0);
+  const fallbackColor = palette[0];
+  let best = Infinity;
+  let matched = true;
+
+  // 第一轮用于启动线程和预热，不计时
+  for (let round = 0; round <= ROUNDS; round++) {
+    const grid = createFallbackGrid(N, M, palette, fallbackColor);
+    const start = performance.now();
+    await Promise.all(splitRowBands(M, workerCount).map(async ([rowStart, rowEnd]) => {
+      const indices = await pool.run({
+        rgba: image.data.buffer as SharedArrayBuffer,
+        width: image.width,
+        height: image.height,
+        N,
+        M,
+        rowStart,
+        rowEnd,
+        palette,
+        mode,
+        fallbackIndex: grid.indices[0]
+      }, [], true);
+      grid.indices.set(indices, rowStart * N);
+    }));
+    const time = performance.now() - start;
+    if (round > 0) best = Math.min(best, time);
+    matched = matched && grid.indices.every((value, cellIndex) => value === expected[cellIndex]);
+  }
+
+  await pool.destroy();
+  return { time: best, matched };
+}
+
+async function main() {
+  const maxWorkers = parseInt(process.argv[2], 10) || os.cpus().length;
+  const palette = loadPalette();
+  console.log(`生成 ${IMAGE_WIDTH}x${IMAGE_HEIGHT} 测试图片，粒度 ${GRANULARITY}，最多 ${maxWorkers} 个工作线程`);
+  const image = createImage();
+
+  let allMatched = true;
+  for (const mode of [PixelationMode.Dominant, PixelationMode.Average]) {
+    // 单线程基准（请求线程中的原有路径）
+    let serialTime = Infinity;
+    let expected = new Uint16Array(0);
+    for (let round = 0; round < ROUNDS; round++) {
+      const start = performance.now();
+      expected = pixelateImageData(image, GRANULARITY, Math.round(GRANULARITY * IMAGE_HEIGHT / IMAGE_WIDTH), palette, mode, palette[0]).indices;
+      serialTime = Math.min(serialTime, performance.now() - start);
+    }
+
+    console.log(`\n模式: ${mode}，单线程 ${serialTime.toFixed(1)}ms`);
+    console.log(`${'线程数'.padEnd(6)}${'耗时(ms)'.padStart(12)}${'加速比'.padStart(8)}  结果一致`);
+    for (let workerCount = 1; workerCount <= maxWorkers; workerCount++) {
+      const { time, matched } = await runWithWorkers(workerCount, image, palette, mode, expected);
+      allMatched = allMatched && matched;
+      console.log(
+        `${String(workerCount).padEnd(9)}${time.toFixed(1).padStart(12)}${(serialTime / time).toFixed(2).padStart(9)}x  ${matched ? '✅' : '❌'}`
+      );
+    }
+  }
+
+  if (!allMatched) {
+    process.exitCode = 1;
+  }
+}
+
+if (isMainThread) {
+  main();
+} else {
+  // 工作线程：计算一段行的调色板下标
+  parentPort!.on('message', (task: BandTask) => {
+    const imageData = { data: new Uint8ClampedArray(task.rgba), width: task.width, height: task.height };
+    const indices = new Uint16Array((task.rowEnd - task.rowStart) * task.N);
+    pixelateRowBand(imageData, task.N, task.M, task.rowStart, task.rowEnd, task.palette, task.mode, task.fallbackIndex, indices);
+    const response: WorkerResponse<Uint16Array> = { ok: true, result: indices };
+    parentPort!.postMessage(response, [indices.buffer]);
+  });
+}
@@ -0,0 +1,156 @@
+/**
+ * 图纸渲染基准测试
+ * 比较网格部分逐个单元格 fillText 绘制色号与使用色号贴图缓存（GlyphAtlas）的耗时：
+ * 贴图缓存分为首次绘制（需要排版生成贴图）和缓存已预热（后续请求）两种情况，
+ * 并统计两种方式输出像素的差异。最后给出完整下载（绘制 + PNG 编码）的耗时，
+ * 以及修改若干单元格（含第一行、第一列）后在缓存底图上增量渲染（重绘 + PNG 编码）的耗时，
+ * 并统计增量渲染结果与修改后整张重绘的差异像素（应为 0）。
+ *
+ * 运行: npm run bench:render  (即 npx tsx tests/bench_render.ts)
+ */
+import { createCanvas, loadImage } from 'canvas';
+import { hexToRgb, PaletteColor } from '../src/utils/pixelation';
+import { IndexedPixelGrid } from '../src/utils/pixelGrid';
+import { getMardToHexMapping, getColorKeyByHex } from '../src/utils/colorSystemUtils';
+import { GlyphAtlas } from '../src/utils/glyphAtlas';
+import {
+  computePatternLayout,
+  drawPatternGrid,
+  renderGridImageBuffer,
+  renderPatchedGridImageBuffer
+} from '../src/utils/serverImageDownloader';
+import { GridDownloadOptions } from '../src/types/downloadTypes';
+
+const GRID_SIZES: Array<[number, number]> = [[100, 100], [200, 200]];
+const DPIS = [150, 300];
+const COLOR_COUNT = 48;
+const ROUNDS = 3;
+const EDIT_COUNT = 5;
+const GRID_INTERVAL = 10;
+
+// 从默认调色板中取前 COLOR_COUNT 种颜色，按色块分布（相邻单元格大多同色）
+function createGrid(width: number, height: number): IndexedPixelGrid {
+  const palette: PaletteColor[] = Object.values(getMardToHexMapping())
+    .slice(0, COLOR_COUNT)
+    .map(hex => ({ key: getColorKeyByHex(hex, 'MARD'), hex, rgb: hexToRgb(hex)! }));
+  const indices = new Uint16Array(width * height);
+  let seed = 12345;
+  for (let cellIndex = 0; cellIndex < indices.length; cellIndex++) {
+    seed = (Math.imul(seed, 1103515245) + 12345) >>> 0;
+    const x = cellIndex % width;
+    const y = Math.floor(cellIndex / width);
+    indices[cellIndex] = (Math.floor(x / 7) * 5 + Math.floor(y / 5) * 3 + ((seed >>> 16) & 3)) % palette.length;
+  }
+  return { width, height, indices, palette, external: null };
+}
+
+// 比较两组 RGBA 像素，返回 RGB 不同的像素数
+function countDifferentPixels(a: Uint8ClampedArray, b: Uint8ClampedArray): number {
+  let differentPixels = 0;
+  for (let index = 0; index < a.length; index += 4) {
+    if (a[index] !== b[index] || a[index + 1] !== b[index + 1] || a[index + 2] !== b[index + 2]) {
+      differentPixels++;
+    }
+  }
+  return differentPixels;
+}
+
+async function decodePng(data: Buffer): Promise<Uint8ClampedArray> {
+  const image = await loadImage(data);
+  const canvas = createCanvas(image.width, image.height);
+  const ctx = canvas.getContext('2d');
+  ctx.drawImage(image, 0, 0);
+  return ctx.getImageData(0, 0, image.width, image.height).data;
+}
+
+// 取多轮中最短的耗时，run 自己计时（不包括准备画布的时间）
+function bestOf<T extends { time: number }>(run: () => T): T {
+  let best = run();
+  for (let round = 0; round < ROUNDS; round++) {
+    const result = run();
+    if (result.time < best.time) best = result;
+  }
+  return best;
+}
+
+async function main() {
+  console.log(`${'网格'.padEnd(10)}${'DPI'.padStart(5)}${'fillText(ms)'.padStart(14)}${'贴图首次(ms)'.padStart(14)}${'贴图预热(ms)'.padStart(14)}${'加速比'.padStart(8)}${'差异像素'.padStart(10)}${'完整下载(ms)'.padStart(14)}${'增量渲染(ms)'.padStart(14)}${'增量差异'.padStart(10)}`);
+
+  for (const [width, height] of GRID_SIZES) {
+    const grid = createGrid(width, height);
+    for (const dpi of DPIS) {
+      const options: GridDownloadOptions = {
+        showGrid: true,
+        gridInterval: GRID_INTERVAL,
+        showCoordinates: true,
+        gridLineColor: '#CCCCCC',
+        outerBorderColor: '#141414',
+        includeStats: true,
+        dpi
+      };
+      const params = { renderMode: 'dpi' as const, options };
+      const layout = computePatternLayout(width, height, null, params);
+      const window = { x0: 0, y0: 0, x1: width, y1: height };
+
+      // 每次绘制到新画布上，计时只包含网格部分
+      const drawGrid = (glyphs: GlyphAtlas | null) => {
+        const canvas = createCanvas(layout.width, layout.height);
+        const ctx = canvas.getContext('2d');
+        ctx.fillStyle = '#FFFFFF';
+        ctx.fillRect(0, 0, layout.width, layout.height);
+        const start = performance.now();
+        drawPatternGrid(ctx, grid, layout, window, options, glyphs);
+        return { time: performance.now() - start, ctx };
+      };
+
+      const direct = bestOf(() => drawGrid(null));
+      const cold = bestOf(() => drawGrid(new GlyphAtlas(64 * 1024 * 1024)));
+      const atlas = new GlyphAtlas(64 * 1024 * 1024);
+      const warm = bestOf(() => drawGrid(atlas));
+
+      const directPixels = direct.ctx.getImageData(0, 0, layout.width, layout.height).data;
+      const spritePixels = warm.ctx.getImageData(0, 0, layout.width, layout.height).data;
+      const differentPixels = countDifferentPixels(directPixels, spritePixels);
+
+      // 完整下载使用共享的贴图缓存（第一轮之后已预热）
+      const full = bestOf(() => {
+        const start = performance.now();
+        renderGridImageBuffer(grid, params);
+        return { time: performance.now() - start };
+      });
+
+      // 修改若干单元格（包括紧挨坐标轴标签的第一行、第一列），底图只绘制一次，计时只包含增量渲染
+      const cells = Uint32Array.from([
+        0,
+        GRID_INTERVAL - 1,
+        (GRID_INTERVAL - 1) * width,
+        ...Array.from({ length: EDIT_COUNT }, (_, k) => Math.floor((k + 0.5) * grid.indices.length / EDIT_COUNT))
+      ]);
+      const edited = { ...grid, indices: grid.indices.slice() };
+      cells.forEach(cellIndex => { edited.indices[cellIndex] = (edited.indices[cellIndex] + 1) % grid.palette.length; });
+      const { base } = renderPatchedGridImageBuffer(edited, params, cells, null, grid);
+      const patched = bestOf(() => {
+        const start = performance.now();
+        const { data } = renderPatchedGridImageBuffer(edited, params, cells, base, null);
+        return { time: performance.now() - start, data };
+      });
+      const patchedDifference = countDifferentPixels(
+        await decodePng(patched.data),
+        await decodePng(await renderGridImageBuffer(edited, params))
+      );
+
+      console.log(
+        `${`${width}x${height}`.padEnd(10)}${String(dpi).padStart(5)}${direct.time.toFixed(1).padStart(14)}` +
+        `${cold.time.toFixed(1).padStart(14)}${warm.time.toFixed(1).padStart(14)}${(direct.time / warm.time).toFixed(1).padStart(7)}x` +
+        `${String(differentPixels).padStart(10)}${full.time.toFixed(1).padStart(14)}${patched.time.toFixed(1).padStart(14)}` +
+        `${String(patchedDifference).padStart(10)}`
+      );
+      // 增量渲染必须与整张重绘完全一致
+      if (patchedDifference > 0) {
+        process.exitCode = 1;
+      }
+    }
+  }
+}
+
+main();
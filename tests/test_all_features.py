@@ -7,7 +7,12 @@
 import requests
 import json
 import os
+import io
+import base64
+import re
+import struct
 import time
+import zipfile
 from datetime import datetime
 from pathlib import Path
 
@@ -68,6 +73,10 @@ def test_status_api():
                         status_icon = "✅" if status else "❌"
                         print(f"   {status_icon} {feature}")
 
+            pool = data.get('convertPool')
+            if pool:
+                print(f"🧵 转换线程池: {pool['busy']}/{pool['size']} 忙碌, 排队 {pool['queued']}/{pool['maxQueueLength']}")
+
             return True
         else:
             print_error(f"状态检查失败: {response.status_code}")
@@ -140,6 +149,15 @@ def load_palette_from_file(filename):
         print_error(f"加载调色板文件失败 {filename}: {e}")
         return None
 
+def post_test_image(form_data, endpoint="convert"):
+    """使用测试图片调用转换接口，返回响应和响应时间(ms)"""
+    with open(TEST_IMAGE, 'rb') as f:
+        files = {'image': (TEST_IMAGE, f, 'image/png')}
+        start_time = time.time()
+        response = requests.post(f"{BASE_URL}/{endpoint}", files=files, data=form_data)
+        response_time = (time.time() - start_time) * 1000
+    return response, response_time
+
 def test_custom_palette_validation():
     """测试自定义调色板验证"""
     print_step(4, "测试自定义调色板验证")
@@ -955,12 +973,25 @@ def test_download_api_interface():
             print(f"📁 文件大小: {file_size:.1f} KB")
 
             # 验证生成的图片不为空
-            if len(response.content) > 1000:  # 至少1KB，说明有实际内容
-                print_success("生成的图片文件大小正常")
-                return True
-            else:
+            if len(response.content) <= 1000:  # 至少1KB，说明有实际内容
                 print_error("生成的图片文件过小，可能有问题")
                 return False
+            print_success("生成的图片文件大小正常")
+
+            # 尺寸无效或与 mappedData 不一致时应返回 400，不分配网格
+            invalid_pixel_data = [
+                ("超大尺寸", {**test_pixel_data, "width": 1000000, "height": 1000000}),
+                ("非整数尺寸", {**test_pixel_data, "width": "2", "height": 1.5}),
+                ("行数不一致", {**test_pixel_data, "height": 3}),
+                ("行长度不一致", {**test_pixel_data, "mappedData": [test_pixel_data["mappedData"][0], test_pixel_data["mappedData"][1][:1]]})
+            ]
+            for label, pixel_data in invalid_pixel_data:
+                invalid_response = requests.post(f"{BASE_URL}/download", json={"pixelData": pixel_data})
+                if invalid_response.status_code != 400:
+                    print_error(f"{label}时应返回400，实际为 {invalid_response.status_code}")
+                    return False
+            print_success("无效尺寸被拒绝")
+            return True
         else:
             print_error(f"下载API新接口测试失败: {response.status_code}")
             if response.text:
@@ -975,6 +1006,1001 @@ def test_download_api_interface():
         print_error(f"下载API新接口测试异常: {e}")
         return False
 
+def test_background_removal():
+    """测试背景移除功能"""
+    print_step(12, "测试背景移除 (removeBackground)")
+
+    if not os.path.exists(TEST_IMAGE):
+        print_error(f"测试图片 {TEST_IMAGE} 不存在")
+        return False
+
+    try:
+        form_data = {
+            'granularity': 30,
+            'pixelationMode': 'dominant',
+            'selectedPalette': '290色',
+            'selectedColorSystem': 'MARD',
+            'removeBackground': 'true'
+        }
+        response, response_time = post_test_image(form_data)
+
+        print(f"🌐 URL: POST {BASE_URL}/convert")
+        print(f"⏱️  响应时间: {response_time:.2f}ms")
+        print(f"📊 状态码: {response.status_code}")
+
+        if response.status_code != 200:
+            print_error(f"背景移除转换失败: {response.status_code}")
+            return False
+
+        data = response.json()['data']
+        pixel_data = data['pixelData']
+        total_cells = pixel_data['width'] * pixel_data['height']
+        external_cells = sum(
+            1 for row in pixel_data['mappedData'] for cell in row if cell.get('isExternal')
+        )
+        params = data['processingParams']
+
+        print(f"🧹 背景色号: {params.get('backgroundKeys')}")
+        print(f"📐 总单元格数: {total_cells}")
+        print(f"🚫 外部背景单元格: {external_cells}")
+        print(f"🔢 总珠子数: {data['totalBeadCount']}")
+
+        # 外部背景单元格不计入珠子总数
+        if data['totalBeadCount'] != total_cells - external_cells:
+            print_error("totalBeadCount 与非外部单元格数量不一致")
+            return False
+
+        print_success("背景移除测试通过")
+        return True
+
+    except Exception as e:
+        print_error(f"背景移除测试异常: {e}")
+        return False
+
+def test_downscale_accuracy():
+    """降采样精度对比：同一张图片分别用原图和降采样处理，比较色号一致的单元格比例"""
+    print_step(13, "降采样精度对比 (downscale)")
+
+    if not os.path.exists(TEST_IMAGE):
+        print_error(f"测试图片 {TEST_IMAGE} 不存在")
+        return False
+
+    try:
+        all_passed = True
+        for mode in ['dominant', 'average']:
+            results = {}
+            for downscale in ['false', 'true']:
+                form_data = {
+                    'granularity': 50,
+                    'similarityThreshold': 0,
+                    'pixelationMode': mode,
+                    'selectedPalette': '290色',
+                    'selectedColorSystem': 'MARD',
+                    'downscale': downscale
+                }
+                response, response_time = post_test_image(form_data)
+                if response.status_code != 200:
+                    print_error(f"{mode} 模式 downscale={downscale} 转换失败: {response.status_code}")
+                    all_passed = False
+                    break
+                results[downscale] = (response.json()['data'], response_time)
+
+            if len(results) != 2:
+                continue
+
+            full_data, full_time = results['false']
+            sampled_data, sampled_time = results['true']
+            full_grid = full_data['pixelData']
+            sampled_grid = sampled_data['pixelData']
+
+            # 降采样不能改变网格尺寸
+            if (full_grid['width'], full_grid['height']) != (sampled_grid['width'], sampled_grid['height']):
+                print_error(f"{mode} 模式降采样后网格尺寸不一致")
+                all_passed = False
+                continue
+
+            total_cells = full_grid['width'] * full_grid['height']
+            same_cells = sum(
+                1
+                for full_row, sampled_row in zip(full_grid['mappedData'], sampled_grid['mappedData'])
+                for full_cell, sampled_cell in zip(full_row, sampled_row)
+                if full_cell['key'] == sampled_cell['key']
+            )
+            image_info = sampled_data['imageInfo']
+
+            print(f"🎨 模式: {mode}")
+            print(f"   📐 像素化尺寸: {image_info['originalWidth']}x{image_info['originalHeight']} -> "
+                  f"{image_info.get('sampledWidth')}x{image_info.get('sampledHeight')}")
+            print(f"   ✅ 色号一致: {same_cells}/{total_cells} ({same_cells / total_cells:.1%})")
+            print(f"   ⏱️  原图: {full_time:.2f}ms, 降采样: {sampled_time:.2f}ms")
+
+        if all_passed:
+            print_success("降采样精度对比完成")
+        return all_passed
+
+    except Exception as e:
+        print_error(f"降采样精度对比异常: {e}")
+        return False
+
+def test_convert_result_cache():
+    """测试转换结果缓存：相同图片和参数的第二次请求应命中缓存且结果一致"""
+    print_step(14, "测试转换结果缓存")
+
+    if not os.path.exists(TEST_IMAGE):
+        print_error(f"测试图片 {TEST_IMAGE} 不存在")
+        return False
+
+    try:
+        form_data = {
+            'granularity': 37,
+            'similarityThreshold': 25,
+            'pixelationMode': 'dominant',
+            'selectedPalette': '290色',
+            'selectedColorSystem': 'MARD'
+        }
+        first_response, first_time = post_test_image(form_data)
+        second_response, second_time = post_test_image(form_data)
+
+        if first_response.status_code != 200 or second_response.status_code != 200:
+            print_error(f"转换失败: {first_response.status_code}, {second_response.status_code}")
+            return False
+
+        first_status = first_response.headers.get('X-Convert-Cache')
+        second_status = second_response.headers.get('X-Convert-Cache')
+        print(f"🗄️  第一次: {first_status}, {first_time:.2f}ms")
+        print(f"🗄️  第二次: {second_status}, {second_time:.2f}ms")
+
+        if first_response.json()['data'] != second_response.json()['data']:
+            print_error("缓存命中的结果与首次转换结果不一致")
+            return False
+
+        if second_status == 'disabled':
+            print_info("服务端未启用结果缓存 (CONVERT_CACHE_MAX_MB=0)")
+        elif second_status not in ('memory', 'disk'):
+            print_error(f"相同请求未命中缓存: {second_status}")
+            return False
+
+        cache_stats = requests.get(f"{BASE_URL}/status").json().get('convertCache', {})
+        print(f"📈 缓存统计: 命中 {cache_stats.get('hits')}, 磁盘命中 {cache_stats.get('diskHits')}, "
+              f"未命中 {cache_stats.get('misses')}, 条目 {cache_stats.get('entries')}")
+
+        print_success("转换结果缓存测试通过")
+        return True
+
+    except Exception as e:
+        print_error(f"转换结果缓存测试异常: {e}")
+        return False
+
+def test_decoded_image_cache():
+    """测试解码结果缓存：同一张图片只改变粒度时应复用解码结果"""
+    print_step(15, "测试解码结果缓存")
+
+    if not os.path.exists(TEST_IMAGE):
+        print_error(f"测试图片 {TEST_IMAGE} 不存在")
+        return False
+
+    try:
+        before = requests.get(f"{BASE_URL}/status").json().get('decodedImageCache', {})
+        if not before.get('enabled'):
+            print_info("服务端未启用解码结果缓存 (CONVERT_DECODED_CACHE_MB=0)")
+            return True
+
+        # 使用不常见的粒度，避免命中结果缓存
+        for granularity in [41, 43, 47]:
+            response, response_time = post_test_image({
+                'granularity': granularity,
+                'pixelationMode': 'average',
+                'selectedPalette': '290色'
+            })
+            if response.status_code != 200:
+                print_error(f"粒度 {granularity} 转换失败: {response.status_code}")
+                return False
+            print(f"🔁 粒度 {granularity}: {response_time:.2f}ms, 结果缓存 {response.headers.get('X-Convert-Cache')}")
+
+        after = requests.get(f"{BASE_URL}/status").json().get('decodedImageCache', {})
+        new_hits = after.get('hits', 0) - before.get('hits', 0)
+        print(f"📈 解码缓存: 新增命中 {new_hits}, 条目 {after.get('entries')}, 占用 {after.get('bytes', 0) / 1024 / 1024:.2f}MB")
+
+        # 第一次请求可能需要解码（或已被之前的测试缓存），之后的请求都应命中
+        if new_hits < 2:
+            print_error("同一张图片的重复转换没有复用解码结果")
+            return False
+
+        print_success("解码结果缓存测试通过")
+        return True
+
+    except Exception as e:
+        print_error(f"解码结果缓存测试异常: {e}")
+        return False
+
+def test_multiple_granularities():
+    """测试多尺寸转换：一次请求生成的每个粒度的图纸应与单独转换的结果一致"""
+    print_step(16, "测试多尺寸转换")
+
+    if not os.path.exists(TEST_IMAGE):
+        print_error(f"测试图片 {TEST_IMAGE} 不存在")
+        return False
+
+    try:
+        granularities = [24, 36, 52]
+        base_params = {
+            'similarityThreshold': 30,
+            'pixelationMode': 'average',
+            'selectedPalette': '290色',
+            'selectedColorSystem': 'MARD'
+        }
+        response, response_time = post_test_image({**base_params, 'granularities': ','.join(map(str, granularities))})
+        if response.status_code != 200:
+            print_error(f"多尺寸转换失败: {response.status_code} - {response.text}")
+            return False
+
+        patterns = response.json()['data']['patterns']
+        print(f"📐 {len(patterns)} 个尺寸: {response_time:.2f}ms, 缓存状态 {response.headers.get('X-Convert-Cache')}")
+        if [pattern['granularity'] for pattern in patterns] != granularities:
+            print_error("返回的粒度顺序与请求不一致")
+            return False
+
+        for pattern in patterns:
+            single_response, _ = post_test_image({**base_params, 'granularity': pattern['granularity']})
+            single_data = single_response.json()['data']
+            if (pattern['pixelData'] != single_data['pixelData']
+                    or pattern['colorCounts'] != single_data['colorCounts']):
+                print_error(f"粒度 {pattern['granularity']} 的结果与单独转换不一致")
+                return False
+            print(f"   {pattern['granularity']}: {pattern['pixelData']['width']}x{pattern['pixelData']['height']}, "
+                  f"{pattern['totalBeadCount']} 颗")
+
+        # 粒度数量超出上限时应返回 400
+        too_many = ','.join(str(size) for size in range(10, 200, 10))
+        error_response, _ = post_test_image({**base_params, 'granularities': too_many})
+        if error_response.status_code != 400:
+            print_error(f"粒度数量超出上限时应返回400，实际为 {error_response.status_code}")
+            return False
+
+        print_success("多尺寸转换测试通过")
+        return True
+
+    except Exception as e:
+        print_error(f"多尺寸转换测试异常: {e}")
+        return False
+
+def test_batch_conversion():
+    """测试批量转换：多张图片和ZIP压缩包的结果应与单独转换一致，损坏的文件单独报错"""
+    print_step(17, "测试批量转换")
+
+    if not os.path.exists(TEST_IMAGE):
+        print_error(f"测试图片 {TEST_IMAGE} 不存在")
+        return False
+
+    try:
+        params = {
+            'granularity': 28,
+            'pixelationMode': 'dominant',
+            'selectedPalette': '290色',
+            'selectedColorSystem': 'MARD'
+        }
+        with open(TEST_IMAGE, 'rb') as f:
+            image_bytes = f.read()
+
+        # 压缩包中包含一张图片、一个目录和一个非图片文件
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            zip_file.writestr('sprites/', '')
+            zip_file.writestr('sprites/in_zip.png', image_bytes)
+            zip_file.writestr('readme.txt', 'not an image')
+
+        files = [
+            ('images', ('first.png', image_bytes, 'image/png')),
+            ('images', ('broken.png', b'not really a png', 'image/png')),
+            ('archive', ('sprites.zip', archive.getvalue(), 'application/zip'))
+        ]
+        start_time = time.time()
+        response = requests.post(f"{BASE_URL}/batch", files=files, data=params)
+        response_time = (time.time() - start_time) * 1000
+        if response.status_code != 200:
+            print_error(f"批量转换失败: {response.status_code} - {response.text}")
+            return False
+
+        data = response.json()['data']
+        results = data['results']
+        print(f"📦 {data['summary']['total']} 张图片: 成功 {data['summary']['succeeded']}, "
+              f"失败 {data['summary']['failed']}, {response_time:.2f}ms")
+        if [result['name'] for result in results] != ['first.png', 'broken.png', 'sprites/in_zip.png']:
+            print_error(f"图片顺序或压缩包过滤不正确: {[result['name'] for result in results]}")
+            return False
+        if results[1]['success'] or not results[0]['success'] or not results[2]['success']:
+            print_error("损坏的文件应单独失败，其他图片应成功")
+            return False
+
+        single_response, _ = post_test_image(params)
+        single_data = single_response.json()['data']
+        for result in (results[0], results[2]):
+            if result['pixelData'] != single_data['pixelData'] or result['colorCounts'] != single_data['colorCounts']:
+                print_error(f"{result['name']} 的结果与单独转换不一致")
+                return False
+
+        # 没有图片时应返回 400
+        empty_response = requests.post(f"{BASE_URL}/batch", data=params)
+        if empty_response.status_code != 400:
+            print_error(f"没有图片时应返回400，实际为 {empty_response.status_code}")
+            return False
+
+        print_success("批量转换测试通过")
+        return True
+
+    except Exception as e:
+        print_error(f"批量转换测试异常: {e}")
+        return False
+
+def test_streaming_responses():
+    """测试NDJSON流式响应：逐行输出的网格和逐张输出的批量结果应与普通响应一致"""
+    print_step(18, "测试流式响应 (stream)")
+
+    if not os.path.exists(TEST_IMAGE):
+        print_error(f"测试图片 {TEST_IMAGE} 不存在")
+        return False
+
+    try:
+        params = {
+            'granularity': 40,
+            'pixelationMode': 'average',
+            'selectedPalette': '290色',
+            'selectedColorSystem': 'MARD'
+        }
+        single_response, _ = post_test_image(params)
+        single_data = single_response.json()['data']
+
+        # 单张图片：逐行接收网格并拼回 mappedData
+        with open(TEST_IMAGE, 'rb') as f:
+            start_time = time.time()
+            response = requests.post(f"{BASE_URL}/convert", files={'image': f},
+                                     data={**params, 'stream': 'true'}, stream=True)
+            if response.status_code != 200:
+                print_error(f"流式转换失败: {response.status_code} - {response.text}")
+                return False
+            if 'application/x-ndjson' not in response.headers.get('Content-Type', ''):
+                print_error(f"流式响应的Content-Type不正确: {response.headers.get('Content-Type')}")
+                return False
+
+            lines = []
+            first_row_time = None
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                message = json.loads(line)
+                if message['type'] == 'row' and first_row_time is None:
+                    first_row_time = (time.time() - start_time) * 1000
+                lines.append(message)
+            total_time = (time.time() - start_time) * 1000
+
+        types = [message['type'] for message in lines]
+        if types[0] != 'start' or types[1] != 'pattern' or types[-1] != 'end':
+            print_error(f"流式响应的行类型顺序不正确: {types[:2]} ... {types[-1:]}")
+            return False
+        pattern = lines[1]
+        rows = [message for message in lines if message['type'] == 'row']
+        if [row['y'] for row in rows] != list(range(pattern['height'])):
+            print_error("网格行号不连续")
+            return False
+        if [row['cells'] for row in rows] != single_data['pixelData']['mappedData']:
+            print_error("流式输出的网格与普通响应不一致")
+            return False
+        if pattern['colorCounts'] != single_data['colorCounts']:
+            print_error("流式输出的颜色统计与普通响应不一致")
+            return False
+        print(f"🌊 {len(rows)} 行网格: 首行 {first_row_time:.2f}ms, 全部 {total_time:.2f}ms")
+
+        # 批量转换：每张图片一行 result，index 对应上传顺序
+        with open(TEST_IMAGE, 'rb') as f:
+            image_bytes = f.read()
+        files = [
+            ('images', ('first.png', image_bytes, 'image/png')),
+            ('images', ('broken.png', b'not really a png', 'image/png')),
+            ('images', ('second.png', image_bytes, 'image/png'))
+        ]
+        response = requests.post(f"{BASE_URL}/batch", files=files,
+                                 headers={'Accept': 'application/x-ndjson'}, data=params, stream=True)
+        if response.status_code != 200:
+            print_error(f"流式批量转换失败: {response.status_code} - {response.text}")
+            return False
+        lines = [json.loads(line) for line in response.iter_lines() if line]
+        if lines[0]['type'] != 'start' or lines[0]['total'] != 3 or lines[-1]['type'] != 'end':
+            print_error("流式批量响应缺少start或end行")
+            return False
+        batch_results = sorted((message for message in lines if message['type'] == 'result'),
+                               key=lambda message: message['index'])
+        if [result['name'] for result in batch_results] != ['first.png', 'broken.png', 'second.png']:
+            print_error(f"流式批量结果不完整: {[result['name'] for result in batch_results]}")
+            return False
+        if batch_results[1]['success'] or lines[-1]['summary']['failed'] != 1:
+            print_error("损坏的文件应单独失败")
+            return False
+        for result in (batch_results[0], batch_results[2]):
+            if result['pixelData'] != single_data['pixelData']:
+                print_error(f"{result['name']} 的流式结果与单独转换不一致")
+                return False
+
+        print_success("流式响应测试通过")
+        return True
+
+    except Exception as e:
+        print_error(f"流式响应测试异常: {e}")
+        return False
+
+def decode_compact_pixel_data(pixel_data):
+    """将紧凑编码的 pixelData 还原为 mappedData"""
+    raw = base64.b64decode(pixel_data['indices'])
+    width, height = pixel_data['width'], pixel_data['height']
+    if pixel_data['indexBytes'] == 1:
+        indices = list(raw)
+    else:
+        indices = list(struct.unpack(f'<{width * height}H', raw))
+    palette = pixel_data['palette']
+    return [[palette[indices[j * width + i]] for i in range(width)] for j in range(height)]
+
+def test_compact_pixel_format():
+    """测试紧凑像素数据：解码后应与mappedData一致，/api/download渲染结果应与提交mappedData相同"""
+    print_step(19, "测试紧凑像素数据 (pixelFormat=indexed)")
+
+    if not os.path.exists(TEST_IMAGE):
+        print_error(f"测试图片 {TEST_IMAGE} 不存在")
+        return False
+
+    try:
+        params = {
+            'granularity': 100,
+            'pixelationMode': 'dominant',
+            'selectedPalette': '290色',
+            'selectedColorSystem': 'MARD',
+            'removeBackground': 'true'
+        }
+        mapped_response, _ = post_test_image(params)
+        compact_response, _ = post_test_image({**params, 'pixelFormat': 'indexed'})
+        if compact_response.status_code != 200:
+            print_error(f"紧凑格式转换失败: {compact_response.status_code} - {compact_response.text}")
+            return False
+
+        mapped_data = mapped_response.json()['data']
+        compact_data = compact_response.json()['data']
+        compact_pixel_data = compact_data['pixelData']
+        if compact_pixel_data.get('format') != 'indexed' or 'mappedData' in compact_pixel_data:
+            print_error("紧凑格式的pixelData结构不正确")
+            return False
+        if decode_compact_pixel_data(compact_pixel_data) != mapped_data['pixelData']['mappedData']:
+            print_error("紧凑格式解码后与mappedData不一致")
+            return False
+        if compact_data['colorCounts'] != mapped_data['colorCounts']:
+            print_error("紧凑格式的颜色统计与mappedData不一致")
+            return False
+
+        mapped_size = len(json.dumps(mapped_data['pixelData']))
+        compact_size = len(json.dumps(compact_pixel_data))
+        print(f"📦 pixelData 体积: mapped {mapped_size} 字节, indexed {compact_size} 字节 "
+              f"({mapped_size / compact_size:.1f}x)")
+
+        # 两种格式提交给下载接口，渲染结果应完全相同
+        images = {}
+        for name, pixel_data in (('mapped', mapped_data['pixelData']), ('indexed', compact_pixel_data)):
+            start_time = time.time()
+            response = requests.post(f"{BASE_URL}/download", json={
+                'pixelData': pixel_data,
+                'downloadOptions': {'dpi': 150}
+            })
+            response_time = (time.time() - start_time) * 1000
+            if response.status_code != 200:
+                print_error(f"{name} 格式下载失败: {response.status_code} - {response.text}")
+                return False
+            images[name] = response.content
+            print(f"   {name}: {response_time:.2f}ms")
+        if images['mapped'] != images['indexed']:
+            print_error("两种格式的下载结果不一致")
+            return False
+
+        # 下标数据长度不正确时应返回 400
+        broken = {**compact_pixel_data, 'indices': compact_pixel_data['indices'][:-8]}
+        error_response = requests.post(f"{BASE_URL}/download", json={'pixelData': broken})
+        if error_response.status_code != 400:
+            print_error(f"损坏的紧凑数据应返回400，实际为 {error_response.status_code}")
+            return False
+
+        print_success("紧凑像素数据测试通过")
+        return True
+
+    except Exception as e:
+        print_error(f"紧凑像素数据测试异常: {e}")
+        return False
+
+def test_pattern_handle():
+    """测试图纸引用：通过patternId（和edits）下载的结果应与提交完整pixelData相同"""
+    print_step(20, "测试图纸引用 (storePattern / patternId)")
+
+    if not os.path.exists(TEST_IMAGE):
+        print_error(f"测试图片 {TEST_IMAGE} 不存在")
+        return False
+
+    try:
+        response, _ = post_test_image({
+            'granularity': 40,
+            'pixelationMode': 'dominant',
+            'selectedPalette': '290色',
+            'selectedColorSystem': 'MARD',
+            'storePattern': 'true'
+        })
+        if response.status_code != 200:
+            print_error(f"转换失败: {response.status_code} - {response.text}")
+            return False
+        data = response.json()['data']
+        pattern_id = data.get('patternId')
+        if not pattern_id:
+            print_error("响应中缺少patternId（检查PATTERN_STORE_MB是否为0）")
+            return False
+        print(f"🔖 patternId: {pattern_id}")
+
+        def download(payload):
+            start_time = time.time()
+            download_response = requests.post(f"{BASE_URL}/download", json={
+                **payload,
+                'downloadOptions': {'dpi': 150}
+            })
+            return download_response, (time.time() - start_time) * 1000
+
+        # 修改两个单元格：一个改为图纸中已有的色号，一个改为新颜色
+        mapped_data = data['pixelData']['mappedData']
+        existing = mapped_data[0][0]
+        edits = [
+            {'x': 1, 'y': 0, 'key': existing['key']},
+            {'x': 2, 'y': 1, 'key': 'TEST', 'color': '#123456'}
+        ]
+        edited_mapped_data = [list(row) for row in mapped_data]
+        edited_mapped_data[0][1] = {'key': existing['key'], 'color': existing['color']}
+        edited_mapped_data[1][2] = {'key': 'TEST', 'color': '#123456'}
+
+        cases = [
+            ('pixelData', {'pixelData': data['pixelData']}, {'patternId': pattern_id}),
+            ('edits', {'pixelData': {**data['pixelData'], 'mappedData': edited_mapped_data}},
+             {'patternId': pattern_id, 'edits': edits})
+        ]
+        for name, full_payload, handle_payload in cases:
+            full_response, full_time = download(full_payload)
+            handle_response, handle_time = download(handle_payload)
+            if full_response.status_code != 200 or handle_response.status_code != 200:
+                print_error(f"{name} 下载失败: {full_response.status_code} / {handle_response.status_code}")
+                return False
+            if full_response.content != handle_response.content:
+                print_error(f"{name}: 通过patternId下载的结果与提交pixelData不一致")
+                return False
+            print(f"   {name}: pixelData {full_time:.2f}ms, patternId {handle_time:.2f}ms")
+
+        # 不存在的图纸返回 404，超出范围的修改返回 400
+        missing_response, _ = download({'patternId': '00000000-0000-0000-0000-000000000000'})
+        if missing_response.status_code != 404:
+            print_error(f"不存在的patternId应返回404，实际为 {missing_response.status_code}")
+            return False
+        bad_edit_response, _ = download({'patternId': pattern_id, 'edits': [{'x': 9999, 'y': 0, 'key': 'H07'}]})
+        if bad_edit_response.status_code != 400:
+            print_error(f"超出范围的修改应返回400，实际为 {bad_edit_response.status_code}")
+            return False
+
+        print_success("图纸引用测试通过")
+        return True
+
+    except Exception as e:
+        print_error(f"图纸引用测试异常: {e}")
+        return False
+
+def test_paged_download():
+    """测试分页输出：ZIP中的页数与网格分块一致，PDF格式正确，无效参数返回400"""
+    print_step(21, "测试分页输出 (output=pages / pdf)")
+
+    if not os.path.exists(TEST_IMAGE):
+        print_error(f"测试图片 {TEST_IMAGE} 不存在")
+        return False
+
+    try:
+        response, _ = post_test_image({
+            'granularity': 50,
+            'pixelationMode': 'dominant',
+            'selectedPalette': '290色',
+            'selectedColorSystem': 'MARD'
+        })
+        if response.status_code != 200:
+            print_error(f"转换失败: {response.status_code} - {response.text}")
+            return False
+        pixel_data = response.json()['data']['pixelData']
+        width, height = pixel_data['width'], pixel_data['height']
+
+        def download(options):
+            start_time = time.time()
+            download_response = requests.post(f"{BASE_URL}/download", json={
+                'pixelData': pixel_data,
+                'downloadOptions': {'gridInterval': 10, 'includeStats': True, **options}
+            })
+            return download_response, (time.time() - start_time) * 1000
+
+        # pageCells=25 向下取整为 gridInterval 的整数倍 20
+        pages_response, pages_time = download({'output': 'pages', 'pageCells': 25})
+        if pages_response.status_code != 200 or pages_response.headers.get('Content-Type') != 'application/zip':
+            print_error(f"分页PNG下载失败: {pages_response.status_code} - {pages_response.text[:200]}")
+            return False
+        archive = zipfile.ZipFile(io.BytesIO(pages_response.content))
+        names = archive.namelist()
+        expected_pages = ((width + 19) // 20) * ((height + 19) // 20)
+        page_names = [name for name in names if name.startswith('page-')]
+        if len(page_names) != expected_pages or 'stats.png' not in names:
+            print_error(f"页数不正确: {names}，应有 {expected_pages} 页和 stats.png")
+            return False
+        if any(not archive.read(name).startswith(b'\x89PNG') for name in names):
+            print_error("压缩包中存在无效的PNG")
+            return False
+        print(f"   pages: {width}x{height} -> {len(page_names)} 页 + stats.png, {len(pages_response.content)} bytes, {pages_time:.2f}ms")
+
+        pdf_response, pdf_time = download({'output': 'pdf', 'pageCells': 20})
+        if pdf_response.status_code != 200 or not pdf_response.content.startswith(b'%PDF'):
+            print_error(f"PDF下载失败: {pdf_response.status_code}")
+            return False
+        print(f"   pdf: {len(pdf_response.content)} bytes, {pdf_time:.2f}ms")
+
+        for invalid_options in ({'output': 'svg'}, {'output': 'pages', 'pageCells': 0}):
+            invalid_response, _ = download(invalid_options)
+            if invalid_response.status_code != 400:
+                print_error(f"无效参数 {invalid_options} 应返回400，实际为 {invalid_response.status_code}")
+                return False
+
+        print_success("分页输出测试通过")
+        return True
+
+    except Exception as e:
+        print_error(f"分页输出测试异常: {e}")
+        return False
+
+def test_render_cache():
+    """测试下载缓存：重复下载命中缓存且内容相同，If-None-Match 匹配时返回304"""
+    print_step(22, "测试下载缓存 (ETag / If-None-Match)")
+
+    if not os.path.exists(TEST_IMAGE):
+        print_error(f"测试图片 {TEST_IMAGE} 不存在")
+        return False
+
+    try:
+        response, _ = post_test_image({
+            'granularity': 60,
+            'pixelationMode': 'dominant',
+            'selectedPalette': '290色',
+            'selectedColorSystem': 'MARD'
+        })
+        if response.status_code != 200:
+            print_error(f"转换失败: {response.status_code} - {response.text}")
+            return False
+        pixel_data = response.json()['data']['pixelData']
+
+        def download(options, headers=None):
+            start_time = time.time()
+            download_response = requests.post(f"{BASE_URL}/download", json={
+                'pixelData': pixel_data,
+                # 每次运行使用不同的标题，避免命中之前运行留下的缓存
+                'downloadOptions': {'title': f"缓存测试 {datetime.now().isoformat()}", **options}
+            }, headers=headers or {})
+            return download_response, (time.time() - start_time) * 1000
+
+        options = {'dpi': 300}
+        first, first_time = download(options)
+        second, second_time = download(options)
+        if first.status_code != 200 or second.status_code != 200:
+            print_error(f"下载失败: {first.status_code} / {second.status_code}")
+            return False
+        etag = first.headers.get('ETag')
+        cache_status = (first.headers.get('X-Render-Cache'), second.headers.get('X-Render-Cache'))
+        print(f"   首次: {first_time:.2f}ms ({cache_status[0]}), 再次: {second_time:.2f}ms ({cache_status[1]}), ETag: {etag}")
+        if not etag or second.headers.get('ETag') != etag or first.content != second.content:
+            print_error("重复下载的 ETag 或内容不一致")
+            return False
+        if cache_status[0] != 'disabled' and cache_status != ('miss', 'hit'):
+            print_error(f"缓存状态不正确: {cache_status}")
+            return False
+
+        not_modified, not_modified_time = download(options, {'If-None-Match': etag})
+        if not_modified.status_code != 304 or not_modified.content:
+            print_error(f"If-None-Match 匹配时应返回304，实际为 {not_modified.status_code}")
+            return False
+        print(f"   If-None-Match: 304, {not_modified_time:.2f}ms")
+
+        # 参数变化后 ETag 不再匹配
+        changed, _ = download({'dpi': 150}, {'If-None-Match': etag})
+        if changed.status_code != 200 or changed.headers.get('ETag') == etag:
+            print_error("参数变化后仍返回了相同的 ETag")
+            return False
+
+        print_success("下载缓存测试通过")
+        return True
+
+    except Exception as e:
+        print_error(f"下载缓存测试异常: {e}")
+        return False
+
+def test_render_admission():
+    """测试渲染像素预算：超出预算的整张图片返回413，正常尺寸的下载不受影响"""
+    print_step(23, "测试渲染线程池与像素预算")
+
+    if not os.path.exists(TEST_IMAGE):
+        print_error(f"测试图片 {TEST_IMAGE} 不存在")
+        return False
+
+    try:
+        response, _ = post_test_image({
+            'granularity': 60,
+            'pixelationMode': 'dominant',
+            'selectedPalette': '290色',
+            'selectedColorSystem': 'MARD'
+        })
+        if response.status_code != 200:
+            print_error(f"转换失败: {response.status_code} - {response.text}")
+            return False
+        pixel_data = response.json()['data']['pixelData']
+
+        # 60x60 的图纸在 3000 DPI 下约 36000x36000 像素，超出默认的 200 百万像素预算
+        too_large = requests.post(f"{BASE_URL}/download", json={
+            'pixelData': pixel_data,
+            'downloadOptions': {'dpi': 3000}
+        })
+        print(f"   3000 DPI: {too_large.status_code} - {too_large.json().get('details')}")
+        if too_large.status_code != 413:
+            print_error(f"超出像素预算时应返回413，实际为 {too_large.status_code}")
+            return False
+
+        normal = requests.post(f"{BASE_URL}/download", json={
+            'pixelData': pixel_data,
+            'downloadOptions': {'title': f"预算测试 {datetime.now().isoformat()}", 'dpi': 150}
+        })
+        if normal.status_code != 200 or not normal.content.startswith(b'\x89PNG'):
+            print_error(f"正常尺寸的下载失败: {normal.status_code}")
+            return False
+
+        render_pool = requests.get(f"{BASE_URL}/status").json().get('renderPool')
+        if render_pool is not None:
+            print(f"   线程池: {render_pool['started']}/{render_pool['size']} 个线程, "
+                  f"正在渲染 {render_pool['runningPixels']} / {render_pool['pixelBudget']} 像素")
+            if render_pool['runningPixels'] > render_pool['pixelBudget']:
+                print_error("正在渲染的像素数超出预算")
+                return False
+        else:
+            print_info("渲染线程池未启用（DOWNLOAD_POOL_SIZE=0）")
+
+        print_success("渲染像素预算测试通过")
+        return True
+
+    except Exception as e:
+        print_error(f"渲染像素预算测试异常: {e}")
+        return False
+
+def test_vector_download():
+    """测试矢量输出：SVG尺寸与相同参数的PNG一致，文件大小不随DPI增长"""
+    print_step(24, "测试矢量输出 (output=svg)")
+
+    if not os.path.exists(TEST_IMAGE):
+        print_error(f"测试图片 {TEST_IMAGE} 不存在")
+        return False
+
+    try:
+        response, _ = post_test_image({
+            'granularity': 50,
+            'pixelationMode': 'dominant',
+            'selectedPalette': '290色',
+            'selectedColorSystem': 'MARD'
+        })
+        if response.status_code != 200:
+            print_error(f"转换失败: {response.status_code} - {response.text}")
+            return False
+        pixel_data = response.json()['data']['pixelData']
+
+        def download(options):
+            start_time = time.time()
+            download_response = requests.post(f"{BASE_URL}/download", json={
+                'pixelData': pixel_data,
+                'downloadOptions': {'title': '矢量测试', **options}
+            })
+            return download_response, (time.time() - start_time) * 1000
+
+        svg_sizes = {}
+        for dpi in (150, 600):
+            svg_response, svg_time = download({'output': 'svg', 'dpi': dpi})
+            if svg_response.status_code != 200 or svg_response.headers.get('Content-Type') != 'image/svg+xml' \
+                    or b'<svg' not in svg_response.content:
+                print_error(f"SVG下载失败: {svg_response.status_code} - {svg_response.text[:200]}")
+                return False
+            svg_sizes[dpi] = len(svg_response.content)
+            print(f"   svg {dpi} DPI: {svg_sizes[dpi]} bytes, {svg_time:.2f}ms")
+
+            # SVG 的尺寸与相同参数的 PNG 一致（PNG 头部 16-24 字节为宽高）
+            png_response, _ = download({'dpi': dpi})
+            png_width = int.from_bytes(png_response.content[16:20], 'big')
+            png_height = int.from_bytes(png_response.content[20:24], 'big')
+            svg_header = svg_response.content[:500].decode('utf-8', 'ignore')
+            match = re.search(r'width="([\d.]+)(?:pt|px)?" height="([\d.]+)(?:pt|px)?"', svg_header)
+            if not match or (round(float(match.group(1))), round(float(match.group(2)))) != (png_width, png_height):
+                print_error(f"SVG尺寸与PNG ({png_width}x{png_height}) 不一致: {match.groups() if match else svg_header[:200]}")
+                return False
+
+        if svg_sizes[600] > svg_sizes[150] * 1.5:
+            print_error(f"SVG大小随DPI增长: {svg_sizes}")
+            return False
+
+        print_success("矢量输出测试通过")
+        return True
+
+    except Exception as e:
+        print_error(f"矢量输出测试异常: {e}")
+        return False
+
+def test_incremental_render():
+    """测试增量渲染：同一图纸的多次修改在缓存底图上重绘，输出尺寸与整张渲染一致"""
+    print_step(25, "测试增量渲染 (patternId + edits)")
+
+    if not os.path.exists(TEST_IMAGE):
+        print_error(f"测试图片 {TEST_IMAGE} 不存在")
+        return False
+
+    try:
+        response, _ = post_test_image({
+            'granularity': 60,
+            'pixelationMode': 'dominant',
+            'selectedPalette': '290色',
+            'selectedColorSystem': 'MARD',
+            'storePattern': 'true'
+        })
+        if response.status_code != 200:
+            print_error(f"转换失败: {response.status_code} - {response.text}")
+            return False
+        data = response.json()['data']
+        pattern_id = data.get('patternId')
+        if not pattern_id:
+            print_error("响应中缺少patternId（检查PATTERN_STORE_MB是否为0）")
+            return False
+        # 修改为图纸中已有的色号
+        key = data['pixelData']['mappedData'][0][0]['key']
+        # 每次运行使用不同的标题，避免命中之前运行留下的渲染结果缓存
+        options = {'title': f"增量测试 {datetime.now().isoformat()}", 'dpi': 150}
+
+        def download(edits):
+            start_time = time.time()
+            download_response = requests.post(f"{BASE_URL}/download", json={
+                'patternId': pattern_id,
+                'edits': edits,
+                'downloadOptions': options
+            })
+            return download_response, (time.time() - start_time) * 1000
+
+        def png_size(content):
+            return struct.unpack('>II', content[16:24])
+
+        def base_cache_stats():
+            return requests.get(f"{BASE_URL}/status").json().get('renderBaseCache', {})
+
+        before = base_cache_stats()
+        full, full_time = download([])
+        sizes = [png_size(full.content)]
+        times = [full_time]
+        for step in range(1, 4):
+            edited, edited_time = download([{'x': step, 'y': step * 2, 'key': key}, {'x': 59 - step, 'y': 0, 'key': key}])
+            if edited.status_code != 200 or not edited.content.startswith(b'\x89PNG'):
+                print_error(f"修改后下载失败: {edited.status_code} - {edited.text[:200]}")
+                return False
+            sizes.append(png_size(edited.content))
+            times.append(edited_time)
+        print(f"   底图: {times[0]:.2f}ms, 增量: {', '.join(f'{t:.2f}ms' for t in times[1:])}")
+
+        if len(set(sizes)) != 1:
+            print_error(f"修改后图片尺寸变化: {sizes}")
+            return False
+
+        after = base_cache_stats()
+        if after.get('enabled'):
+            hits = after['hits'] - before.get('hits', 0)
+            print(f"   底图缓存: 命中 {hits} 次, {after['entries']} 个底图, {after['bytes']} bytes")
+            if hits < 3:
+                print_error("修改后的下载没有使用缓存的底图")
+                return False
+        else:
+            print_info("增量渲染未启用（DOWNLOAD_BASE_CACHE_MB=0）")
+
+        print_success("增量渲染测试通过")
+        return True
+
+    except Exception as e:
+        print_error(f"增量渲染测试异常: {e}")
+        return False
+
+def test_batch_archive_limits():
+    """测试压缩包解压上限：超过单个文件上限的图片单独失败，解压后总量超限时整个请求返回 413（按默认配置）"""
+    print_step(26, "测试压缩包解压上限")
+
+    if not os.path.exists(TEST_IMAGE):
+        print_error(f"测试图片 {TEST_IMAGE} 不存在")
+        return False
+
+    try:
+        params = {'granularity': 28, 'selectedPalette': '290色'}
+        with open(TEST_IMAGE, 'rb') as f:
+            image_bytes = f.read()
+
+        # 全零数据压缩后只有几十 KB，解压后超过 BATCH_MAX_ENTRY_MB（默认 10MB）
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            zip_file.writestr('normal.png', image_bytes)
+            zip_file.writestr('bomb.png', bytes(11 * 1024 * 1024))
+        print_info(f"压缩包 {len(archive.getvalue())} 字节")
+
+        files = [('archive', ('limits.zip', archive.getvalue(), 'application/zip'))]
+        response = requests.post(f"{BASE_URL}/batch", files=files, data=params)
+        if response.status_code != 200:
+            print_error(f"批量转换失败: {response.status_code} - {response.text}")
+            return False
+        results = response.json()['data']['results']
+        if not results[0]['success'] or results[1]['success']:
+            print_error("超过单个文件上限的图片应单独失败，其他图片应成功")
+            return False
+        print_info(f"超限图片: {results[1]['error']}")
+
+        # 51 个 10MB 的图片解压后超过 BATCH_MAX_TOTAL_MB（默认 500MB）
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            for index in range(51):
+                zip_file.writestr(f'filler_{index}.png', bytes(10 * 1024 * 1024))
+        files = [('archive', ('total.zip', archive.getvalue(), 'application/zip'))]
+        response = requests.post(f"{BASE_URL}/batch", files=files, data=params)
+        if response.status_code != 413:
+            print_error(f"解压后总量超限时应返回413，实际为 {response.status_code}")
+            return False
+        print_info(f"总量超限: {response.json()['error']}")
+
+        print_success("压缩包解压上限测试通过")
+        return True
+
+    except Exception as e:
+        print_error(f"压缩包解压上限测试异常: {e}")
+        return False
+
+def test_similarity_threshold():
+    """测试相似色合并：similarityThreshold=0 不合并，颜色数不少于默认值；阈值很高时颜色数应更少"""
+    print_step(27, "测试相似色合并阈值")
+
+    if not os.path.exists(TEST_IMAGE):
+        print_error(f"测试图片 {TEST_IMAGE} 不存在")
+        return False
+
+    try:
+        base_params = {
+            'granularity': 40,
+            'pixelationMode': 'average',
+            'selectedPalette': '290色',
+            'selectedColorSystem': 'MARD'
+        }
+        color_counts = {}
+        # 不传 similarityThreshold 时使用默认值
+        for label, threshold in (('0', 0), ('默认', None), ('90', 90)):
+            form_data = dict(base_params)
+            if threshold is not None:
+                form_data['similarityThreshold'] = threshold
+            response, response_time = post_test_image(form_data)
+            if response.status_code != 200:
+                print_error(f"阈值 {label} 转换失败: {response.status_code} - {response.text}")
+                return False
+            color_counts[label] = len(response.json()['data']['colorCounts'])
+            print(f"🎨 阈值 {label}: {color_counts[label]} 种颜色, {response_time:.2f}ms")
+
+        if color_counts['0'] < color_counts['默认']:
+            print_error("阈值为 0 时的颜色数不应少于默认阈值")
+            return False
+        if color_counts['90'] >= color_counts['默认']:
+            print_error("阈值很高时颜色数应少于默认阈值")
+            return False
+
+        print_success("相似色合并阈值测试通过")
+        return True
+
+    except Exception as e:
+        print_error(f"相似色合并阈值测试异常: {e}")
+        return False
+
 def main():
     """主函数"""
     print_header("拼豆图纸生成器 API 全功能测试")
@@ -994,7 +2020,13 @@ def main():
         'custom_download': False,
         'title_dpi_download': False,
         'documentation': False,
-        'download_api_interface': False
+        'download_api_interface': False,
+        'background_removal': False,
+        'downscale_accuracy': False,
+        'convert_result_cache': False,
+        'decoded_image_cache': False,
+        'multiple_granularities': False,
+        'batch_conversion': False
     }
 
     # 1. 测试状态API
@@ -1055,6 +2087,54 @@ def main():
     # 11. 测试下载API新接口
     results['download_api_interface'] = test_download_api_interface()
 
+    # 12. 测试背景移除
+    results['background_removal'] = test_background_removal()
+
+    # 13. 降采样精度对比
+    results['downscale_accuracy'] = test_downscale_accuracy()
+
+    # 14. 测试转换结果缓存
+    results['convert_result_cache'] = test_convert_result_cache()
+
+    # 15. 测试解码结果缓存
+    results['decoded_image_cache'] = test_decoded_image_cache()
+
+    # 16. 测试多尺寸转换
+    results['multiple_granularities'] = test_multiple_granularities()
+
+    # 17. 测试批量转换
+    results['batch_conversion'] = test_batch_conversion()
+
+    # 18. 测试流式响应
+    results['streaming'] = test_streaming_responses()
+
+    # 19. 测试紧凑像素数据
+    results['compact_pixel_format'] = test_compact_pixel_format()
+
+    # 20. 测试图纸引用
+    results['pattern_handle'] = test_pattern_handle()
+
+    # 21. 测试分页输出
+    results['paged_download'] = test_paged_download()
+
+    # 22. 测试下载缓存
+    results['render_cache'] = test_render_cache()
+
+    # 23. 测试渲染线程池与像素预算
+    results['render_admission'] = test_render_admission()
+
+    # 24. 测试矢量输出
+    results['vector_download'] = test_vector_download()
+
+    # 25. 测试增量渲染
+    results['incremental_render'] = test_incremental_render()
+
+    # 26. 测试压缩包解压上限
+    results['batch_archive_limits'] = test_batch_archive_limits()
+
+    # 27. 测试相似色合并阈值
+    results['similarity_threshold'] = test_similarity_threshold()
+
     # 测试自定义调色板下载 (作为额外测试，不计入主要结果)
     if custom_convert_data:
         # 尝试下载3.0版本结果
@@ -1087,7 +2167,23 @@ def main():
         ('默认调色板下载', results['default_download']),
         ('标题和DPI下载', results['title_dpi_download']),
         ('API文档', results['documentation']),
-        ('下载API新接口', results['download_api_interface'])
+        ('下载API新接口', results['download_api_interface']),
+        ('背景移除', results['background_removal']),
+        ('降采样精度对比', results['downscale_accuracy']),
+        ('转换结果缓存', results['convert_result_cache']),
+        ('解码结果缓存', results['decoded_image_cache']),
+        ('多尺寸转换', results['multiple_granularities']),
+        ('批量转换', results['batch_conversion']),
+        ('流式响应', results['streaming']),
+        ('紧凑像素数据', results['compact_pixel_format']),
+        ('图纸引用', results['pattern_handle']),
+        ('分页输出', results['paged_download']),
+        ('下载缓存', results['render_cache']),
+        ('渲染预算', results['render_admission']),
+        ('矢量输出', results['vector_download']),
+        ('增量渲染', results['incremental_render']),
+        ('压缩包解压上限', results['batch_archive_limits']),
+        ('相似色合并阈值', results['similarity_threshold'])
     ]
 
     passed_tests = 0